@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import json
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import ScheduleArchive, ScheduleEntry
+from .utils import next_month
+
+MonthCells = Dict[Tuple[int, date], str]  # (person_id, day) -> shift_code
+
+_entries = ScheduleEntry.__table__
+_archives = ScheduleArchive.__table__
+
+
+def pack_month(month: date, cells: MonthCells) -> Tuple[str, str, bytes]:
+    """Encode a month's cells as (person ids, shift codes, compressed grid).
+
+    The grid is day-major with one slot per (day, person); a slot holds the
+    1-based position of the cell's code in the code list, 0 for no shift.
+    """
+    people = sorted({person_id for person_id, _ in cells})
+    codes = sorted(set(cells.values()))
+    person_index = {person_id: index for index, person_id in enumerate(people)}
+    code_index = {code: index + 1 for index, code in enumerate(codes)}
+    days = (next_month(month) - month).days
+    grid = array("B" if len(codes) < 256 else "H", [0]) * (days * len(people))
+    for (person_id, day), code in cells.items():
+        grid[(day - month).days * len(people) + person_index[person_id]] = code_index[code]
+    if grid.itemsize > 1 and sys.byteorder == "big":
+        grid.byteswap()
+    return json.dumps(people), json.dumps(codes, ensure_ascii=False), zlib.compress(grid.tobytes())
+
+
+def unpack_month(month: date, people_json: str, codes_json: str, packed: bytes) -> MonthCells:
+    people: List[int] = json.loads(people_json)
+    codes: List[str] = json.loads(codes_json)
+    grid = array("B" if len(codes) < 256 else "H")
+    grid.frombytes(zlib.decompress(packed))
+    if grid.itemsize > 1 and sys.byteorder == "big":
+        grid.byteswap()
+    cells: MonthCells = {}
+    width = len(people)
+    for slot, value in enumerate(grid):
+        if value:
+            day, person = divmod(slot, width)
+            cells[(people[person], month + timedelta(days=day))] = codes[value - 1]
+    return cells
+
+
+def _live_rows(db: Session, team_id: int, month: date) -> List[Tuple[int, date, Optional[str]]]:
+    # NULL shift codes are kept: in an archived month they clear an archived cell
+    return db.execute(
+        select(ScheduleEntry.person_id, ScheduleEntry.day, ScheduleEntry.shift_code).where(
+            ScheduleEntry.team_id == team_id,
+            ScheduleEntry.day >= month,
+            ScheduleEntry.day < next_month(month),
+        )
+    ).all()
+
+
+def archived_cells(db: Session, team_id: int, month: date) -> Optional[MonthCells]:
+    row = db.execute(
+        select(ScheduleArchive.people, ScheduleArchive.codes, ScheduleArchive.cells).where(
+            ScheduleArchive.team_id == team_id, ScheduleArchive.month == month
+        )
+    ).first()
+    return unpack_month(month, *row) if row else None
+
+
+def month_cells(db: Session, team_id: int, month: date) -> MonthCells:
+    """All cells of a team-month, archived ones overlaid with live rows.
+
+    Live rows are read first: if the month gets archived between the two
+    statements, the archive already holds what the live rows did.
+    """
+    live = _live_rows(db, team_id, month)
+    cells = archived_cells(db, team_id, month) or {}
+    for person_id, day, shift_code in live:
+        if shift_code is None:
+            cells.pop((person_id, day), None)
+        else:
+            cells[(person_id, day)] = shift_code
+    return cells
+
+
+def archived_months(db: Session, team_id: int, months: Iterable[date]) -> Set[date]:
+    wanted = set(months)
+    if not wanted:
+        return set()
+    return set(
+        db.execute(
+            select(ScheduleArchive.month).where(ScheduleArchive.team_id == team_id, ScheduleArchive.month.in_(wanted))
+        ).scalars()
+    )
+
+
+@dataclass
+class ArchivedMonth:
+    team_id: int
+    month: date
+    live_rows: int  # rows removed from schedule_entries
+    cells: int  # cells now held by the archive row
+    packed_bytes: int
+
+
+def pending_months(db: Session, cutoff: date, team_ids: Optional[List[int]] = None) -> List[Tuple[int, date]]:
+    """(team, month) pairs with live rows before ``cutoff`` (the first day of a month)."""
+    month_key = func.strftime("%Y-%m", ScheduleEntry.day)
+    stmt = select(ScheduleEntry.team_id, month_key).where(ScheduleEntry.day < cutoff).group_by(
+        ScheduleEntry.team_id, month_key
+    )
+    if team_ids:
+        stmt = stmt.where(ScheduleEntry.team_id.in_(team_ids))
+    return [
+        (team_id, datetime.strptime(key, "%Y-%m").date())
+        for team_id, key in db.execute(stmt.order_by(ScheduleEntry.team_id, month_key))
+    ]
+
+
+def archive_month(db: Session, team_id: int, month: date) -> ArchivedMonth:
+    """Fold a team-month's live rows into its archive row, in the caller's transaction.
+
+    Archiving is content preserving, so the team revision, caches and ETags
+    stay valid.
+    """
+    cells = month_cells(db, team_id, month)
+    result = db.execute(
+        _entries.delete().where(
+            _entries.c.team_id == team_id,
+            _entries.c.day >= month,
+            _entries.c.day < next_month(month),
+        )
+    )
+    db.execute(_archives.delete().where(_archives.c.team_id == team_id, _archives.c.month == month))
+    packed_bytes = 0
+    if cells:
+        people, codes, packed = pack_month(month, cells)
+        packed_bytes = len(packed)
+        db.execute(
+            _archives.insert().values(
+                team_id=team_id,
+                month=month,
+                people=people,
+                codes=codes,
+                cells=packed,
+                cell_count=len(cells),
+                archived_at=datetime.utcnow(),
+            )
+        )
+    return ArchivedMonth(team_id, month, result.rowcount, len(cells), packed_bytes)
+
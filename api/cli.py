@@ -1,22 +1,32 @@
 from __future__ import annotations
 
 import argparse
-from datetime import date, timedelta
+import random
+from datetime import date, datetime, timedelta
 
-from sqlalchemy import select
+from sqlalchemy import func, select
 
+from .archive import archive_month, month_cells, pending_months
 from .config import load_config
-from .database import Base, engine, session_scope
+from .database import engine, session_scope
+from .history import COMPACT_BATCH, compact_changes, compaction_target, history_floor
+from .migrations import MIGRATIONS, explain_hot_queries, run_migrations
 from .models import (
     Person,
+    RosterViolation,
     ScheduleEntry,
+    ScheduleSnapshot,
     ShiftDefinition,
     Team,
     User,
     UserPagePermission,
     UserTeamPermission,
 )
+from .rules import store_range
 from .security import hash_password
+from .snapshots import create_snapshot, prune_snapshots, restore_snapshot
+from .stats import rebuild_counts, set_month_counts
+from .utils import month_start
 
 
 def init_database() -> None:
@@ -28,7 +38,7 @@ def init_database() -> None:
         if db_path.parent and not db_path.parent.exists():
             db_path.parent.mkdir(parents=True, exist_ok=True)
         print(f"Creating database at {db_path}")
-    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
     with session_scope() as session:
         existing_users = session.execute(select(User).limit(1)).scalar_one_or_none()
@@ -61,6 +71,7 @@ def init_database() -> None:
                     bg_color=bg,
                     text_color=text,
                     sort_order=order,
+                    is_rest=code == "OFF",
                 )
             )
         for code, name, bg, text, order in shifts_support:
@@ -72,6 +83,7 @@ def init_database() -> None:
                     bg_color=bg,
                     text_color=text,
                     sort_order=order,
+                    is_rest=code == "OFF",
                 )
             )
         session.flush()
@@ -167,15 +179,336 @@ def init_database() -> None:
         print("Database initialized with demo data.")
 
 
+SYNTHETIC_SHIFTS = [
+    ("DAY", "白班", "#facc15", "#1f2937", 1),
+    ("SWING", "中班", "#60a5fa", "#0f172a", 2),
+    ("NIGHT", "夜班", "#818cf8", "#111827", 3),
+    ("OFF", "休息", "#d1d5db", "#374151", 4),
+]
+SYNTHETIC_CHUNK_ROWS = 20000
+
+
+def seed_synthetic(
+    teams: int,
+    people_per_team: int,
+    years: int,
+    start_year: int,
+    users: int,
+    fill: float,
+    seed: int,
+) -> None:
+    """Bulk-generate teams, people, users and schedule cells for load testing.
+
+    Everything is prefixed ``syn``; the ``bench`` account (password ``bench123``)
+    can write to every synthetic team and open every page.
+    """
+    run_migrations(engine, analyze=False)
+    rng = random.Random(seed)
+    with session_scope() as session:
+        if session.execute(select(Team.id).where(Team.code.like("syn-%")).limit(1)).first():
+            print("Synthetic data already present; delete data/app.db or use a fresh database_path.")
+            return
+        password_hash = hash_password("bench123")
+        team_rows = []
+        for index in range(1, teams + 1):
+            team = Team(name=f"合成团队 {index:03d}", code=f"syn-{index:03d}", description="synthetic")
+            session.add(team)
+            team_rows.append(team)
+        session.flush()
+        for team in team_rows:
+            for code, name, bg, text, order in SYNTHETIC_SHIFTS:
+                session.add(
+                    ShiftDefinition(
+                        team_id=team.id,
+                        code=code,
+                        display_name=name,
+                        bg_color=bg,
+                        text_color=text,
+                        sort_order=order,
+                        is_rest=code == "OFF",
+                    )
+                )
+        bench = User(username="bench", display_name="压测账号", password_hash=password_hash)
+        session.add(bench)
+        accounts = [
+            User(username=f"syn-user-{index:04d}", display_name=f"合成用户 {index:04d}", password_hash=password_hash)
+            for index in range(1, users + 1)
+        ]
+        session.add_all(accounts)
+        session.flush()
+        for page in ["schedule", "settings", "permissions", "people"]:
+            session.add(UserPagePermission(user_id=bench.id, page=page, can_view=True, can_edit=True))
+        for team in team_rows:
+            session.add(UserTeamPermission(user_id=bench.id, team_id=team.id, access_level="write"))
+        for account in accounts:
+            session.add(UserPagePermission(user_id=account.id, page="schedule", can_view=True, can_edit=True))
+            for team in rng.sample(team_rows, min(3, len(team_rows))):
+                session.add(
+                    UserTeamPermission(user_id=account.id, team_id=team.id, access_level=rng.choice(["read", "write"]))
+                )
+        people_by_team = {}
+        for team in team_rows:
+            people = [
+                Person(team_id=team.id, name=f"成员 {index:04d}", sort_index=index)
+                for index in range(1, people_per_team + 1)
+            ]
+            session.add_all(people)
+            people_by_team[team.id] = people
+        session.flush()
+        people_ids = {team_id: [person.id for person in people] for team_id, people in people_by_team.items()}
+        bench_id = bench.id
+
+    codes = [code for code, *_ in SYNTHETIC_SHIFTS]
+    start = date(start_year, 1, 1)
+    end = date(start_year + years, 1, 1)
+    # plain tuples in SQLAlchemy's SQLite storage formats skip per-row bind processing
+    updated_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+    days = [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days)]
+    insert = (
+        "INSERT INTO schedule_entries (team_id, person_id, day, shift_code, updated_at, updated_by) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    total = 0
+    with engine.begin() as connection:
+        for team_id, person_ids in people_ids.items():
+            rows = []
+            for day in days:
+                for person_id in person_ids:
+                    if rng.random() < fill:
+                        rows.append((team_id, person_id, day, rng.choice(codes), updated_at, bench_id))
+                if len(rows) >= SYNTHETIC_CHUNK_ROWS:
+                    connection.exec_driver_sql(insert, rows)
+                    total += len(rows)
+                    rows = []
+            if rows:
+                connection.exec_driver_sql(insert, rows)
+                total += len(rows)
+        connection.exec_driver_sql("ANALYZE")
+    print(
+        f"Seeded {teams} teams x {people_per_team} people, {users} users and "
+        f"{total} schedule cells from {start} to {end - timedelta(days=1)}."
+    )
+
+
+def migrate_database(explain: bool = True) -> None:
+    config = load_config()
+    print(f"Migrating database at {config.database_path}")
+    applied = run_migrations(engine)
+    for migration in applied:
+        print(f"  applied {migration.version:04d} {migration.name}")
+    if not applied:
+        print(f"  already at version {MIGRATIONS[-1].version}")
+    if explain:
+        for label, plan in explain_hot_queries(engine):
+            print(f"\n{label}")
+            for line in plan:
+                print(f"  {line}")
+
+
+def archive_schedule(before: date, team_ids: list[int] | None, dry_run: bool, vacuum: bool) -> None:
+    """Pack every team-month that ended before ``before`` into schedule_archives."""
+    cutoff = month_start(before)
+    if cutoff > month_start(date.today()):
+        raise SystemExit("Only finished months can be archived; --before must not lie beyond the current month.")
+    run_migrations(engine, analyze=False)
+    with session_scope() as session:
+        pending = pending_months(session, cutoff, team_ids)
+    if not pending:
+        print(f"No live schedule rows before {cutoff}.")
+        return
+    if dry_run:
+        for team_id, month in pending:
+            print(f"  team {team_id} {month:%Y-%m}")
+        print(f"{len(pending)} team-months would be archived.")
+        return
+    rows = cells = packed = 0
+    for team_id, month in pending:
+        # one short write transaction per team-month keeps the app responsive
+        with session_scope() as session:
+            result = archive_month(session, team_id, month)
+            # the triggers counted the deleted live rows out; the archive row holds them now
+            set_month_counts(session, team_id, month, month_cells(session, team_id, month))
+        rows += result.live_rows
+        cells += result.cells
+        packed += result.packed_bytes
+        print(f"  team {team_id} {month:%Y-%m}: {result.live_rows} rows -> {result.packed_bytes} bytes")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+    print(f"Archived {len(pending)} team-months: {rows} rows removed, {cells} cells in {packed} packed bytes.")
+    if vacuum:
+        # VACUUM cannot run inside the transaction the writer engine opens on every connection
+        raw = engine.raw_connection()
+        try:
+            raw.driver_connection.execute("VACUUM")
+        finally:
+            raw.close()
+        print("Database file compacted.")
+
+
+def _team_ids(team_ids: list[int] | None) -> list[int]:
+    with session_scope() as session:
+        stmt = select(Team.id).order_by(Team.id)
+        if team_ids:
+            stmt = stmt.where(Team.id.in_(team_ids))
+        return list(session.execute(stmt).scalars())
+
+
+def snapshot_schedules(team_ids: list[int] | None, note: str | None, keep_days: int | None) -> None:
+    """Snapshot every team (or the given ones), one write transaction per team."""
+    run_migrations(engine, analyze=False)
+    teams = _team_ids(team_ids)
+    blobs = stored = 0
+    for team_id in teams:
+        with session_scope() as session:
+            result = create_snapshot(session, team_id, note=note)
+            snapshot_id, cells = result.snapshot.id, result.snapshot.cell_count
+        blobs += result.new_blobs
+        stored += result.new_bytes
+        print(
+            f"  team {team_id}: snapshot {snapshot_id}, {cells} cells in {result.months} months "
+            f"({result.reused_months} unchanged, {result.new_blobs} new blobs, {result.new_bytes} bytes)"
+        )
+    print(f"Snapshotted {len(teams)} teams: {blobs} new blobs, {stored} bytes stored.")
+    if keep_days is not None:
+        with session_scope() as session:
+            snapshots, orphans = prune_snapshots(session, datetime.utcnow() - timedelta(days=keep_days))
+        print(f"Pruned {snapshots} snapshots older than {keep_days} days and {orphans} unused blobs.")
+
+
+def compact_history(keep_days: int | None, team_ids: list[int] | None) -> None:
+    """Compact each team's change log older than ``keep_days`` to the last change per cell."""
+    if keep_days is None:
+        keep_days = load_config().history_retention_days
+    if keep_days <= 0:
+        print("History retention is disabled (history_retention_days = 0).")
+        return
+    run_migrations(engine, analyze=False)
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    teams = _team_ids(team_ids)
+    total = 0
+    for team_id in teams:
+        with session_scope() as session:
+            floor = history_floor(session, team_id)
+            target = compaction_target(session, team_id, cutoff)
+        deleted = 0
+        while floor < target:
+            # short write transactions so the app's writers are never held up for long
+            upto = min(floor + COMPACT_BATCH, target)
+            with session_scope() as session:
+                deleted += compact_changes(session, team_id, floor, upto)
+            floor = upto
+        if deleted:
+            print(f"  team {team_id}: {deleted} rows removed, compacted up to revision {floor}")
+        total += deleted
+    print(f"Compacted the change log of {len(teams)} teams before {cutoff:%Y-%m-%d}: {total} rows removed.")
+
+
+def rebuild_stats(team_ids: list[int] | None) -> None:
+    """Recompute the coverage counters behind GET /schedule/stats, one transaction per team."""
+    run_migrations(engine, analyze=False)
+    teams = _team_ids(team_ids)
+    for team_id in teams:
+        with session_scope() as session:
+            rows = rebuild_counts(session, team_id)
+        print(f"  team {team_id}: {rows} counter rows")
+    print(f"Rebuilt the coverage counters of {len(teams)} teams.")
+
+
+def check_rules(team_ids: list[int] | None) -> None:
+    """Re-evaluate the roster rules over the whole schedule and store the violations, one transaction per team."""
+    run_migrations(engine, analyze=False)
+    teams = _team_ids(team_ids)
+    for team_id in teams:
+        with session_scope() as session:
+            delta = store_range(session, team_id)
+            total = session.execute(
+                select(func.count()).select_from(RosterViolation).where(RosterViolation.team_id == team_id)
+            ).scalar()
+        print(f"  team {team_id}: {total} violations ({len(delta.new)} new, {len(delta.resolved)} resolved)")
+    print(f"Checked the roster rules of {len(teams)} teams.")
+
+
+def restore_schedule(snapshot_id: int, username: str) -> None:
+    with session_scope() as session:
+        user = session.execute(select(User).where(User.username == username)).scalar_one_or_none()
+        if user is None:
+            raise SystemExit(f"Unknown user {username}")
+        snapshot = session.get(ScheduleSnapshot, snapshot_id)
+        if snapshot is None:
+            raise SystemExit(f"Unknown snapshot {snapshot_id}")
+        revision, cells = restore_snapshot(session, snapshot, user.id)
+        team_id = snapshot.team_id
+    print(f"Restored snapshot {snapshot_id} of team {team_id}: {cells} cells, revision {revision}.")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Scheduling platform CLI")
     subparsers = parser.add_subparsers(dest="command")
 
     subparsers.add_parser("init-db", help="Initialize the SQLite database with demo data")
+    migrate_parser = subparsers.add_parser("migrate", help="Apply pending schema migrations and run ANALYZE")
+    migrate_parser.add_argument("--no-explain", action="store_true", help="Skip printing query plans")
+    seed_parser = subparsers.add_parser("seed-synthetic", help="Bulk-generate a large synthetic dataset")
+    seed_parser.add_argument("--teams", type=int, default=10)
+    seed_parser.add_argument("--people-per-team", type=int, default=40)
+    seed_parser.add_argument("--years", type=int, default=2)
+    seed_parser.add_argument("--start-year", type=int, default=date.today().year - 1)
+    seed_parser.add_argument("--users", type=int, default=200, help="Extra accounts for the permission overview")
+    seed_parser.add_argument("--fill", type=float, default=0.9, help="Share of (person, day) cells with a shift")
+    seed_parser.add_argument("--seed", type=int, default=1)
+    archive_parser = subparsers.add_parser("archive", help="Pack finished months into the compact archive table")
+    archive_parser.add_argument(
+        "--before", type=date.fromisoformat, required=True, help="Archive months that ended before this date"
+    )
+    archive_parser.add_argument("--team", type=int, action="append", dest="team_ids", help="Limit to a team id")
+    archive_parser.add_argument("--dry-run", action="store_true", help="Only list the team-months to archive")
+    archive_parser.add_argument("--vacuum", action="store_true", help="Run VACUUM afterwards to shrink the file")
+    snapshot_parser = subparsers.add_parser("snapshot", help="Snapshot the schedule of every team")
+    snapshot_parser.add_argument("--team", type=int, action="append", dest="team_ids", help="Limit to a team id")
+    snapshot_parser.add_argument("--note", help="Stored with each snapshot")
+    snapshot_parser.add_argument(
+        "--keep-days", type=int, help="Afterwards delete snapshots older than this (each team keeps its newest)"
+    )
+    compact_parser = subparsers.add_parser("compact-history", help="Compact old schedule change history")
+    compact_parser.add_argument(
+        "--keep-days", type=int, help="Keep full history this many days (default: history_retention_days)"
+    )
+    compact_parser.add_argument("--team", type=int, action="append", dest="team_ids", help="Limit to a team id")
+    stats_parser = subparsers.add_parser("rebuild-stats", help="Recompute the schedule coverage counters")
+    stats_parser.add_argument("--team", type=int, action="append", dest="team_ids", help="Limit to a team id")
+    rules_parser = subparsers.add_parser("check-rules", help="Re-evaluate the roster rules and store the violations")
+    rules_parser.add_argument("--team", type=int, action="append", dest="team_ids", help="Limit to a team id")
+    restore_parser = subparsers.add_parser("restore", help="Restore a schedule snapshot")
+    restore_parser.add_argument("snapshot_id", type=int)
+    restore_parser.add_argument("--user", required=True, help="Username recorded as the author of the restore")
 
     args = parser.parse_args()
     if args.command == "init-db":
         init_database()
+    elif args.command == "migrate":
+        migrate_database(explain=not args.no_explain)
+    elif args.command == "seed-synthetic":
+        seed_synthetic(
+            teams=args.teams,
+            people_per_team=args.people_per_team,
+            years=args.years,
+            start_year=args.start_year,
+            users=args.users,
+            fill=args.fill,
+            seed=args.seed,
+        )
+    elif args.command == "archive":
+        archive_schedule(args.before, args.team_ids, dry_run=args.dry_run, vacuum=args.vacuum)
+    elif args.command == "snapshot":
+        snapshot_schedules(args.team_ids, args.note, args.keep_days)
+    elif args.command == "compact-history":
+        compact_history(args.keep_days, args.team_ids)
+    elif args.command == "rebuild-stats":
+        rebuild_stats(args.team_ids)
+    elif args.command == "check-rules":
+        check_rules(args.team_ids)
+    elif args.command == "restore":
+        restore_schedule(args.snapshot_id, args.user)
     else:
         parser.print_help()
 
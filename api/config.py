@@ -3,11 +3,14 @@ from __future__ import annotations
 from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import tomllib
 
 DEFAULT_CONFIG_PATH = Path("config/app.toml")
+SQLITE_JOURNAL_MODES = {"WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"}
+SQLITE_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+SQLITE_TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
 
 
 @dataclass
@@ -15,6 +18,35 @@ class AppConfig:
     database_path: Path
     secret_key: str
     session_max_age: int = 7 * 24 * 60 * 60  # one week by default
+    db_threads: int = 8  # worker threads for request handlers (all database access)
+    db_read_connections: int = 16  # pooled read-only SQLite connections
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: int = 5000  # milliseconds
+    sqlite_cache_size: int = -65536  # negative values are KiB
+    sqlite_mmap_size: int = 268435456  # bytes
+    sqlite_temp_store: str = "MEMORY"
+    write_queue: bool = False  # group concurrent writes into shared transactions
+    write_queue_window_ms: int = 2  # how long the writer waits for more writes to join a batch
+    write_queue_max_batch: int = 64
+    schedule_cache_blocks: int = 256  # cached (team, month) schedule grids
+    sse_queue_size: int = 256  # pending events per SSE connection before it is dropped
+    sse_heartbeat: int = 15  # seconds between SSE keep-alive comments
+    export_dir: Path = Path("data/exports")
+    export_workers: int = 2
+    bcrypt_rounds: int = 12  # cost of new password hashes; older hashes are upgraded on login
+    password_workers: int = 2  # threads dedicated to bcrypt hashing/verification
+    principal_cache_size: int = 1024  # cached authenticated users
+    principal_cache_ttl: int = 60  # seconds a cached user may be served without a reload
+    slow_query_ms: int = 200  # statements slower than this are logged with their plan; 0 disables
+    slow_query_buffer: int = 200  # slow statements kept in memory for the admin endpoint
+    slow_query_log: Optional[Path] = None  # rotating JSON-lines file, off when unset
+    metrics_token: Optional[str] = None  # bearer token that may scrape /api/metrics without a session
+    history_retention_days: int = 180  # full change history kept by compact-history; 0 keeps everything
+    generate_workers: int = 2  # processes searching roster proposals; 0 searches in the request thread
+    generate_budget_ms: int = 2000  # default wall-clock budget of a search
+    generate_max_budget_ms: int = 10000
+    proposal_ttl: int = 900  # seconds a generated proposal can still be committed
 
 
 def _coerce_path(base: Path, value: str) -> Path:
@@ -33,6 +65,14 @@ def _load_config_dict(path: Path) -> Dict[str, Any]:
         return tomllib.load(fp)
 
 
+def _choice(raw: Dict[str, Any], key: str, default: str, allowed: set[str]) -> str:
+    # these values are interpolated into PRAGMA statements
+    value = str(raw.get(key, default)).upper()
+    if value not in allowed:
+        raise ValueError(f"Configuration {key} must be one of {', '.join(sorted(allowed))}")
+    return value
+
+
 @lru_cache(maxsize=1)
 def load_config(path: Path | None = None) -> AppConfig:
     config_path = path or DEFAULT_CONFIG_PATH
@@ -43,4 +83,66 @@ def load_config(path: Path | None = None) -> AppConfig:
     if not secret_key:
         raise ValueError("Configuration secret_key must be provided in config/app.toml")
     session_max_age = int(raw.get("session_max_age", 7 * 24 * 60 * 60))
-    return AppConfig(database_path=database_path, secret_key=secret_key, session_max_age=session_max_age)
+    db_threads = int(raw.get("db_threads", 8))
+    db_read_connections = int(raw.get("db_read_connections", 16))
+    sqlite_journal_mode = _choice(raw, "sqlite_journal_mode", "WAL", SQLITE_JOURNAL_MODES)
+    sqlite_synchronous = _choice(raw, "sqlite_synchronous", "NORMAL", SQLITE_SYNCHRONOUS)
+    sqlite_busy_timeout = int(raw.get("sqlite_busy_timeout", 5000))
+    sqlite_cache_size = int(raw.get("sqlite_cache_size", -65536))
+    sqlite_mmap_size = int(raw.get("sqlite_mmap_size", 268435456))
+    sqlite_temp_store = _choice(raw, "sqlite_temp_store", "MEMORY", SQLITE_TEMP_STORES)
+    write_queue = bool(raw.get("write_queue", False))
+    write_queue_window_ms = int(raw.get("write_queue_window_ms", 2))
+    write_queue_max_batch = int(raw.get("write_queue_max_batch", 64))
+    schedule_cache_blocks = int(raw.get("schedule_cache_blocks", 256))
+    sse_queue_size = int(raw.get("sse_queue_size", 256))
+    sse_heartbeat = int(raw.get("sse_heartbeat", 15))
+    export_dir = _coerce_path(base_dir, raw.get("export_dir", "data/exports"))
+    export_workers = int(raw.get("export_workers", 2))
+    bcrypt_rounds = int(raw.get("bcrypt_rounds", 12))
+    password_workers = int(raw.get("password_workers", 2))
+    principal_cache_size = int(raw.get("principal_cache_size", 1024))
+    principal_cache_ttl = int(raw.get("principal_cache_ttl", 60))
+    slow_query_ms = int(raw.get("slow_query_ms", 200))
+    slow_query_buffer = int(raw.get("slow_query_buffer", 200))
+    slow_query_log = _coerce_path(base_dir, raw["slow_query_log"]) if raw.get("slow_query_log") else None
+    metrics_token = raw.get("metrics_token") or None
+    history_retention_days = int(raw.get("history_retention_days", 180))
+    generate_workers = int(raw.get("generate_workers", 2))
+    generate_budget_ms = int(raw.get("generate_budget_ms", 2000))
+    generate_max_budget_ms = int(raw.get("generate_max_budget_ms", 10000))
+    proposal_ttl = int(raw.get("proposal_ttl", 900))
+    return AppConfig(
+        database_path=database_path,
+        secret_key=secret_key,
+        session_max_age=session_max_age,
+        db_threads=db_threads,
+        db_read_connections=db_read_connections,
+        sqlite_journal_mode=sqlite_journal_mode,
+        sqlite_synchronous=sqlite_synchronous,
+        sqlite_busy_timeout=sqlite_busy_timeout,
+        sqlite_cache_size=sqlite_cache_size,
+        sqlite_mmap_size=sqlite_mmap_size,
+        sqlite_temp_store=sqlite_temp_store,
+        write_queue=write_queue,
+        write_queue_window_ms=write_queue_window_ms,
+        write_queue_max_batch=write_queue_max_batch,
+        schedule_cache_blocks=schedule_cache_blocks,
+        sse_queue_size=sse_queue_size,
+        sse_heartbeat=sse_heartbeat,
+        export_dir=export_dir,
+        export_workers=export_workers,
+        bcrypt_rounds=bcrypt_rounds,
+        password_workers=password_workers,
+        principal_cache_size=principal_cache_size,
+        principal_cache_ttl=principal_cache_ttl,
+        slow_query_ms=slow_query_ms,
+        slow_query_buffer=slow_query_buffer,
+        slow_query_log=slow_query_log,
+        metrics_token=metrics_token,
+        history_retention_days=history_retention_days,
+        generate_workers=generate_workers,
+        generate_budget_ms=generate_budget_ms,
+        generate_max_budget_ms=generate_max_budget_ms,
+        proposal_ttl=proposal_ttl,
+    )
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import time
 from contextlib import contextmanager
-from pathlib import Path
-from typing import Generator
+from typing import Callable, Generator
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
-from .config import load_config
+from . import metrics
+from .slow_queries import slow_query_log
+from .config import AppConfig, load_config
 
 
 class Base(DeclarativeBase):
@@ -15,17 +17,134 @@ class Base(DeclarativeBase):
 
 
 
-def _build_engine(database_path: Path):
+def _pragmas(config: AppConfig, read_only: bool) -> list[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout={config.sqlite_busy_timeout}",
+        f"PRAGMA synchronous={config.sqlite_synchronous}",
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA cache_size={config.sqlite_cache_size}",
+        f"PRAGMA mmap_size={config.sqlite_mmap_size}",
+        f"PRAGMA temp_store={config.sqlite_temp_store}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    else:
+        # persistent in the database file; WAL is what lets readers run alongside the writer
+        pragmas.insert(0, f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+    return pragmas
+
+
+def _build_engine(config: AppConfig, read_only: bool = False):
+    database_path = config.database_path
     if database_path.parent and not database_path.parent.exists():
         database_path.parent.mkdir(parents=True, exist_ok=True)
     engine_url = f"sqlite:///{database_path}"
+    connect_args = {"check_same_thread": False}
+    if not read_only:
+        # transactions are opened explicitly below
+        connect_args["isolation_level"] = None
     # using synchronous sqlite; disable thread check for FastAPI background usage
-    return create_engine(engine_url, connect_args={"check_same_thread": False})
+    engine = create_engine(
+        engine_url,
+        connect_args=connect_args,
+        pool_size=config.db_read_connections if read_only else 1,
+        max_overflow=0,
+    )
+    pragmas = _pragmas(config, read_only)
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    label = "reader" if read_only else "writer"
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(connection, cursor, statement, parameters, context, executemany) -> None:
+        connection.info["statement_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop_timer(connection, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - connection.info.pop("statement_started")
+        metrics.record_statement(label, elapsed)
+        slow_query_log.observe(label, cursor.connection, statement, parameters, executemany, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _count_locked(context) -> None:
+        # busy_timeout already retried internally; this is the caller seeing it fail
+        if "database is locked" in str(context.original_exception):
+            metrics.database_locked.inc(label)
+
+    if not read_only:
+
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(connection) -> None:
+            # take the write lock up front: a deferred transaction that reads first and
+            # upgrades later fails with "database is locked" instead of waiting
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
 
 
 _config = load_config()
-engine = _build_engine(_config.database_path)
+# A single writer connection serializes writes inside this process; readers use a
+# separate query_only pool and, under WAL, never wait for the writer.
+engine = _build_engine(_config)
+read_engine = _build_engine(_config, read_only=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def after_commit(session: Session, callback: Callable[[], None]) -> None:
+    """Run ``callback`` once the session's current transaction commits.
+
+    Callbacks are discarded on rollback, so in-memory state (caches, pushed
+    events) never reflects a write that did not reach the database.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(SessionLocal, "after_transaction_create")
+def _mark_savepoint(session: Session, transaction) -> None:
+    if transaction.nested:
+        marks = session.info.setdefault("after_commit_marks", [])
+        marks.append(len(session.info.get("after_commit", [])))
+
+
+@event.listens_for(SessionLocal, "after_transaction_end")
+def _unmark_savepoint(session: Session, transaction) -> None:
+    if transaction.nested:
+        session.info["after_commit_marks"].pop()
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _start_commit_timer(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        # a released savepoint; its callbacks wait for the outer commit
+        return
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        metrics.commit_seconds.observe(time.perf_counter() - started)
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        # only what the rolled back savepoint registered
+        mark = session.info["after_commit_marks"][-1]
+        del session.info.get("after_commit", [])[mark:]
+        return
+    session.info.pop("after_commit", None)
 
 
 def get_session() -> Generator:
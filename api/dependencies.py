@@ -2,14 +2,17 @@ from __future__ import annotations
 
 from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy import select
-from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm import Session, selectinload
 
-from .database import SessionLocal
-from .models import User, UserPagePermission, UserTeamPermission
+from .database import ReadSessionLocal, SessionLocal
+from .models import User, UserTeamPermission
+from .principals import Principal, principal_cache
 from .security import decode_session_token
 
 
-async def get_db() -> Session:
+def get_db() -> Session:
+    """Session on the writer connection; hand it to run_write only, since any
+    statement on it takes the database write lock until the request ends."""
     session = SessionLocal()
     try:
         yield session
@@ -17,35 +20,57 @@ async def get_db() -> Session:
         session.close()
 
 
-async def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
-    token = request.cookies.get("session_token")
-    if not token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
-    payload = decode_session_token(token)
-    if not payload:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
+def get_read_db() -> Session:
+    """Session on the read-only pool, for handlers that never write."""
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _load_principal(db: Session, user_id: int, token_version: int) -> Principal | None:
+    generation = principal_cache.generation(user_id)
     stmt = (
         select(User)
         .options(
             selectinload(User.page_permissions),
             selectinload(User.team_permissions).joinedload(UserTeamPermission.team),
         )
-        .where(User.id == payload["user_id"])
+        .where(User.id == user_id)
     )
     user = db.execute(stmt).scalar_one_or_none()
-    if not user or not user.is_active or user.token_version != payload.get("token_version"):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
-    return user
+    if not user or not user.is_active or user.token_version != token_version:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(principal, generation)
+    return principal
 
 
-def _page_permission_lookup(user: User) -> dict[str, UserPagePermission]:
-    return {perm.page: perm for perm in user.page_permissions}
+def get_current_user(request: Request) -> Principal:
+    token = request.cookies.get("session_token")
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
+    payload = decode_session_token(token)
+    if not payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
+    user_id, token_version = payload["user_id"], payload.get("token_version")
+    principal = principal_cache.get(user_id, token_version)
+    if principal is None:
+        # only a cache miss needs a session; hits never touch the database
+        db = ReadSessionLocal()
+        try:
+            principal = _load_principal(db, user_id, token_version)
+        finally:
+            db.close()
+    if principal is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
+    return principal
 
 
 def require_page_permission(page: str, require_edit: bool = False):
-    def dependency(user: User = Depends(get_current_user)) -> User:
-        lookup = _page_permission_lookup(user)
-        perm = lookup.get(page)
+    def dependency(user: Principal = Depends(get_current_user)) -> Principal:
+        perm = user.pages.get(page)
         if not perm or not perm.can_view:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail={"error": "forbidden"})
         if require_edit and not perm.can_edit:
@@ -55,9 +80,9 @@ def require_page_permission(page: str, require_edit: bool = False):
     return dependency
 
 
-def ensure_team_access(user: User, team_id: int, min_level: str) -> str:
-    levels = {perm.team_id: perm.access_level for perm in user.team_permissions}
-    level = levels.get(team_id)
+def ensure_team_access(user: Principal, team_id: int, min_level: str) -> str:
+    grant = user.teams.get(team_id)
+    level = grant.access_level if grant else None
     allowed = False
     if min_level == "read" and level in {"read", "write"}:
         allowed = True
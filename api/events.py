@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from .config import load_config
+
+
+@dataclass
+class ScheduleEvent:
+    team_id: int
+    revision: int
+    event: str  # "cells" or "reset"
+    data: dict
+
+
+@dataclass(eq=False)
+class Subscription:
+    team_id: int
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue
+    dropped: bool = False
+
+    def offer(self, event: ScheduleEvent) -> None:
+        # runs on the subscriber's event loop
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # a consumer this far behind reconnects and catches up from the change log
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class ScheduleEventBroker:
+    """In-process pub/sub of committed schedule changes, one channel per team."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self.dropped_total = 0
+
+    def subscribe(self, team_id: int) -> Subscription:
+        subscription = Subscription(
+            team_id=team_id,
+            loop=asyncio.get_running_loop(),
+            queue=asyncio.Queue(maxsize=self.queue_size),
+        )
+        with self._lock:
+            self._subscribers.setdefault(team_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.team_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.team_id]
+        if subscription.dropped:
+            self.dropped_total += 1
+
+    def publish(self, event: ScheduleEvent) -> None:
+        """Fan an event out to the team's subscribers; safe to call from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.team_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # the subscriber's loop is already closed
+                self.unsubscribe(subscription)
+
+    def connection_count(self, team_id: Optional[int] = None) -> int:
+        with self._lock:
+            if team_id is not None:
+                return len(self._subscribers.get(team_id, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+
+broker = ScheduleEventBroker(queue_size=load_config().sse_queue_size)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .config import load_config
+from .database import ReadSessionLocal
+from .exports import iter_schedule_csv
+from .grid_cache import team_axes
+from .models import Team
+from .revisions import current_revision
+
+MAX_TRACKED_JOBS = 500
+
+
+@dataclass
+class ExportJob:
+    id: str
+    team_ids: List[int]
+    start: date
+    end: date
+    created_by: int
+    artifact: Path
+    status: str = "queued"  # queued / running / done / failed
+    teams_done: int = 0
+    cached: bool = False
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def filename(self) -> str:
+        return f"schedule_{self.start}_{self.end}.zip"
+
+
+def _range_key(team_ids: List[int], start: date, end: date) -> str:
+    raw = f"{','.join(str(t) for t in team_ids)}|{start}|{end}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _revision_key(revisions: Dict[int, int]) -> str:
+    raw = ",".join(f"{team_id}:{rev}" for team_id, rev in sorted(revisions.items()))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ExportJobManager:
+    """Builds multi-team ZIP exports on a small worker pool, off the request path.
+
+    Artifacts are named after (teams, range) and the team revisions they were
+    built from, so a repeated request is served from disk until one of the
+    teams changes. A file is kept while a tracked job refers to it.
+    """
+
+    def __init__(self, export_dir: Path, workers: int):
+        self.export_dir = export_dir
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, ExportJob] = OrderedDict()
+        self._building: Dict[Path, ExportJob] = {}
+
+    def submit(self, team_ids: List[int], start: date, end: date, user_id: int) -> ExportJob:
+        team_ids = sorted(set(team_ids))
+        session = ReadSessionLocal()
+        try:
+            revisions = {team_id: current_revision(session, team_id) for team_id in team_ids}
+        finally:
+            session.close()
+        range_key = _range_key(team_ids, start, end)
+        artifact = self.export_dir / f"{range_key}-{_revision_key(revisions)}.zip"
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            team_ids=team_ids,
+            start=start,
+            end=end,
+            created_by=user_id,
+            artifact=artifact,
+        )
+        with self._lock:
+            running = self._building.get(artifact)
+            if running is not None:
+                # identical export already in flight; report that job's progress
+                return running
+            self._track(job)
+            if artifact.exists():
+                job.status = "done"
+                job.cached = True
+                job.teams_done = len(team_ids)
+                job.finished_at = datetime.utcnow()
+                return job
+            self._building[artifact] = job
+        self._executor.submit(self._run, job, range_key)
+        return job
+
+    def get(self, job_id: str) -> ExportJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _track(self, job: ExportJob) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > MAX_TRACKED_JOBS:
+            _, evicted = self._jobs.popitem(last=False)
+            if not self._referenced(evicted.artifact):
+                evicted.artifact.unlink(missing_ok=True)
+
+    def _referenced(self, artifact: Path) -> bool:
+        # caller holds the lock
+        return artifact in self._building or any(job.artifact == artifact for job in self._jobs.values())
+
+    def _run(self, job: ExportJob, range_key: str) -> None:
+        job.status = "running"
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        partial = job.artifact.with_suffix(".part")
+        session = ReadSessionLocal()
+        try:
+            with zipfile.ZipFile(partial, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for team_id in job.team_ids:
+                    team = session.get(Team, team_id)
+                    revision = current_revision(session, team_id)
+                    axes = team_axes(session, team_id, revision)
+                    name = f"schedule_{team.code if team else team_id}_{job.start}_{job.end}.csv"
+                    with archive.open(name, "w") as member:
+                        for chunk in iter_schedule_csv(session, team_id, revision, job.start, job.end, axes):
+                            member.write(chunk.encode("utf-8"))
+                    job.teams_done += 1
+            os.replace(partial, job.artifact)
+            # artifacts for older revisions of the same export are never handed to a new job;
+            # the ones a tracked job still points at go when that job is evicted
+            with self._lock:
+                for stale in self.export_dir.glob(f"{range_key}-*.zip"):
+                    if stale != job.artifact and not self._referenced(stale):
+                        stale.unlink(missing_ok=True)
+            job.finished_at = datetime.utcnow()
+            job.status = "done"
+        except Exception as exc:  # surfaced to the client through the job status
+            partial.unlink(missing_ok=True)
+            job.error = str(exc)
+            job.finished_at = datetime.utcnow()
+            job.status = "failed"
+        finally:
+            session.close()
+            with self._lock:
+                self._building.pop(job.artifact, None)
+
+
+_config = load_config()
+export_jobs = ExportJobManager(_config.export_dir, _config.export_workers)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import csv
+import io
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from .archive import month_cells
+from .grid_cache import TeamAxes, grid_cache
+from .utils import iter_months, next_month, weekday_name
+
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+DayCells = Dict[Tuple[int, date], str]  # (person_id, day) -> shift_code
+
+
+def iter_schedule_days(
+    db: Session, team_id: int, revision: int, start: date, end: date
+) -> Iterator[Tuple[date, DayCells]]:
+    """Yield every day in the range with a lookup holding at least that day's cells.
+
+    Cached month blocks are reused as-is; other months, live or archived, are
+    read one at a time and not put into the cache, so one long export does
+    not evict the months planners are working on.
+    """
+    for month in iter_months(start, end):
+        month_end = next_month(month) - timedelta(days=1)
+        block = grid_cache.get_block(team_id, month, revision)
+        cells = block.cells if block is not None else month_cells(db, team_id, month)
+        current = max(start, month)
+        while current <= min(end, month_end):
+            yield current, cells
+            current += timedelta(days=1)
+
+
+def iter_schedule_csv(
+    db: Session, team_id: int, revision: int, start: date, end: date, axes: TeamAxes
+) -> Iterator[str]:
+    people = axes.people
+    shifts = {shift.code: shift.display_name for shift in axes.shifts}
+    output = io.StringIO()
+    writer = csv.writer(output)
+    header = ["日期", "星期"] + [person.name for person in people]
+    writer.writerow(header)
+    days = iter_schedule_days(db, team_id, revision, start, end) if people else _empty_days(start, end)
+    for current, cells in days:
+        row: List[str] = [current.isoformat(), weekday_name(current)]
+        for person in people:
+            code = cells.get((person.id, current))
+            row.append(shifts.get(code, code) if code else "")
+        writer.writerow(row)
+        if output.tell() >= EXPORT_FLUSH_BYTES:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    yield output.getvalue()
+
+
+def _empty_days(start: date, end: date) -> Iterator[Tuple[date, DayCells]]:
+    current = start
+    while current <= end:
+        yield current, {}
+        current += timedelta(days=1)
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .archive import MonthCells, month_cells
+from .config import load_config
+from .models import Person, RosterRule, ShiftDefinition
+from .revisions import changes_since, current_revision
+from .roster_solver import EMPTY, Problem, Solution, solve
+from .utils import iter_months
+
+MAX_TRACKED_PROPOSALS = 200
+# extra wait past the budget for workers to start up and send their result back
+RESULT_GRACE = 2.0
+# more changes than this since the proposal was computed count as a conflict
+MAX_COMMIT_CHANGES = 10000
+
+
+@dataclass
+class PersonLimits:
+    unavailable: Set[date] = field(default_factory=set)
+    max_shifts: Optional[int] = None
+    max_consecutive: Optional[int] = None
+    shift_codes: Optional[Set[str]] = None  # None: any code of the coverage
+
+
+@dataclass
+class GenerationSpec:
+    start: date
+    end: date
+    coverage: Dict[str, int]  # people per shift code on every day
+    day_coverage: Dict[date, Dict[str, int]] = field(default_factory=dict)  # replaces coverage on those days
+    people: Dict[int, PersonLimits] = field(default_factory=dict)
+    max_shifts: Optional[int] = None
+    max_consecutive: Optional[int] = None
+    rest_after: List[Tuple[str, str]] = field(default_factory=list)
+    use_team_rules: bool = True
+    keep_existing: bool = True
+
+
+@dataclass
+class Proposal:
+    id: str
+    team_id: int
+    start: date
+    end: date
+    revision: int  # team revision the proposal was computed from
+    margin: int  # days around the range the search read
+    created_by: int
+    cells: Dict[Tuple[int, date], Optional[str]]  # changes to the current schedule
+    uncovered: List[Tuple[date, str, int]]  # (day, shift code, people missing)
+    cost: int
+    shortage: int
+    excess: int
+    rule_violations: int
+    searches: int
+    iterations: int
+    created_at: datetime
+    expires_at: datetime
+
+
+@dataclass
+class _Prepared:
+    problem: Problem
+    people: List[int]
+    days: List[date]
+    existing: MonthCells
+
+
+def _prepare(db: Session, team_id: int, spec: GenerationSpec) -> _Prepared:
+    people = db.execute(
+        select(Person.id)
+        .where(Person.team_id == team_id, Person.active.is_(True), Person.show_in_schedule.is_(True))
+        .order_by(Person.sort_index, Person.name)
+    ).scalars().all()
+    shifts = db.execute(
+        select(ShiftDefinition.code, ShiftDefinition.is_rest).where(ShiftDefinition.team_id == team_id)
+    ).all()
+    rest_codes = {code for code, is_rest in shifts if is_rest}
+
+    days = [spec.start + timedelta(days=offset) for offset in range((spec.end - spec.start).days + 1)]
+    wanted = [dict(spec.day_coverage.get(day, spec.coverage)) for day in days]
+    forbidden = list(spec.rest_after)
+    team_limit = spec.max_consecutive
+    if spec.use_team_rules:
+        rules = db.execute(
+            select(RosterRule).where(RosterRule.team_id == team_id, RosterRule.is_active.is_(True))
+        ).scalars()
+        for rule in rules:
+            if rule.kind == "rest_after":
+                forbidden.append((rule.shift_code, rule.next_code))
+            elif rule.kind == "max_consecutive":
+                team_limit = min(team_limit or rule.threshold, rule.threshold)
+            elif rule.kind == "min_headcount":
+                for by_code in wanted:
+                    by_code[rule.shift_code] = max(by_code.get(rule.shift_code, 0), rule.threshold)
+
+    limits = [spec.people.get(person_id, PersonLimits()) for person_id in people]
+    max_consecutive = [limit.max_consecutive or team_limit for limit in limits]
+    margin = max([limit for limit in max_consecutive if limit] + [1])
+    existing: MonthCells = {}
+    for month in iter_months(spec.start - timedelta(days=margin), spec.end + timedelta(days=margin)):
+        existing.update(month_cells(db, team_id, month))
+
+    codes = sorted(
+        {code for code, _ in shifts}
+        | {code for by_code in wanted for code in by_code}
+        | {code for pair in forbidden for code in pair}
+        | set(existing.values())
+    )
+    index = {code: position for position, code in enumerate(codes)}
+    assignable = sorted({index[code] for by_code in wanted for code in by_code})
+    first = spec.start - timedelta(days=margin)
+    width = len(days) + 2 * margin
+    grid: List[List[int]] = []
+    fixed: List[List[bool]] = []
+    allowed = []
+    for person_id, limit in zip(people, limits):
+        row = [EMPTY] * width
+        locked = [True] * width
+        for t in range(width):
+            code = existing.get((person_id, first + timedelta(days=t)))
+            if code is not None:
+                row[t] = index[code]
+        for offset, day in enumerate(days):
+            t = margin + offset
+            if day in limit.unavailable:
+                if not spec.keep_existing:
+                    row[t] = EMPTY
+            elif not (spec.keep_existing and row[t] != EMPTY):
+                locked[t] = False
+        grid.append(row)
+        fixed.append(locked)
+        codes_allowed = set(assignable)
+        if limit.shift_codes is not None:
+            codes_allowed &= {index[code] for code in limit.shift_codes if code in index}
+        allowed.append(frozenset(codes_allowed))
+
+    problem = Problem(
+        codes=codes,
+        assignable=assignable,
+        working=[code not in rest_codes for code in codes],
+        demand=[[by_code.get(code, 0) for code in codes] for by_code in wanted],
+        margin=margin,
+        days=len(days),
+        grid=grid,
+        fixed=fixed,
+        allowed=allowed,
+        max_shifts=[spec.max_shifts if limit.max_shifts is None else limit.max_shifts for limit in limits],
+        max_consecutive=max_consecutive,
+        forbidden=frozenset((index[before], index[after]) for before, after in forbidden),
+    )
+    return _Prepared(problem, list(people), days, existing)
+
+
+class ScheduleGenerator:
+    """Searches roster proposals on a process pool within a wall-clock budget.
+
+    Every worker runs its own randomized search until the deadline and the
+    best result wins. Proposals are kept in memory until they expire or are
+    committed; like export jobs they live in the process that made them.
+    """
+
+    def __init__(self, workers: int, ttl: int):
+        self.workers = workers
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._proposals: OrderedDict[str, Proposal] = OrderedDict()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: this process runs request and writer threads
+                context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def start(self) -> None:
+        """Start the worker processes now instead of within the first search's budget."""
+        if self.workers > 0:
+            pool = self._executor()
+            for _ in range(self.workers):
+                pool.submit(abs, 0)
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def search(self, problem: Problem, budget: float, seed: int) -> Tuple[Solution, int]:
+        """The best solution found within ``budget`` seconds and the number of searches it was chosen from."""
+        deadline = time.time() + budget
+        if self.workers <= 0:
+            return solve(problem, seed, deadline), 1
+        pool = self._executor()
+        try:
+            futures = [pool.submit(solve, problem, seed + offset, deadline) for offset in range(self.workers)]
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            return solve(problem, seed, deadline), 1
+        done, pending = wait(futures, timeout=budget + RESULT_GRACE)
+        for future in pending:
+            future.cancel()
+        results = []
+        for future in done:
+            error = future.exception()
+            if error is None:
+                results.append(future.result())
+            elif isinstance(error, BrokenProcessPool):
+                self._discard_pool(pool)
+        if not results:
+            # no worker answered in time (pool busy or broken): a greedy grid beats nothing
+            return solve(problem, seed, time.time()), 1
+        return min(results, key=lambda solution: solution.cost), len(results)
+
+    def generate(
+        self, db: Session, team_id: int, spec: GenerationSpec, user_id: int, budget: float, seed: int
+    ) -> Proposal:
+        # read before the cells, so a write in between makes the proposal stale rather than lost
+        revision = current_revision(db, team_id)
+        prepared = _prepare(db, team_id, spec)
+        problem = prepared.problem
+        if prepared.people and prepared.days:
+            solution, searches = self.search(problem, budget, seed)
+        else:
+            solution = Solution(0, 0, 0, 0, 0, seed, [[] for _ in prepared.people])
+            searches = 0
+
+        cells: Dict[Tuple[int, date], Optional[str]] = {}
+        counts = [[0] * len(problem.codes) for _ in prepared.days]
+        for person_id, row in zip(prepared.people, solution.rows):
+            for offset, code in enumerate(row):
+                day = prepared.days[offset]
+                shift_code = problem.codes[code] if code != EMPTY else None
+                if shift_code is not None:
+                    counts[offset][code] += 1
+                if prepared.existing.get((person_id, day)) != shift_code:
+                    cells[(person_id, day)] = shift_code
+        uncovered = [
+            (day, problem.codes[code], problem.demand[offset][code] - counts[offset][code])
+            for offset, day in enumerate(prepared.days)
+            for code in problem.assignable
+            if counts[offset][code] < problem.demand[offset][code]
+        ]
+
+        now = datetime.utcnow()
+        proposal = Proposal(
+            id=uuid.uuid4().hex,
+            team_id=team_id,
+            start=spec.start,
+            end=spec.end,
+            revision=revision,
+            margin=problem.margin,
+            created_by=user_id,
+            cells=cells,
+            uncovered=uncovered,
+            cost=solution.cost,
+            shortage=solution.shortage,
+            excess=solution.excess,
+            rule_violations=solution.rule_violations,
+            searches=searches,
+            iterations=solution.iterations,
+            created_at=now,
+            expires_at=now + timedelta(seconds=self.ttl),
+        )
+        with self._lock:
+            self._expire(now)
+            self._proposals[proposal.id] = proposal
+            while len(self._proposals) > MAX_TRACKED_PROPOSALS:
+                self._proposals.popitem(last=False)
+        return proposal
+
+    def _expire(self, now: datetime) -> None:
+        for proposal_id in [key for key, proposal in self._proposals.items() if proposal.expires_at <= now]:
+            del self._proposals[proposal_id]
+
+    def get(self, proposal_id: str) -> Proposal | None:
+        with self._lock:
+            self._expire(datetime.utcnow())
+            return self._proposals.get(proposal_id)
+
+    def discard(self, proposal_id: str) -> None:
+        with self._lock:
+            self._proposals.pop(proposal_id, None)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def proposal_is_stale(db: Session, proposal: Proposal) -> bool:
+    """Whether cells the search read were written since, or people or shifts changed."""
+    _, reset, rows = changes_since(db, proposal.team_id, proposal.revision, MAX_COMMIT_CHANGES)
+    if reset:
+        return True
+    first = proposal.start - timedelta(days=proposal.margin)
+    last = proposal.end + timedelta(days=proposal.margin)
+    return any(first <= row.day <= last for row in rows)
+
+
+_config = load_config()
+schedule_generator = ScheduleGenerator(_config.generate_workers, _config.proposal_ttl)
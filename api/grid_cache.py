@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import load_config
+from .models import Person, ShiftDefinition
+from .schemas import PersonOut, ShiftDefinitionOut
+from .utils import month_start
+
+CellKey = Tuple[int, date]  # (person_id, day)
+
+
+@dataclass
+class TeamAxes:
+    people: List[PersonOut]
+    shifts: List[ShiftDefinitionOut]
+
+
+@dataclass
+class MonthBlock:
+    month: date
+    cells: Dict[CellKey, Optional[str]]
+
+
+class ScheduleGridCache:
+    """Bounded LRU of built schedule grids keyed by (team_id, month).
+
+    Every team's entries are stamped with the team revision they reflect. A
+    read that observes a newer revision (e.g. written by another worker) drops
+    the team's blocks; writes made through this process patch the cached
+    cells and advance the stamp instead.
+    """
+
+    def __init__(self, max_blocks: int):
+        self.max_blocks = max_blocks
+        self._lock = threading.Lock()
+        self._blocks: OrderedDict[Tuple[int, date], MonthBlock] = OrderedDict()
+        self._axes: Dict[int, TeamAxes] = {}
+        self._revisions: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop_team(self, team_id: int) -> None:
+        self._axes.pop(team_id, None)
+        stale = [key for key in self._blocks if key[0] == team_id]
+        for key in stale:
+            del self._blocks[key]
+        if stale:
+            self.invalidations += 1
+
+    def _is_current(self, team_id: int, revision: int) -> bool:
+        cached = self._revisions.get(team_id)
+        if cached is None or cached < revision:
+            self._drop_team(team_id)
+            self._revisions[team_id] = revision
+            return True
+        return cached == revision
+
+    def get_axes(self, team_id: int, revision: int) -> TeamAxes | None:
+        with self._lock:
+            if not self._is_current(team_id, revision):
+                return None
+            return self._axes.get(team_id)
+
+    def put_axes(self, team_id: int, revision: int, axes: TeamAxes) -> None:
+        with self._lock:
+            if self._revisions.get(team_id) == revision:
+                self._axes[team_id] = axes
+
+    def get_block(self, team_id: int, month: date, revision: int) -> MonthBlock | None:
+        with self._lock:
+            block = self._blocks.get((team_id, month)) if self._is_current(team_id, revision) else None
+            if block is None:
+                self.misses += 1
+                return None
+            self._blocks.move_to_end((team_id, month))
+            self.hits += 1
+            return block
+
+    def put_block(self, team_id: int, revision: int, block: MonthBlock) -> None:
+        if self.max_blocks <= 0:
+            return
+        with self._lock:
+            # a reader that raced with a newer write must not store what it saw
+            if self._revisions.get(team_id) != revision:
+                return
+            self._blocks[(team_id, block.month)] = block
+            self._blocks.move_to_end((team_id, block.month))
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+                self.evictions += 1
+
+    def apply_cells(
+        self, team_id: int, revision: int, cells: Iterable[Tuple[int, date, Optional[str]]]
+    ) -> None:
+        """Patch cells written by the commit that produced ``revision``."""
+        with self._lock:
+            cached = self._revisions.get(team_id)
+            if cached is None:
+                return
+            if cached != revision - 1:
+                self._drop_team(team_id)
+                self._revisions[team_id] = max(cached, revision)
+                return
+            patched: Dict[Tuple[int, date], Dict[CellKey, Optional[str]]] = {}
+            for person_id, day, shift_code in cells:
+                key = (team_id, month_start(day))
+                if key not in patched:
+                    block = self._blocks.get(key)
+                    if block is None:
+                        continue
+                    # copy on write: readers may still be iterating the old dict
+                    patched[key] = dict(block.cells)
+                if shift_code is None:
+                    patched[key].pop((person_id, day), None)
+                else:
+                    patched[key][(person_id, day)] = shift_code
+            for key, block_cells in patched.items():
+                self._blocks[key] = MonthBlock(month=key[1], cells=block_cells)
+            self._revisions[team_id] = revision
+
+    def drop_team(self, team_id: int, revision: int) -> None:
+        with self._lock:
+            self._drop_team(team_id)
+            self._revisions[team_id] = max(self._revisions.get(team_id, 0), revision)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "blocks": len(self._blocks),
+                "max_blocks": self.max_blocks,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+grid_cache = ScheduleGridCache(load_config().schedule_cache_blocks)
+
+
+def _collect_people(db: Session, team_id: int) -> List[Person]:
+    stmt = (
+        select(Person)
+        .where(
+            Person.team_id == team_id,
+            Person.active.is_(True),
+            Person.show_in_schedule.is_(True),
+        )
+        .order_by(Person.sort_index, Person.name)
+    )
+    return db.execute(stmt).scalars().all()
+
+
+def _collect_shifts(db: Session, team_id: int) -> List[ShiftDefinition]:
+    stmt = (
+        select(ShiftDefinition)
+        .where(ShiftDefinition.team_id == team_id)
+        .order_by(ShiftDefinition.sort_order, ShiftDefinition.id)
+    )
+    return db.execute(stmt).scalars().all()
+
+
+def team_axes(db: Session, team_id: int, revision: int) -> TeamAxes:
+    """Return the team's visible people and shift list, from cache when current."""
+    axes = grid_cache.get_axes(team_id, revision)
+    if axes is None:
+        axes = TeamAxes(
+            people=[PersonOut.from_orm(p) for p in _collect_people(db, team_id)],
+            shifts=[ShiftDefinitionOut.from_orm(s) for s in _collect_shifts(db, team_id)],
+        )
+        grid_cache.put_axes(team_id, revision, axes)
+    return axes
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Row, bindparam, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from .database import after_commit
+from .models import ChangeCode, ScheduleChange, TeamRevision
+
+COMPACT_BATCH = 5000  # revisions compacted per transaction
+
+_changes = ScheduleChange.__table__
+_insert_code = sqlite_insert(ChangeCode).on_conflict_do_nothing(index_elements=[ChangeCode.code])
+
+# code -> id of committed change_codes rows; the dictionary only ever grows
+_code_ids: Dict[str, int] = {}
+_code_lock = threading.Lock()
+
+
+def code_ids(db: Session, codes: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Dictionary ids of the given shift codes, adding the unknown ones in the caller's transaction."""
+    wanted = {code for code in codes if code is not None}
+    with _code_lock:
+        found = {code: _code_ids[code] for code in wanted if code in _code_ids}
+    missing = wanted - found.keys()
+    if missing:
+        db.execute(_insert_code, [{"code": code} for code in missing])
+        added = dict(db.execute(select(ChangeCode.code, ChangeCode.id).where(ChangeCode.code.in_(missing))).all())
+        found.update(added)
+
+        def _remember() -> None:
+            with _code_lock:
+                _code_ids.update(added)
+
+        # a rolled back insert must not leave its id behind
+        after_commit(db, _remember)
+    return found
+
+
+def select_changes() -> Select:
+    """schedule_changes rows with their shift code decoded."""
+    return select(
+        ScheduleChange.id,
+        ScheduleChange.revision,
+        ScheduleChange.person_id,
+        ScheduleChange.day,
+        ChangeCode.code.label("shift_code"),
+        ScheduleChange.updated_at,
+        ScheduleChange.updated_by,
+    ).outerjoin(ChangeCode, ChangeCode.id == ScheduleChange.code_id)
+
+
+def history_floor(db: Session, team_id: int) -> int:
+    floor = db.execute(
+        select(TeamRevision.history_floor).where(TeamRevision.team_id == team_id)
+    ).scalar_one_or_none()
+    return floor or 0
+
+
+def cell_history(
+    db: Session,
+    team_id: int,
+    person_id: int | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    before: int | None = None,
+    limit: int = 100,
+) -> List[Row]:
+    """Cell changes of a team, newest first, optionally for one person and a range of days.
+
+    Served by the (person_id, day) or (team_id, day) index; ``before`` is the
+    id of the last row of the previous page.
+    """
+    stmt = select_changes().where(ScheduleChange.team_id == team_id, ScheduleChange.person_id.is_not(None))
+    if person_id is not None:
+        stmt = stmt.where(ScheduleChange.person_id == person_id)
+    if start is not None:
+        stmt = stmt.where(ScheduleChange.day >= start)
+    if end is not None:
+        stmt = stmt.where(ScheduleChange.day <= end)
+    if before is not None:
+        stmt = stmt.where(ScheduleChange.id < before)
+    return db.execute(stmt.order_by(ScheduleChange.id.desc()).limit(limit)).all()
+
+
+def compaction_target(db: Session, team_id: int, cutoff: datetime) -> int:
+    """The newest revision of the team logged before ``cutoff``."""
+    revision = db.execute(
+        select(func.max(ScheduleChange.revision)).where(
+            ScheduleChange.team_id == team_id, ScheduleChange.updated_at < cutoff
+        )
+    ).scalar()
+    return revision or 0
+
+
+def compact_changes(db: Session, team_id: int, floor: int, upto: int) -> int:
+    """Compact the team's log from revision ``floor`` up to ``upto`` in the caller's transaction.
+
+    Of the cell changes at or below ``upto`` only the newest per cell is
+    kept and reset markers are dropped; the change feed answers ``since``
+    values below the new floor with a reset. Returns the number of rows deleted.
+    """
+    newest: Dict[Tuple[int, date], int] = {}
+    rows = db.execute(
+        select(ScheduleChange.id, ScheduleChange.person_id, ScheduleChange.day).where(
+            ScheduleChange.team_id == team_id,
+            ScheduleChange.revision > floor,
+            ScheduleChange.revision <= upto,
+            ScheduleChange.person_id.is_not(None),
+        )
+    )
+    for change_id, person_id, day in rows:
+        if change_id > newest.get((person_id, day), 0):
+            newest[(person_id, day)] = change_id
+    deleted = 0
+    if newest:
+        result = db.execute(
+            _changes.delete().where(
+                _changes.c.person_id == bindparam("cell_person"),
+                _changes.c.day == bindparam("cell_day"),
+                _changes.c.team_id == team_id,
+                _changes.c.id < bindparam("newest"),
+            ),
+            [
+                {"cell_person": person_id, "cell_day": day, "newest": change_id}
+                for (person_id, day), change_id in newest.items()
+            ],
+        )
+        deleted += result.rowcount
+    markers = db.execute(
+        _changes.delete().where(
+            _changes.c.team_id == team_id,
+            _changes.c.person_id.is_(None),
+            _changes.c.revision > floor,
+            _changes.c.revision <= upto,
+        )
+    )
+    deleted += markers.rowcount
+    db.execute(
+        TeamRevision.__table__.update()
+        .where(TeamRevision.team_id == team_id)
+        .values(history_floor=upto)
+    )
+    return deleted
@@ -1,22 +1,103 @@
 from __future__ import annotations
 
+import asyncio
+import hmac
 from pathlib import Path
 
-from fastapi import APIRouter, FastAPI
-from fastapi.responses import FileResponse
+import anyio.to_thread
+from fastapi import APIRouter, Depends, FastAPI, Request
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-from .routers import auth, people, permissions, schedule, shifts, teams
+from . import metrics
+from .config import load_config
+from .dependencies import get_current_user, require_page_permission
+from .events import broker
+from .generation import schedule_generator
+from .grid_cache import grid_cache
+from .principals import principal_cache
+from .routers import (
+    admin,
+    auth,
+    exports,
+    generation,
+    people,
+    permissions,
+    rules,
+    schedule,
+    shifts,
+    snapshots,
+    sse,
+    teams,
+)
+from .security import password_hasher
+from .slow_queries import slow_query_log
+from .write_queue import write_queue
 
 app = FastAPI(title="排班系统 API")
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.on_event("startup")
+async def configure_threadpool() -> None:
+    # Handlers that touch the database are plain ``def`` functions, which FastAPI
+    # runs on anyio's worker threads; this limit bounds concurrent DB work per
+    # worker process while the event loop stays free for cheap and SSE requests.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = load_config().db_threads
+
+
+@app.on_event("startup")
+async def start_loop_watcher() -> None:
+    app.state.loop_watcher = asyncio.create_task(metrics.watch_event_loop())
+
+
+@app.on_event("shutdown")
+async def stop_loop_watcher() -> None:
+    app.state.loop_watcher.cancel()
+
+
+@app.on_event("startup")
+def start_schedule_generator() -> None:
+    schedule_generator.start()
+
+
+@app.on_event("shutdown")
+def stop_schedule_generator() -> None:
+    schedule_generator.shutdown()
+
+
+def _threadpool_stats() -> dict:
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "threads": limiter.total_tokens,
+        "busy": limiter.borrowed_tokens,
+        "waiting": limiter.statistics().tasks_waiting,
+    }
+
+
+metrics.registry.collect("threadpool", _threadpool_stats)
+metrics.registry.collect("schedule_cache", grid_cache.stats)
+metrics.registry.collect("password_hashing", password_hasher.stats)
+metrics.registry.collect("principal_cache", principal_cache.stats)
+metrics.registry.collect("write_queue", lambda: write_queue.stats() if write_queue else None)
+metrics.registry.collect("slow_queries", lambda: {"total": slow_query_log.total})
+metrics.registry.collect(
+    "sse", lambda: {"connections": broker.connection_count(), "dropped_total": broker.dropped_total}
+)
 
 api_router = APIRouter(prefix="/api")
 api_router.include_router(auth.router)
 api_router.include_router(teams.router)
 api_router.include_router(shifts.router)
+api_router.include_router(rules.router)
 api_router.include_router(people.router)
 api_router.include_router(schedule.router)
+api_router.include_router(exports.router)
+api_router.include_router(snapshots.router)
+api_router.include_router(generation.router)
 api_router.include_router(permissions.router)
+api_router.include_router(sse.router)
+api_router.include_router(admin.router)
 
 
 @app.get("/api/health")
@@ -24,6 +105,19 @@ async def health_check():
     return {"status": "ok"}
 
 
+def _ensure_metrics_access(request: Request) -> None:
+    token = load_config().metrics_token
+    if token and hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        return
+    # same gate as the other operational endpoints under /api/admin
+    require_page_permission("permissions")(get_current_user(request))
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def read_metrics(_: None = Depends(_ensure_metrics_access)):
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(api_router)
 
 
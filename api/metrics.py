@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # per label set: bucket counts (non cumulative, last one is +Inf), sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        lines: List[str] = []
+        for key, counts, total in series:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return lines
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format.
+
+    Besides the metrics created here, ``collect`` registers a ``stats()``
+    callable whose numeric values are exported as gauges under a prefix, so the
+    counters the caches and pools already keep need no second bookkeeping.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, Callable[[], Optional[dict]]]] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(f"{self.namespace}_{name}", help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(f"{self.namespace}_{name}", help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(f"{self.namespace}_{name}", help, labelnames, buckets))
+
+    def collect(self, prefix: str, stats: Callable[[], Optional[dict]]) -> None:
+        self._collectors.append((prefix, stats))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        for prefix, stats in self._collectors:
+            for key, value in (stats() or {}).items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.namespace}_{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry("app")
+
+requests_total = registry.counter("requests_total", "Finished HTTP requests.", ("method", "route", "status"))
+requests_in_flight = registry.gauge("requests_in_flight", "HTTP requests being handled.")
+request_seconds = registry.histogram(
+    "request_duration_seconds", "Time from receiving a request to its last body chunk.", ("method", "route")
+)
+request_sql_seconds = registry.histogram(
+    "request_sql_seconds", "Time spent executing SQL statements per request.", ("method", "route")
+)
+request_sql_statements = registry.histogram(
+    "request_sql_statements", "SQL statements executed per request.", ("method", "route"), COUNT_BUCKETS
+)
+sql_seconds = registry.histogram("sql_statement_seconds", "Execution time of single SQL statements.", ("engine",))
+commit_seconds = registry.histogram("db_commit_seconds", "Flush and COMMIT time of write transactions.")
+database_locked = registry.counter(
+    "db_locked_errors_total",
+    "Statements that failed with 'database is locked' after busy_timeout ran out.",
+    ("engine",),
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "How late a periodic timer fires on the event loop.", buckets=LATENCY_BUCKETS
+)
+
+
+@dataclass
+class RequestSQL:
+    scope: Optional[dict] = None
+    statements: int = 0
+    seconds: float = 0.0
+
+
+# set per request by the middleware; worker threads inherit it through the copied context
+current_request: ContextVar[Optional[RequestSQL]] = ContextVar("current_request_sql", default=None)
+
+
+def record_statement(engine: str, elapsed: float) -> None:
+    sql_seconds.observe(elapsed, engine)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+
+
+def route_label(scope: dict) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    if scope["path"].startswith("/public"):
+        return "/public"
+    # unmatched paths are not used as labels: every 404 would add a series
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        began = time.perf_counter()
+        stats = RequestSQL(scope)
+        token = current_request.set(stats)
+        status = 500
+        requests_in_flight.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            requests_in_flight.dec()
+            method, route = scope["method"], route_label(scope)
+            request_seconds.observe(time.perf_counter() - began, method, route)
+            request_sql_seconds.observe(stats.seconds, method, route)
+            request_sql_statements.observe(stats.statements, method, route)
+            requests_total.inc(method, route, str(status))
+
+
+async def watch_event_loop(interval: float = 0.5) -> None:
+    """Sample event loop lag: a blocked loop wakes this timer up late."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, loop.time() - expected))
@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import Engine, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from .history import select_changes
+from .stats import TRIGGERS, rebuild_counts
+from .models import (
+    ChangeCode,
+    Person,
+    RosterRule,
+    RosterViolation,
+    ScheduleArchive,
+    ScheduleChange,
+    ScheduleDayCount,
+    ScheduleEntry,
+    ScheduleSnapshot,
+    SchemaMigration,
+    ShiftDefinition,
+    SnapshotBlob,
+    SnapshotMonth,
+    Team,
+    TeamRevision,
+)
+from .utils import month_start, next_month
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def _sql(*statements: str) -> Callable[[Connection], None]:
+    def apply(connection: Connection) -> None:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+
+    return apply
+
+
+def _create(*models) -> Callable[[Connection], None]:
+    def apply(connection: Connection) -> None:
+        for model in models:
+            model.__table__.create(connection, checkfirst=True)
+
+    return apply
+
+
+# The tables of the released baseline, frozen: every table and column added since
+# comes from its own migration, on fresh and existing databases alike. Indexes are
+# left to migration 2.
+_BASELINE_TABLES = (
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        username VARCHAR(64) NOT NULL,
+        display_name VARCHAR(128) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        must_change_password BOOLEAN NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        token_version INTEGER NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (username)
+    )""",
+    """CREATE TABLE IF NOT EXISTS teams (
+        id INTEGER NOT NULL,
+        name VARCHAR(128) NOT NULL,
+        code VARCHAR(64) NOT NULL,
+        description TEXT,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name),
+        UNIQUE (code)
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_page_permissions (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        page VARCHAR(32) NOT NULL,
+        can_view BOOLEAN NOT NULL,
+        can_edit BOOLEAN NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_user_page UNIQUE (user_id, page),
+        FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_team_permissions (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        access_level VARCHAR(16) NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_user_team UNIQUE (user_id, team_id),
+        FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE,
+        FOREIGN KEY(team_id) REFERENCES teams (id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS shift_definitions (
+        id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        code VARCHAR(32) NOT NULL,
+        display_name VARCHAR(64) NOT NULL,
+        bg_color VARCHAR(16) NOT NULL,
+        text_color VARCHAR(16) NOT NULL,
+        sort_order INTEGER NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_shift_code UNIQUE (team_id, code),
+        FOREIGN KEY(team_id) REFERENCES teams (id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS people (
+        id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        name VARCHAR(128) NOT NULL,
+        active BOOLEAN NOT NULL,
+        show_in_schedule BOOLEAN NOT NULL,
+        sort_index INTEGER NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_person_name UNIQUE (team_id, name),
+        FOREIGN KEY(team_id) REFERENCES teams (id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS schedule_entries (
+        id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        person_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        shift_code VARCHAR(32),
+        updated_at DATETIME NOT NULL,
+        updated_by INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_schedule_cell UNIQUE (team_id, person_id, day),
+        FOREIGN KEY(team_id) REFERENCES teams (id) ON DELETE CASCADE,
+        FOREIGN KEY(person_id) REFERENCES people (id) ON DELETE CASCADE,
+        FOREIGN KEY(updated_by) REFERENCES users (id)
+    )""",
+)
+
+
+def _columns(connection: Connection, table: str) -> List[str]:
+    return [row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")]
+
+
+def _schedule_day_counts(connection: Connection) -> None:
+    ScheduleDayCount.__table__.create(connection, checkfirst=True)
+    for statement in TRIGGERS:
+        connection.exec_driver_sql(statement)
+    for team_id in connection.execute(select(Team.id)).scalars().all():
+        rebuild_counts(connection, team_id)
+
+
+def _roster_rules(connection: Connection) -> None:
+    if "is_rest" not in _columns(connection, "shift_definitions"):
+        connection.exec_driver_sql(
+            "ALTER TABLE shift_definitions ADD COLUMN is_rest BOOLEAN NOT NULL DEFAULT 0"
+        )
+        # the seeded teams use OFF for days off
+        connection.exec_driver_sql("UPDATE shift_definitions SET is_rest = 1 WHERE code = 'OFF'")
+    RosterRule.__table__.create(connection, checkfirst=True)
+    RosterViolation.__table__.create(connection, checkfirst=True)
+
+
+# Append only: a released migration is never edited, a new version is added instead.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_tables", _sql(*_BASELINE_TABLES)),
+    Migration(
+        2,
+        "schedule_indexes",
+        _sql(
+            "CREATE INDEX IF NOT EXISTS idx_people_team_sort ON people(team_id, sort_index)",
+            "CREATE INDEX IF NOT EXISTS idx_shift_team_sort ON shift_definitions(team_id, sort_order)",
+            "CREATE INDEX IF NOT EXISTS idx_schedule_team_day_cover "
+            "ON schedule_entries(team_id, day, person_id, shift_code)",
+            # a prefix of the covering index; keeping both only slows writes down
+            "DROP INDEX IF EXISTS idx_schedule_team_day",
+        ),
+    ),
+    Migration(3, "schedule_archives", _create(ScheduleArchive)),
+    Migration(4, "schedule_snapshots", _create(SnapshotBlob, ScheduleSnapshot, SnapshotMonth)),
+    Migration(5, "change_log", _create(TeamRevision, ChangeCode, ScheduleChange)),
+    Migration(6, "schedule_day_counts", _schedule_day_counts),
+    Migration(7, "roster_rules", _roster_rules),
+]
+
+
+def applied_versions(connection: Connection) -> Dict[int, datetime]:
+    SchemaMigration.__table__.create(bind=connection, checkfirst=True)
+    rows = connection.execute(select(SchemaMigration.version, SchemaMigration.applied_at))
+    return {version: applied_at for version, applied_at in rows}
+
+
+def run_migrations(engine: Engine, analyze: bool = True) -> List[Migration]:
+    """Apply pending migrations, each in its own transaction; returns the ones applied."""
+    with engine.begin() as connection:
+        done = applied_versions(connection)
+    applied: List[Migration] = []
+    for migration in MIGRATIONS:
+        if migration.version in done:
+            continue
+        with engine.begin() as connection:
+            migration.apply(connection)
+            connection.execute(
+                SchemaMigration.__table__.insert().values(
+                    version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+                )
+            )
+        applied.append(migration)
+    if analyze:
+        with engine.begin() as connection:
+            # refresh planner statistics so the new indexes are actually chosen
+            connection.exec_driver_sql("ANALYZE")
+    return applied
+
+
+def hot_queries(team_id: int, today: date) -> List[Tuple[str, Select]]:
+    """The statements behind the busiest endpoints, with representative parameters."""
+    month = month_start(today)
+    return [
+        (
+            "schedule month block (GET /schedule, GET /schedule/export)",
+            select(ScheduleEntry.person_id, ScheduleEntry.day, ScheduleEntry.shift_code).where(
+                ScheduleEntry.team_id == team_id,
+                ScheduleEntry.day >= month,
+                ScheduleEntry.day < next_month(month),
+            ),
+        ),
+        (
+            "archived month",
+            select(ScheduleArchive.people, ScheduleArchive.codes, ScheduleArchive.cells).where(
+                ScheduleArchive.team_id == team_id, ScheduleArchive.month == month
+            ),
+        ),
+        (
+            "team people",
+            select(Person)
+            .where(Person.team_id == team_id, Person.active.is_(True), Person.show_in_schedule.is_(True))
+            .order_by(Person.sort_index, Person.name),
+        ),
+        (
+            "team shifts",
+            select(ShiftDefinition)
+            .where(ShiftDefinition.team_id == team_id)
+            .order_by(ShiftDefinition.sort_order, ShiftDefinition.id),
+        ),
+        (
+            "team revision",
+            select(TeamRevision.revision).where(TeamRevision.team_id == team_id),
+        ),
+        (
+            "coverage counters (GET /schedule/stats)",
+            select(ScheduleDayCount.day, ScheduleDayCount.shift_code, ScheduleDayCount.count).where(
+                ScheduleDayCount.team_id == team_id,
+                ScheduleDayCount.day >= month,
+                ScheduleDayCount.day <= today,
+                ScheduleDayCount.count > 0,
+            ),
+        ),
+        (
+            "rule violations (GET /schedule/violations)",
+            select(RosterViolation.rule_id, RosterViolation.person_id, RosterViolation.day).where(
+                RosterViolation.team_id == team_id, RosterViolation.day >= month, RosterViolation.day <= today
+            ),
+        ),
+        (
+            "change feed (GET /schedule/changes)",
+            select_changes()
+            .where(ScheduleChange.team_id == team_id, ScheduleChange.revision > 0)
+            .order_by(ScheduleChange.revision, ScheduleChange.id)
+            .limit(2001),
+        ),
+        (
+            "person history (GET /schedule/history?person_id=)",
+            select_changes()
+            .where(
+                ScheduleChange.team_id == team_id,
+                ScheduleChange.person_id == 1,
+                ScheduleChange.day >= month,
+                ScheduleChange.day <= today,
+            )
+            .order_by(ScheduleChange.id.desc())
+            .limit(100),
+        ),
+        (
+            "team history window (GET /schedule/history?start=&end=)",
+            select_changes()
+            .where(
+                ScheduleChange.team_id == team_id,
+                ScheduleChange.person_id.is_not(None),
+                ScheduleChange.day >= month,
+                ScheduleChange.day <= today,
+            )
+            .order_by(ScheduleChange.id.desc())
+            .limit(100),
+        ),
+    ]
+
+
+def explain_hot_queries(engine: Engine) -> List[Tuple[str, List[str]]]:
+    plans: List[Tuple[str, List[str]]] = []
+    with engine.connect() as connection:
+        team_id = connection.execute(select(func.min(Team.id))).scalar() or 1
+        for label, stmt in hot_queries(team_id, date.today()):
+            sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+            plans.append((label, [row[-1] for row in rows]))
+    return plans
@@ -1,13 +1,35 @@
 from __future__ import annotations
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 
-from sqlalchemy import Boolean, Date, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy import Boolean, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.types import TypeDecorator
 
 from .database import Base
 
 
+class EpochMicros(TypeDecorator):
+    """Naive UTC datetime stored as integer microseconds since 1970-01-01.
+
+    Microseconds keep the value equal to the DateTime columns it mirrors.
+    """
+
+    impl = Integer
+    cache_ok = True
+    epoch = datetime(1970, 1, 1)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return (value - self.epoch) // timedelta(microseconds=1)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self.epoch + timedelta(microseconds=value)
+
+
 class TimestampMixin:
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -68,7 +90,10 @@ class UserTeamPermission(Base):
 
 class ShiftDefinition(Base, TimestampMixin):
     __tablename__ = "shift_definitions"
-    __table_args__ = (UniqueConstraint("team_id", "code", name="uq_shift_code"),)
+    __table_args__ = (
+        UniqueConstraint("team_id", "code", name="uq_shift_code"),
+        Index("idx_shift_team_sort", "team_id", "sort_order"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
@@ -78,13 +103,18 @@ class ShiftDefinition(Base, TimestampMixin):
     text_color: Mapped[str] = mapped_column(String(16), nullable=False)
     sort_order: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    # a day off: does not count as a working day for roster rules
+    is_rest: Mapped[bool] = mapped_column(Boolean, default=False, server_default="0", nullable=False)
 
     team: Mapped[Team] = relationship("Team", back_populates="shifts")
 
 
 class Person(Base, TimestampMixin):
     __tablename__ = "people"
-    __table_args__ = (UniqueConstraint("team_id", "name", name="uq_person_name"),)
+    __table_args__ = (
+        UniqueConstraint("team_id", "name", name="uq_person_name"),
+        Index("idx_people_team_sort", "team_id", "sort_index"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
@@ -99,7 +129,11 @@ class Person(Base, TimestampMixin):
 
 class ScheduleEntry(Base):
     __tablename__ = "schedule_entries"
-    __table_args__ = (UniqueConstraint("team_id", "person_id", "day", name="uq_schedule_cell"),)
+    __table_args__ = (
+        UniqueConstraint("team_id", "person_id", "day", name="uq_schedule_cell"),
+        # covers the (team, day range) reads of the grid and the export without touching the table
+        Index("idx_schedule_team_day_cover", "team_id", "day", "person_id", "shift_code"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
@@ -112,3 +146,155 @@ class ScheduleEntry(Base):
     person: Mapped[Person] = relationship("Person", back_populates="schedule_entries")
     team: Mapped[Team] = relationship("Team")
     updated_by_user: Mapped[User] = relationship("User")
+
+
+class ScheduleArchive(Base):
+    """One finished team-month packed into a single row (see api.archive).
+
+    Live schedule_entries rows of the same month take precedence over it.
+    """
+
+    __tablename__ = "schedule_archives"
+
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    month: Mapped[date] = mapped_column(Date, primary_key=True)
+    people: Mapped[str] = mapped_column(Text, nullable=False)  # JSON list of person ids
+    codes: Mapped[str] = mapped_column(Text, nullable=False)  # JSON list of shift codes
+    cells: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    cell_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SnapshotBlob(Base):
+    """A packed team-month (see api.archive.pack_month), shared by every snapshot holding it."""
+
+    __tablename__ = "snapshot_blobs"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of the packed content
+    people: Mapped[str] = mapped_column(Text, nullable=False)
+    codes: Mapped[str] = mapped_column(Text, nullable=False)
+    cells: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    cell_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class ScheduleSnapshot(Base):
+    __tablename__ = "schedule_snapshots"
+    __table_args__ = (Index("idx_schedule_snapshots_team", "team_id", "id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
+    # covered months; both empty for a snapshot of the team's whole schedule
+    start_month: Mapped[date | None] = mapped_column(Date, nullable=True)
+    end_month: Mapped[date | None] = mapped_column(Date, nullable=True)
+    revision: Mapped[int] = mapped_column(Integer, nullable=False)
+    cell_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    note: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    created_by: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    months: Mapped[list[SnapshotMonth]] = relationship("SnapshotMonth", cascade="all, delete-orphan")
+
+
+class SnapshotMonth(Base):
+    """A month of a snapshot; months without any shift have no row."""
+
+    __tablename__ = "snapshot_months"
+    __table_args__ = (Index("idx_snapshot_months_blob", "blob_hash"),)
+
+    snapshot_id: Mapped[int] = mapped_column(ForeignKey("schedule_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    month: Mapped[date] = mapped_column(Date, primary_key=True)
+    blob_hash: Mapped[str] = mapped_column(ForeignKey("snapshot_blobs.hash"), nullable=False)
+
+
+class RosterRule(Base, TimestampMixin):
+    """A roster rule of a team; see api.rules for the kinds and their parameters."""
+
+    __tablename__ = "roster_rules"
+    __table_args__ = (Index("idx_roster_rules_team", "team_id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    shift_code: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    next_code: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    threshold: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+
+
+class RosterViolation(Base):
+    """Current violations of the team's roster rules, maintained by api.rules."""
+
+    __tablename__ = "roster_violations"
+    __table_args__ = (Index("idx_roster_violations_team_day", "team_id", "day"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
+    rule_id: Mapped[int] = mapped_column(ForeignKey("roster_rules.id", ondelete="CASCADE"), nullable=False)
+    # null for team wide rules (headcount)
+    person_id: Mapped[int | None] = mapped_column(ForeignKey("people.id", ondelete="CASCADE"), nullable=True)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+    value: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    detected_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ScheduleDayCount(Base):
+    """Cells per team, day and shift code, maintained by triggers on schedule_entries (see api.stats)."""
+
+    __tablename__ = "schedule_day_counts"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    shift_code: Mapped[str] = mapped_column(String(32), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class TeamRevision(Base):
+    __tablename__ = "team_revisions"
+
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    revision: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # changes up to this revision were compacted to the last one per cell
+    history_floor: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+
+class ChangeCode(Base):
+    """Dictionary of the shift codes referenced by schedule_changes."""
+
+    __tablename__ = "change_codes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    code: Mapped[str] = mapped_column(String(32), unique=True, nullable=False)
+
+
+class ScheduleChange(Base):
+    """Append-only log of schedule changes, one row per cell per revision.
+
+    Rows without a person_id are reset markers written when a change (people,
+    shifts) cannot be expressed as cell deltas. Rows are kept small: the
+    shift code is an id into change_codes and the time is an integer.
+    """
+
+    __tablename__ = "schedule_changes"
+    __table_args__ = (
+        Index("idx_schedule_changes_team_rev", "team_id", "revision"),
+        Index("idx_schedule_changes_team_day", "team_id", "day"),
+        Index("idx_schedule_changes_person_day", "person_id", "day"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
+    revision: Mapped[int] = mapped_column(Integer, nullable=False)
+    person_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    code_id: Mapped[int | None] = mapped_column(ForeignKey("change_codes.id"), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(EpochMicros, default=datetime.utcnow, nullable=False)
+    updated_by: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(128), nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+from .config import load_config
+from .models import User
+
+PrincipalKey = Tuple[int, int]  # (user_id, token_version)
+
+
+@dataclass(frozen=True)
+class PageGrant:
+    page: str
+    can_view: bool
+    can_edit: bool
+
+
+@dataclass(frozen=True)
+class TeamGrant:
+    team_id: int
+    team_name: str
+    team_code: str
+    team_description: Optional[str]
+    access_level: str
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Immutable snapshot of an authenticated user and their permissions.
+
+    ``pages`` and ``teams`` are read-only lookup tables; ``page_list`` and
+    ``team_list`` keep the display order used by the API responses.
+    """
+
+    id: int
+    username: str
+    display_name: str
+    must_change_password: bool
+    token_version: int
+    pages: Mapping[str, PageGrant]
+    teams: Mapping[int, TeamGrant]
+    page_list: Tuple[PageGrant, ...]
+    team_list: Tuple[TeamGrant, ...]
+
+    @classmethod
+    def from_user(cls, user: User) -> Principal:
+        page_list = tuple(
+            PageGrant(page=perm.page, can_view=perm.can_view, can_edit=perm.can_edit)
+            for perm in sorted(user.page_permissions, key=lambda p: p.page)
+        )
+        team_list = tuple(
+            TeamGrant(
+                team_id=perm.team_id,
+                team_name=perm.team.name,
+                team_code=perm.team.code,
+                team_description=perm.team.description,
+                access_level=perm.access_level,
+            )
+            for perm in sorted(user.team_permissions, key=lambda p: p.team.name)
+        )
+        return cls(
+            id=user.id,
+            username=user.username,
+            display_name=user.display_name,
+            must_change_password=user.must_change_password,
+            token_version=user.token_version,
+            pages=MappingProxyType({grant.page: grant for grant in page_list}),
+            teams=MappingProxyType({grant.team_id: grant for grant in team_list}),
+            page_list=page_list,
+            team_list=team_list,
+        )
+
+
+class PrincipalCache:
+    """LRU of principals keyed by (user_id, token_version), each entry living ``ttl`` seconds.
+
+    Changes made through this process invalidate the user's entries on commit;
+    the TTL bounds how long another worker process may serve a stale entry.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[PrincipalKey, Tuple[float, Principal]] = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, user_id: int) -> int:
+        """Snapshot to pass to ``put``; taken before loading the user from the database."""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, user_id: int, token_version: int) -> Principal | None:
+        key = (user_id, token_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, principal: Principal, generation: int) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        key = (principal.id, principal.token_version)
+        with self._lock:
+            # the user changed while this principal was being loaded
+            if self._generations.get(principal.id, 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            stale = [key for key in self._entries if key[0] == user_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+_config = load_config()
+principal_cache = PrincipalCache(_config.principal_cache_size, _config.principal_cache_ttl)
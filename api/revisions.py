@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import date, datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Row, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .database import after_commit
+from .events import ScheduleEvent, broker
+from .grid_cache import grid_cache
+from .history import code_ids, select_changes
+from .models import ScheduleChange, TeamRevision
+
+
+def current_revision(db: Session, team_id: int) -> int:
+    revision = db.execute(
+        select(TeamRevision.revision).where(TeamRevision.team_id == team_id)
+    ).scalar_one_or_none()
+    return revision or 0
+
+
+def _revision_and_floor(db: Session, team_id: int) -> Tuple[int, int]:
+    row = db.execute(
+        select(TeamRevision.revision, TeamRevision.history_floor).where(TeamRevision.team_id == team_id)
+    ).first()
+    return (row.revision, row.history_floor) if row else (0, 0)
+
+
+def bump_revision(db: Session, team_id: int) -> int:
+    """Advance the team's revision inside the caller's transaction."""
+    stmt = (
+        sqlite_insert(TeamRevision)
+        .values(team_id=team_id, revision=1)
+        .on_conflict_do_update(
+            index_elements=[TeamRevision.team_id],
+            set_={"revision": TeamRevision.revision + 1},
+        )
+        .returning(TeamRevision.revision)
+    )
+    return db.execute(stmt).scalar_one()
+
+
+def record_cell_changes(
+    db: Session,
+    team_id: int,
+    cells: List[Tuple[int, date, Optional[str]]],
+    now: datetime,
+    user_id: int | None = None,
+) -> int:
+    """Bump the revision for a batch of cell writes, log them and patch cached grids on commit.
+
+    ``now`` is the updated_at stored with the cells, so the log and the
+    pushed events carry the same timestamp the writer got back.
+    """
+    revision = bump_revision(db, team_id)
+    codes = code_ids(db, (shift_code for _, _, shift_code in cells))
+    db.execute(
+        insert(ScheduleChange),
+        [
+            {
+                "team_id": team_id,
+                "revision": revision,
+                "person_id": person_id,
+                "day": day,
+                "code_id": codes.get(shift_code),
+                "updated_at": now,
+                "updated_by": user_id,
+            }
+            for person_id, day, shift_code in cells
+        ],
+    )
+    event = ScheduleEvent(
+        team_id=team_id,
+        revision=revision,
+        event="cells",
+        data={
+            "revision": revision,
+            "changes": [
+                {
+                    "person_id": person_id,
+                    "day": day.isoformat(),
+                    "shift_code": shift_code,
+                    "updated_at": now.isoformat(),
+                    "updated_by": user_id,
+                }
+                for person_id, day, shift_code in cells
+            ],
+        },
+    )
+
+    def _on_commit() -> None:
+        grid_cache.apply_cells(team_id, revision, cells)
+        broker.publish(event)
+
+    after_commit(db, _on_commit)
+    return revision
+
+
+def record_team_change(db: Session, team_id: int, user_id: int | None = None) -> int:
+    """Bump the revision for a people/shift change, log a reset marker and drop cached grids on commit."""
+    revision = bump_revision(db, team_id)
+    db.execute(
+        insert(ScheduleChange).values(
+            team_id=team_id, revision=revision, updated_at=datetime.utcnow(), updated_by=user_id
+        )
+    )
+    event = ScheduleEvent(team_id=team_id, revision=revision, event="reset", data={"revision": revision})
+
+    def _on_commit() -> None:
+        grid_cache.drop_team(team_id, revision)
+        broker.publish(event)
+
+    after_commit(db, _on_commit)
+    return revision
+
+
+def changes_since(db: Session, team_id: int, since: int, limit: int) -> Tuple[int, bool, Sequence[Row]]:
+    """Return (revision, reset, changes) for everything committed after ``since``.
+
+    ``reset`` means the changes cannot be replayed as cell deltas (or were
+    compacted away) and the caller has to reload the schedule.
+    """
+    revision, floor = _revision_and_floor(db, team_id)
+    if since >= revision:
+        return revision, since > revision, []
+    if since < floor:
+        return revision, True, []
+    rows = db.execute(
+        select_changes()
+        .where(
+            ScheduleChange.team_id == team_id,
+            ScheduleChange.revision > since,
+            ScheduleChange.revision <= revision,
+        )
+        .order_by(ScheduleChange.revision, ScheduleChange.id)
+        .limit(limit + 1)
+    ).all()
+    if len(rows) > limit or any(row.person_id is None for row in rows):
+        return revision, True, []
+    return revision, False, rows
+
+
+def make_etag(team_id: int, revision: int, *parts: object) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:12]
+    return f'"{team_id}-{revision}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
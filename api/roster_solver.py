@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional, Tuple
+
+EMPTY = -1
+
+# the objective, in priority order: coverage, rules, not over-staffing, spreading shifts evenly
+SHORTAGE_COST = 1000
+RULE_COST = 100
+EXCESS_COST = 10
+# fairness costs the sum of squared shift counts per person, 1 per unit
+
+START_TEMPERATURE = 60.0
+END_TEMPERATURE = 0.5
+
+
+@dataclass
+class Problem:
+    """A generation request reduced to indices; pickled into the worker processes.
+
+    Grid rows cover ``margin`` days before and after the days to fill, so
+    rules see the existing cells across the edges of the range.
+    """
+
+    codes: List[str]
+    assignable: List[int]  # indices of the codes the solver may put into cells
+    working: List[bool]  # per code: counts as a working day
+    demand: List[List[int]]  # [day][code] people wanted on the days to fill
+    margin: int
+    days: int
+    grid: List[List[int]]  # [person][margin + days + margin] code index or EMPTY
+    fixed: List[List[bool]]  # cells the solver must not change
+    allowed: List[FrozenSet[int]]  # per person: assignable codes they may get
+    max_shifts: List[Optional[int]]  # per person, working days among the days to fill
+    max_consecutive: List[Optional[int]]  # per person
+    forbidden: FrozenSet[Tuple[int, int]]  # (code, code on the next day) pairs
+
+
+@dataclass
+class Solution:
+    cost: int
+    shortage: int
+    excess: int
+    rule_violations: int
+    iterations: int
+    seed: int
+    rows: List[List[int]]  # [person][day] over the days to fill
+
+
+def _coverage_cost(count: int, wanted: int) -> int:
+    if count < wanted:
+        return SHORTAGE_COST * (wanted - count)
+    return EXCESS_COST * (count - wanted)
+
+
+class _Shortages:
+    """The (day, code) pairs still short of people, with O(1) add, remove and random pick."""
+
+    def __init__(self) -> None:
+        self.items: List[Tuple[int, int]] = []
+        self.index: dict = {}
+
+    def add(self, item: Tuple[int, int]) -> None:
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item: Tuple[int, int]) -> None:
+        position = self.index.pop(item, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.index[last] = position
+
+    def choice(self, rng: random.Random) -> Tuple[int, int]:
+        return self.items[rng.randrange(len(self.items))]
+
+
+class _State:
+    def __init__(self, problem: Problem) -> None:
+        self.problem = problem
+        self.grid = [row[:] for row in problem.grid]
+        self.first = problem.margin
+        self.last = problem.margin + problem.days
+        self.total = len(self.grid[0]) if self.grid else 0
+        self.working = problem.working
+        self.forbidden = problem.forbidden
+        self.limits = problem.max_consecutive
+        self.reach = [max(limit or 1, 1) for limit in problem.max_consecutive]
+        self.counted = [False] * len(problem.codes)
+        for code in problem.assignable:
+            self.counted[code] = True
+        self.choices = [sorted(allowed) + [EMPTY] for allowed in problem.allowed]
+        self.free = [
+            [person for person in range(len(self.grid)) if not problem.fixed[person][self.first + day]]
+            for day in range(problem.days)
+        ]
+        self.mutable = [(person, self.first + day) for day, people in enumerate(self.free) for person in people]
+
+        self.cover = [[0] * len(problem.codes) for _ in range(problem.days)]
+        self.count = [0] * len(self.grid)
+        for person, row in enumerate(self.grid):
+            for t in range(self.first, self.last):
+                code = row[t]
+                if code != EMPTY:
+                    self.cover[t - self.first][code] += 1
+                    if self.working[code]:
+                        self.count[person] += 1
+        self.short = _Shortages()
+        cost = 0
+        for day in range(problem.days):
+            for code in problem.assignable:
+                cost += _coverage_cost(self.cover[day][code], problem.demand[day][code])
+                if self.cover[day][code] < problem.demand[day][code]:
+                    self.short.add((day, code))
+        for person in range(len(self.grid)):
+            cost += self.count[person] ** 2
+            cost += RULE_COST * sum(self._anchor(person, t) for t in range(self.first, self.total))
+        self.cost = cost
+
+    def _anchor(self, person: int, t: int) -> int:
+        """Rule violations anchored at cell t: the rest pair ending there, the run ending there."""
+        row = self.grid[person]
+        violations = 0
+        if t >= 1 and (row[t - 1], row[t]) in self.forbidden:
+            violations += 1
+        limit = self.limits[person]
+        if limit is not None and t >= limit:
+            working = self.working
+            for back in range(limit + 1):
+                code = row[t - back]
+                if code == EMPTY or not working[code]:
+                    break
+            else:
+                violations += 1
+        return violations
+
+    def _local(self, person: int, t: int) -> int:
+        return sum(self._anchor(person, u) for u in range(t, min(t + self.reach[person], self.total - 1) + 1))
+
+    def can_take(self, person: int, t: int, code: int) -> bool:
+        """Hard constraints: allowed codes and the person's maximum number of shifts."""
+        if code == EMPTY:
+            return True
+        if code not in self.problem.allowed[person]:
+            return False
+        limit = self.problem.max_shifts[person]
+        if limit is None or not self.working[code]:
+            return True
+        old = self.grid[person][t]
+        return (old != EMPTY and self.working[old]) or self.count[person] < limit
+
+    def change(self, person: int, t: int, code: int) -> int:
+        """Set a cell and return the change in cost."""
+        row = self.grid[person]
+        old = row[t]
+        if old == code:
+            return 0
+        before = self._local(person, t)
+        row[t] = code
+        delta = RULE_COST * (self._local(person, t) - before)
+        day = t - self.first
+        cover = self.cover[day]
+        demand = self.problem.demand[day]
+        for value, step in ((old, -1), (code, 1)):
+            if value == EMPTY or not self.counted[value]:
+                continue
+            count = cover[value]
+            delta += _coverage_cost(count + step, demand[value]) - _coverage_cost(count, demand[value])
+            cover[value] = count + step
+            if count + step < demand[value]:
+                self.short.add((day, value))
+            else:
+                self.short.discard((day, value))
+        was_working = old != EMPTY and self.working[old]
+        is_working = code != EMPTY and self.working[code]
+        if was_working != is_working:
+            count = self.count[person]
+            updated = count + (1 if is_working else -1)
+            delta += updated * updated - count * count
+            self.count[person] = updated
+        self.cost += delta
+        return delta
+
+    def construct(self, rng: random.Random) -> None:
+        """Fill the shortages day by day, giving shifts to the least loaded people that break no rule."""
+        problem = self.problem
+        for day in range(problem.days):
+            t = self.first + day
+            for code in rng.sample(problem.assignable, len(problem.assignable)):
+                need = problem.demand[day][code] - self.cover[day][code]
+                if need <= 0:
+                    continue
+                candidates = [
+                    person
+                    for person in self.free[day]
+                    if self.grid[person][t] == EMPTY and self.can_take(person, t, code)
+                ]
+                rng.shuffle(candidates)
+                candidates.sort(key=self.count.__getitem__)
+                for person in candidates:
+                    if need == 0:
+                        break
+                    before = self._local(person, t)
+                    self.change(person, t, code)
+                    if self._local(person, t) > before:
+                        self.change(person, t, EMPTY)
+                    else:
+                        need -= 1
+
+    def _move(self, rng: random.Random) -> Optional[List[Tuple[int, int, int]]]:
+        """Apply a random move; returns the previous values to undo it, None when nothing moved."""
+        roll = rng.random()
+        if roll < 0.4 and self.short.items:
+            # put someone on a short (day, code)
+            day, code = self.short.choice(rng)
+            t = self.first + day
+            people = self.free[day]
+            if not people:
+                return None
+            person = people[rng.randrange(len(people))]
+            if self.grid[person][t] == code or not self.can_take(person, t, code):
+                return None
+            undo = [(person, t, self.grid[person][t])]
+            self.change(person, t, code)
+            return undo
+        person, t = self.mutable[rng.randrange(len(self.mutable))]
+        if roll < 0.75:
+            # two people trade their cells of a day
+            people = self.free[t - self.first]
+            other = people[rng.randrange(len(people))]
+            mine, theirs = self.grid[person][t], self.grid[other][t]
+            if mine == theirs or not self.can_take(person, t, theirs) or not self.can_take(other, t, mine):
+                return None
+            self.change(person, t, EMPTY)
+            self.change(other, t, mine)
+            self.change(person, t, theirs)
+            return [(person, t, mine), (other, t, theirs)]
+        choices = self.choices[person]
+        code = choices[rng.randrange(len(choices))]
+        if self.grid[person][t] == code or not self.can_take(person, t, code):
+            return None
+        undo = [(person, t, self.grid[person][t])]
+        self.change(person, t, code)
+        return undo
+
+    def anneal(self, rng: random.Random, deadline: float) -> int:
+        """Simulated annealing until the deadline; leaves the best grid found. Returns the iterations."""
+        best_cost = self.cost
+        best = [row[:] for row in self.grid]
+        if not self.mutable:
+            return 0
+        started = time.time()
+        duration = max(deadline - started, 1e-3)
+        temperature = START_TEMPERATURE
+        iterations = 0
+        while True:
+            if iterations & 255 == 0:
+                now = time.time()
+                if now >= deadline:
+                    break
+                temperature = START_TEMPERATURE * (END_TEMPERATURE / START_TEMPERATURE) ** ((now - started) / duration)
+            iterations += 1
+            before = self.cost
+            undo = self._move(rng)
+            if undo is None:
+                continue
+            delta = self.cost - before
+            if delta > 0 and rng.random() >= math.exp(-delta / temperature):
+                for person, t, code in reversed(undo):
+                    self.change(person, t, code)
+            elif self.cost < best_cost:
+                best_cost = self.cost
+                best = [row[:] for row in self.grid]
+        if self.cost != best_cost:
+            for person, row in enumerate(best):
+                for t in range(self.first, self.last):
+                    self.change(person, t, row[t])
+        return iterations
+
+    def solution(self, iterations: int, seed: int) -> Solution:
+        problem = self.problem
+        shortage = excess = 0
+        for day in range(problem.days):
+            for code in problem.assignable:
+                difference = self.cover[day][code] - problem.demand[day][code]
+                if difference < 0:
+                    shortage -= difference
+                else:
+                    excess += difference
+        violations = sum(
+            self._anchor(person, t) for person in range(len(self.grid)) for t in range(self.first, self.total)
+        )
+        return Solution(
+            cost=self.cost,
+            shortage=shortage,
+            excess=excess,
+            rule_violations=violations,
+            iterations=iterations,
+            seed=seed,
+            rows=[row[self.first : self.last] for row in self.grid],
+        )
+
+
+def solve(problem: Problem, seed: int, deadline: float) -> Solution:
+    """Greedy construction followed by annealing until ``deadline`` (a time.time() value).
+
+    Runs in a worker process; it always returns, at worst with the greedy grid.
+    """
+    rng = random.Random(seed)
+    state = _State(problem)
+    state.construct(rng)
+    iterations = state.anneal(rng, deadline)
+    return state.solution(iterations, seed)
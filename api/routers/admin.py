@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Query, Response, status
+
+from ..dependencies import require_page_permission
+from ..principals import Principal
+from ..schemas import SlowQueryLogResponse, SlowQueryOut
+from ..slow_queries import slow_query_log
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/slow-queries", response_model=SlowQueryLogResponse)
+def read_slow_queries(
+    limit: int = Query(100, ge=1, le=1000),
+    _: Principal = Depends(require_page_permission("permissions")),
+):
+    return SlowQueryLogResponse(
+        threshold_ms=round(slow_query_log.threshold * 1000),
+        total=slow_query_log.total,
+        entries=[SlowQueryOut.from_orm(entry) for entry in slow_query_log.entries(limit)],
+    )
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_queries(_: Principal = Depends(require_page_permission("permissions", require_edit=True))):
+    slow_query_log.clear()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy import select
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, selectinload
 
 from ..config import load_config
-from ..dependencies import get_current_user, get_db
+from ..dependencies import get_current_user, get_db, get_read_db
+from ..database import after_commit
 from ..models import User, UserTeamPermission
+from ..principals import Principal, principal_cache
 from ..schemas import (
     FirstLoginRequest,
     LoginRequest,
@@ -15,20 +18,21 @@ from ..schemas import (
     TeamPermission,
     UserInfo,
 )
-from ..security import create_session_token, hash_password, verify_password
+from ..security import create_session_token, password_hasher
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 _config = load_config()
 
 
-def serialize_user(user: User) -> UserInfo:
+def serialize_user(user: Principal) -> UserInfo:
     pages = [
-        PagePermission(page=perm.page, can_view=perm.can_view, can_edit=perm.can_edit)
-        for perm in sorted(user.page_permissions, key=lambda p: p.page)
+        PagePermission(page=grant.page, can_view=grant.can_view, can_edit=grant.can_edit)
+        for grant in user.page_list
     ]
     teams = [
-        TeamPermission(team_id=perm.team_id, team_name=perm.team.name, access_level=perm.access_level)
-        for perm in sorted(user.team_permissions, key=lambda p: p.team.name)
+        TeamPermission(team_id=grant.team_id, team_name=grant.team_name, access_level=grant.access_level)
+        for grant in user.team_list
     ]
     return UserInfo(
         id=user.id,
@@ -40,24 +44,43 @@ def serialize_user(user: User) -> UserInfo:
     )
 
 
-@router.post("/login", response_model=LoginResponse)
-async def login(request: LoginRequest, response: Response, db: Session = Depends(get_db)):
-    stmt = (
-        select(User)
-        .options(
-            selectinload(User.page_permissions),
-            selectinload(User.team_permissions).selectinload(UserTeamPermission.team),
-        )
-        .where(User.username == request.username)
+def _user_query():
+    return select(User).options(
+        selectinload(User.page_permissions),
+        selectinload(User.team_permissions).selectinload(UserTeamPermission.team),
     )
-    user = db.execute(stmt).scalar_one_or_none()
-    if not user or not user.is_active:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
-    if not verify_password(request.password, user.password_hash):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
-    if user.must_change_password:
-        return LoginResponse(must_change_password=True)
-    token = create_session_token(user.id, user.token_version)
+
+
+def _load_user(db: Session, username: str) -> User | None:
+    user = db.execute(_user_query().where(User.username == username)).scalar_one_or_none()
+    # detach: the password check that follows must not hold a pooled connection
+    db.close()
+    return user
+
+
+def _store_password_hash(db: Session, user_id: int, password_hash: str) -> None:
+    def mutate(session: Session) -> None:
+        session.execute(update(User).where(User.id == user_id).values(password_hash=password_hash))
+
+    run_write(db, mutate)
+
+
+def _complete_first_login(db: Session, user_id: int, password_hash: str) -> tuple[str, UserInfo]:
+    def mutate(session: Session) -> tuple[str, UserInfo]:
+        user = session.execute(_user_query().where(User.id == user_id)).scalar_one()
+        if not user.must_change_password:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_state"})
+        user.password_hash = password_hash
+        user.must_change_password = False
+        user.token_version += 1
+        session.flush()
+        after_commit(session, lambda: principal_cache.invalidate(user_id))
+        return create_session_token(user.id, user.token_version), serialize_user(Principal.from_user(user))
+
+    return run_write(db, mutate)
+
+
+def _set_session_cookie(response: Response, token: str) -> None:
     response.set_cookie(
         "session_token",
         token,
@@ -66,42 +89,52 @@ async def login(request: LoginRequest, response: Response, db: Session = Depends
         max_age=_config.session_max_age,
         samesite="lax",
     )
-    return LoginResponse(must_change_password=False, user=serialize_user(user))
+
+
+# Both handlers are async so that bcrypt waits on its own pool (see security.py)
+# instead of holding one of the request threads; database work goes through
+# run_in_threadpool.
+@router.post("/login", response_model=LoginResponse)
+async def login(
+    request: LoginRequest,
+    response: Response,
+    read_db: Session = Depends(get_read_db),
+    db: Session = Depends(get_db),
+):
+    user = await run_in_threadpool(_load_user, read_db, request.username)
+    if not user or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
+    valid, new_hash = await password_hasher.verify_and_update(request.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
+    if new_hash:
+        await run_in_threadpool(_store_password_hash, db, user.id, new_hash)
+    if user.must_change_password:
+        return LoginResponse(must_change_password=True)
+    token = create_session_token(user.id, user.token_version)
+    _set_session_cookie(response, token)
+    return LoginResponse(must_change_password=False, user=serialize_user(Principal.from_user(user)))
 
 
 @router.post("/first-login", response_model=LoginResponse)
-async def first_login(payload: FirstLoginRequest, response: Response, db: Session = Depends(get_db)):
-    stmt = (
-        select(User)
-        .options(
-            selectinload(User.page_permissions),
-            selectinload(User.team_permissions).selectinload(UserTeamPermission.team),
-        )
-        .where(User.username == payload.username)
-    )
-    user = db.execute(stmt).scalar_one_or_none()
+async def first_login(
+    payload: FirstLoginRequest,
+    response: Response,
+    read_db: Session = Depends(get_read_db),
+    db: Session = Depends(get_db),
+):
+    user = await run_in_threadpool(_load_user, read_db, payload.username)
     if not user or not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
     if not user.must_change_password:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_state"})
-    if not verify_password(payload.current_password, user.password_hash):
+    valid, _ = await password_hasher.verify_and_update(payload.current_password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail={"error": "unauthenticated"})
-    user.password_hash = hash_password(payload.new_password)
-    user.must_change_password = False
-    user.token_version += 1
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    token = create_session_token(user.id, user.token_version)
-    response.set_cookie(
-        "session_token",
-        token,
-        httponly=True,
-        secure=False,
-        max_age=_config.session_max_age,
-        samesite="lax",
-    )
-    return LoginResponse(user=serialize_user(user))
+    password_hash = await password_hasher.hash(payload.new_password)
+    token, info = await run_in_threadpool(_complete_first_login, db, user.id, password_hash)
+    _set_session_cookie(response, token)
+    return LoginResponse(user=info)
 
 
 @router.post("/logout")
@@ -111,5 +144,5 @@ async def logout(response: Response):
 
 
 @router.get("/me", response_model=UserInfo)
-async def read_me(user: User = Depends(get_current_user)):
+def read_me(user: Principal = Depends(get_current_user)):
     return serialize_user(user)
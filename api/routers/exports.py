@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from ..dependencies import ensure_team_access, require_page_permission
+from ..export_jobs import ExportJob, export_jobs
+from ..principals import Principal
+from ..schemas import ScheduleExportJobOut, ScheduleExportJobRequest
+
+router = APIRouter(prefix="/schedule/exports", tags=["schedule"])
+
+
+def _serialize_job(job: ExportJob) -> ScheduleExportJobOut:
+    return ScheduleExportJobOut(
+        id=job.id,
+        status=job.status,
+        team_ids=job.team_ids,
+        start=job.start,
+        end=job.end,
+        teams_done=job.teams_done,
+        teams_total=len(job.team_ids),
+        cached=job.cached,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
+
+
+def _get_job(job_id: str, user: Principal) -> ExportJob:
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+    for team_id in job.team_ids:
+        ensure_team_access(user, team_id, "read")
+    return job
+
+
+@router.post("", response_model=ScheduleExportJobOut, status_code=status.HTTP_202_ACCEPTED)
+def create_export_job(
+    payload: ScheduleExportJobRequest,
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    if payload.start > payload.end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
+    for team_id in payload.team_ids:
+        ensure_team_access(user, team_id, "read")
+    job = export_jobs.submit(payload.team_ids, payload.start, payload.end, user.id)
+    return _serialize_job(job)
+
+
+@router.get("/{job_id}", response_model=ScheduleExportJobOut)
+def read_export_job(job_id: str, user: Principal = Depends(require_page_permission("schedule"))):
+    return _serialize_job(_get_job(job_id, user))
+
+
+@router.get("/{job_id}/download")
+def download_export(job_id: str, user: Principal = Depends(require_page_permission("schedule"))):
+    job = _get_job(job_id, user)
+    if job.status != "done" or not job.artifact.exists():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"error": "export_not_ready"})
+    return FileResponse(job.artifact, media_type="application/zip", filename=job.filename)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
+
+from ..config import load_config
+from ..dependencies import ensure_team_access, get_db, get_read_db, require_page_permission
+from ..generation import GenerationSpec, PersonLimits, Proposal, proposal_is_stale, schedule_generator
+from ..principals import Principal
+from ..revisions import current_revision
+from ..rules import RuleDelta, check_cells
+from ..schedule_writes import active_shift_codes, team_person_ids, write_cells
+from ..schemas import (
+    RosterViolationOut,
+    ScheduleCellInput,
+    ScheduleCoverageGap,
+    ScheduleGenerateRequest,
+    ScheduleProposalCommitResponse,
+    ScheduleProposalOut,
+)
+from ..write_queue import run_write
+
+router = APIRouter(prefix="/schedule/generate", tags=["schedule"])
+
+MAX_GENERATE_DAYS = 62
+
+
+def _serialize_proposal(proposal: Proposal) -> ScheduleProposalOut:
+    return ScheduleProposalOut(
+        id=proposal.id,
+        team_id=proposal.team_id,
+        start=proposal.start,
+        end=proposal.end,
+        revision=proposal.revision,
+        created_at=proposal.created_at,
+        expires_at=proposal.expires_at,
+        cost=proposal.cost,
+        shortage=proposal.shortage,
+        excess=proposal.excess,
+        rule_violations=proposal.rule_violations,
+        searches=proposal.searches,
+        iterations=proposal.iterations,
+        cells=[
+            ScheduleCellInput(person_id=person_id, day=day, shift_code=shift_code)
+            for (person_id, day), shift_code in sorted(proposal.cells.items(), key=lambda item: item[0][::-1])
+        ],
+        uncovered=[
+            ScheduleCoverageGap(day=day, shift_code=shift_code, missing=missing)
+            for day, shift_code, missing in proposal.uncovered
+        ],
+    )
+
+
+def _get_proposal(proposal_id: str, user: Principal, min_level: str) -> Proposal:
+    proposal = schedule_generator.get(proposal_id)
+    if not proposal:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+    ensure_team_access(user, proposal.team_id, min_level)
+    return proposal
+
+
+@router.post("", response_model=ScheduleProposalOut, status_code=status.HTTP_201_CREATED)
+def generate_schedule(
+    payload: ScheduleGenerateRequest,
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule", require_edit=True)),
+):
+    ensure_team_access(user, payload.team_id, "write")
+    if payload.start > payload.end or (payload.end - payload.start).days >= MAX_GENERATE_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
+    codes = set(payload.coverage)
+    codes.update(code for by_code in payload.day_coverage.values() for code in by_code)
+    codes.update(code for pair in payload.rest_after for code in (pair.shift_code, pair.next_code))
+    codes.update(code for person in payload.people for code in person.shift_codes or [])
+    if active_shift_codes(db, payload.team_id, codes) != codes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_shift"})
+    person_ids = {person.person_id for person in payload.people}
+    if team_person_ids(db, payload.team_id, person_ids) != person_ids:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+
+    spec = GenerationSpec(
+        start=payload.start,
+        end=payload.end,
+        coverage=dict(payload.coverage),
+        day_coverage={day: dict(by_code) for day, by_code in payload.day_coverage.items()},
+        people={
+            person.person_id: PersonLimits(
+                unavailable=set(person.unavailable),
+                max_shifts=person.max_shifts,
+                max_consecutive=person.max_consecutive,
+                shift_codes=set(person.shift_codes) if person.shift_codes is not None else None,
+            )
+            for person in payload.people
+        },
+        max_shifts=payload.max_shifts,
+        max_consecutive=payload.max_consecutive,
+        rest_after=[(pair.shift_code, pair.next_code) for pair in payload.rest_after],
+        use_team_rules=payload.use_team_rules,
+        keep_existing=payload.keep_existing,
+    )
+    config = load_config()
+    budget_ms = min(payload.time_budget_ms or config.generate_budget_ms, config.generate_max_budget_ms)
+    seed = payload.seed if payload.seed is not None else int(datetime.utcnow().timestamp() * 1000)
+    proposal = schedule_generator.generate(db, payload.team_id, spec, user.id, budget_ms / 1000, seed)
+    return _serialize_proposal(proposal)
+
+
+@router.get("/{proposal_id}", response_model=ScheduleProposalOut)
+def read_proposal(proposal_id: str, user: Principal = Depends(require_page_permission("schedule"))):
+    return _serialize_proposal(_get_proposal(proposal_id, user, "read"))
+
+
+@router.post("/{proposal_id}/commit", response_model=ScheduleProposalCommitResponse)
+def commit_proposal(
+    proposal_id: str,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("schedule", require_edit=True)),
+):
+    proposal = _get_proposal(proposal_id, user, "write")
+    now = datetime.utcnow()
+
+    def mutate(session: Session) -> Tuple[int, RuleDelta]:
+        if proposal_is_stale(session, proposal):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"error": "proposal_stale"})
+        if not proposal.cells:
+            return current_revision(session, proposal.team_id), RuleDelta()
+        cells = [(person_id, day, shift_code) for (person_id, day), shift_code in proposal.cells.items()]
+        revision = write_cells(session, proposal.team_id, user.id, cells, now)
+        return revision, check_cells(session, proposal.team_id, proposal.cells)
+
+    revision, delta = run_write(db, mutate)
+    schedule_generator.discard(proposal_id)
+    return ScheduleProposalCommitResponse(
+        proposal_id=proposal_id,
+        revision=revision,
+        updated_at=now,
+        updated_by=user.id,
+        cells=len(proposal.cells),
+        new_violations=[RosterViolationOut.from_orm(item) for item in delta.new],
+        resolved_violations=[RosterViolationOut.from_orm(item) for item in delta.resolved],
+    )
+
+
+@router.delete("/{proposal_id}", status_code=status.HTTP_204_NO_CONTENT)
+def discard_proposal(proposal_id: str, user: Principal = Depends(require_page_permission("schedule"))):
+    _get_proposal(proposal_id, user, "read")
+    schedule_generator.discard(proposal_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
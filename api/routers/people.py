@@ -3,21 +3,26 @@ from __future__ import annotations
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from ..dependencies import ensure_team_access, get_db, require_page_permission
-from ..models import Person, User
+from ..dependencies import ensure_team_access, get_db, get_read_db, require_page_permission
+from ..models import Person, ScheduleEntry
+from ..principals import Principal
+from ..revisions import record_team_change
+from ..rules import store_range
+from ..stats import forget_person
 from ..schemas import PersonCreate, PersonOut, PersonUpdate
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/teams/{team_id}/people", tags=["people"])
 
 
 @router.get("", response_model=List[PersonOut])
-async def list_people(
+def list_people(
     team_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("people")),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("people")),
 ):
     ensure_team_access(user, team_id, "read")
     stmt = (
@@ -30,62 +35,85 @@ async def list_people(
 
 
 @router.post("", response_model=PersonOut, status_code=status.HTTP_201_CREATED)
-async def create_person(
+def create_person(
     team_id: int,
     payload: PersonCreate,
     db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("people", require_edit=True)),
+    user: Principal = Depends(require_page_permission("people", require_edit=True)),
 ):
     ensure_team_access(user, team_id, "write")
-    exists = db.execute(
-        select(Person).where(Person.team_id == team_id, Person.name == payload.name)
-    ).scalar_one_or_none()
-    if exists:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "duplicate_person"})
-    person = Person(
-        team_id=team_id,
-        name=payload.name,
-        active=payload.active,
-        show_in_schedule=payload.show_in_schedule,
-        sort_index=payload.sort_index,
-    )
-    db.add(person)
-    db.commit()
-    db.refresh(person)
-    return PersonOut.from_orm(person)
+
+    def mutate(session: Session) -> PersonOut:
+        exists = session.execute(
+            select(Person).where(Person.team_id == team_id, Person.name == payload.name)
+        ).scalar_one_or_none()
+        if exists:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "duplicate_person"})
+        person = Person(
+            team_id=team_id,
+            name=payload.name,
+            active=payload.active,
+            show_in_schedule=payload.show_in_schedule,
+            sort_index=payload.sort_index,
+        )
+        session.add(person)
+        record_team_change(session, team_id, user.id)
+        session.flush()
+        return PersonOut.from_orm(person)
+
+    return run_write(db, mutate)
 
 
 @router.put("/{person_id}", response_model=PersonOut)
-async def update_person(
+def update_person(
     team_id: int,
     person_id: int,
     payload: PersonUpdate,
     db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("people", require_edit=True)),
+    user: Principal = Depends(require_page_permission("people", require_edit=True)),
 ):
     ensure_team_access(user, team_id, "write")
-    person = db.get(Person, person_id)
-    if not person or person.team_id != team_id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
-    for field, value in payload.dict(exclude_unset=True).items():
-        setattr(person, field, value)
-    db.add(person)
-    db.commit()
-    db.refresh(person)
-    return PersonOut.from_orm(person)
+
+    def mutate(session: Session) -> PersonOut:
+        person = session.get(Person, person_id)
+        if not person or person.team_id != team_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        for field, value in payload.dict(exclude_unset=True).items():
+            setattr(person, field, value)
+        session.add(person)
+        record_team_change(session, team_id, user.id)
+        session.flush()
+        return PersonOut.from_orm(person)
+
+    return run_write(db, mutate)
 
 
 @router.delete("/{person_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_person(
+def delete_person(
     team_id: int,
     person_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("people", require_edit=True)),
+    user: Principal = Depends(require_page_permission("people", require_edit=True)),
 ):
     ensure_team_access(user, team_id, "write")
-    person = db.get(Person, person_id)
-    if not person or person.team_id != team_id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
-    db.delete(person)
-    db.commit()
+
+    def mutate(session: Session) -> None:
+        person = session.get(Person, person_id)
+        if not person or person.team_id != team_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        first, last = session.execute(
+            select(func.min(ScheduleEntry.day), func.max(ScheduleEntry.day)).where(
+                ScheduleEntry.person_id == person_id, ScheduleEntry.shift_code.is_not(None)
+            )
+        ).one()
+        days = forget_person(session, team_id, person_id)
+        days.update(day for day in (first, last) if day is not None)
+        session.delete(person)
+        record_team_change(session, team_id, user.id)
+        if days:
+            # the headcounts of the days they worked dropped
+            session.flush()
+            store_range(session, team_id, min(days), max(days))
+
+    run_write(db, mutate)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
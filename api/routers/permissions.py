@@ -1,13 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict
+from typing import Dict, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session, selectinload
 
-from ..dependencies import get_db, require_page_permission
+from ..database import after_commit
+from ..dependencies import get_db, get_read_db, require_page_permission
 from ..models import Team, User, UserPagePermission, UserTeamPermission
+from ..principals import Principal, principal_cache
 from ..schemas import (
     PagePermission,
     PermissionOverview,
@@ -17,9 +20,11 @@ from ..schemas import (
     TeamPermission,
     UserCreateRequest,
     UserPermissionUpdate,
+    UserSummary,
     UserWithPermissions,
 )
-from ..security import hash_password
+from ..security import password_hasher
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/permissions", tags=["permissions"])
 
@@ -48,29 +53,75 @@ def _serialize_user(user: User) -> UserWithPermissions:
 
 
 @router.get("/overview", response_model=PermissionOverview)
-async def permission_overview(
-    db: Session = Depends(get_db),
-    _: User = Depends(require_page_permission("permissions")),
+def permission_overview(
+    q: Optional[str] = Query(None, max_length=64),
+    team_id: Optional[int] = Query(None, ge=1),
+    page: Optional[str] = Query(None),
+    ids: Optional[List[int]] = Query(None),
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    fields: Literal["full", "summary"] = Query("full"),
+    db: Session = Depends(get_read_db),
+    _: Principal = Depends(require_page_permission("permissions")),
 ):
-    users = (
-        db.execute(
-            select(User)
-            .options(
-                selectinload(User.page_permissions),
-                selectinload(User.team_permissions).selectinload(UserTeamPermission.team),
+    if page is not None and page not in VALID_PAGES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_page"})
+    conditions = []
+    if q:
+        conditions.append(
+            or_(User.username.contains(q, autoescape=True), User.display_name.contains(q, autoescape=True))
+        )
+    if team_id is not None:
+        conditions.append(
+            select(UserTeamPermission.id)
+            .where(UserTeamPermission.user_id == User.id, UserTeamPermission.team_id == team_id)
+            .exists()
+        )
+    if page is not None:
+        conditions.append(
+            select(UserPagePermission.id)
+            .where(
+                UserPagePermission.user_id == User.id,
+                UserPagePermission.page == page,
+                UserPagePermission.can_view.is_(True),
             )
-            .order_by(User.username)
+            .exists()
         )
-        .scalars()
-        .all()
-    )
+    if ids:
+        conditions.append(User.id.in_(ids))
+    if after is not None:
+        # keyset pagination on the unique username
+        conditions.append(User.username > after)
+
+    if fields == "summary":
+        stmt = select(
+            User.id, User.username, User.display_name, User.must_change_password, User.is_active
+        )
+    else:
+        stmt = select(User).options(
+            selectinload(User.page_permissions),
+            selectinload(User.team_permissions).selectinload(UserTeamPermission.team),
+        )
+    stmt = stmt.where(*conditions).order_by(User.username)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    if fields == "summary":
+        users = [UserSummary(**row._mapping) for row in db.execute(stmt)]
+    else:
+        users = [_serialize_user(user) for user in db.execute(stmt).scalars()]
+    next_after = None
+    if limit is not None and len(users) > limit:
+        users = users[:limit]
+        next_after = users[-1].username
+
     teams = db.execute(select(Team).order_by(Team.name)).scalars().all()
     return PermissionOverview(
-        users=[_serialize_user(user) for user in users],
+        users=users,
         teams=[
             TeamOut(id=team.id, name=team.name, code=team.code, description=team.description, access_level=None)
             for team in teams
         ],
+        next_after=next_after,
     )
 
 
@@ -78,28 +129,35 @@ async def permission_overview(
 async def create_user(
     payload: UserCreateRequest,
     db: Session = Depends(get_db),
-    _: User = Depends(require_page_permission("permissions", require_edit=True)),
+    _: Principal = Depends(require_page_permission("permissions", require_edit=True)),
 ):
-    existing = db.execute(select(User).where(User.username == payload.username)).scalar_one_or_none()
-    if existing:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "duplicate_username"})
-    user = User(
-        username=payload.username,
-        display_name=payload.display_name,
-        password_hash=hash_password(payload.password),
-        must_change_password=payload.must_change_password,
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    if payload.pages or payload.teams:
-        update_payload = UserPermissionUpdate(
-            display_name=user.display_name,
-            pages=payload.pages,
-            teams=payload.teams,
+    password_hash = await password_hasher.hash(payload.password)
+    return await run_in_threadpool(_create_user, db, payload, password_hash)
+
+
+def _create_user(db: Session, payload: UserCreateRequest, password_hash: str) -> UserWithPermissions:
+    def mutate(session: Session) -> UserWithPermissions:
+        existing = session.execute(select(User).where(User.username == payload.username)).scalar_one_or_none()
+        if existing:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "duplicate_username"})
+        user = User(
+            username=payload.username,
+            display_name=payload.display_name,
+            password_hash=password_hash,
+            must_change_password=payload.must_change_password,
         )
-        user = _apply_permission_update(db, user.id, update_payload)
-    return _serialize_user(user)
+        session.add(user)
+        session.flush()
+        if payload.pages or payload.teams:
+            update_payload = UserPermissionUpdate(
+                display_name=user.display_name,
+                pages=payload.pages,
+                teams=payload.teams,
+            )
+            user = _apply_permission_update(session, user.id, update_payload)
+        return _serialize_user(user)
+
+    return run_write(db, mutate)
 
 
 @router.put("/users/{user_id}", response_model=UserWithPermissions)
@@ -107,13 +165,24 @@ async def update_user(
     user_id: int,
     payload: UserPermissionUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_page_permission("permissions", require_edit=True)),
+    _: Principal = Depends(require_page_permission("permissions", require_edit=True)),
 ):
-    user = _apply_permission_update(db, user_id, payload)
-    return _serialize_user(user)
+    password_hash = await password_hasher.hash(payload.new_password) if payload.new_password else None
+    return await run_in_threadpool(_update_user, db, user_id, payload, password_hash)
+
+
+def _update_user(
+    db: Session, user_id: int, payload: UserPermissionUpdate, password_hash: str | None
+) -> UserWithPermissions:
+    def mutate(session: Session) -> UserWithPermissions:
+        return _serialize_user(_apply_permission_update(session, user_id, payload, password_hash))
+
+    return run_write(db, mutate)
 
 
-def _apply_permission_update(db: Session, user_id: int, payload: UserPermissionUpdate) -> User:
+def _apply_permission_update(
+    db: Session, user_id: int, payload: UserPermissionUpdate, password_hash: str | None = None
+) -> User:
     user = db.execute(
         select(User)
         .options(
@@ -128,8 +197,9 @@ def _apply_permission_update(db: Session, user_id: int, payload: UserPermissionU
     if payload.display_name is not None:
         user.display_name = payload.display_name
 
-    if payload.new_password:
-        user.password_hash = hash_password(payload.new_password)
+    if password_hash:
+        # hashed by the caller on the bcrypt pool
+        user.password_hash = password_hash
         user.must_change_password = False
         user.token_version += 1
 
@@ -176,6 +246,7 @@ def _apply_permission_update(db: Session, user_id: int, payload: UserPermissionU
             )
 
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    db.flush()
+    # the user's cached principal (see dependencies.get_current_user) is stale from here on
+    after_commit(db, lambda: principal_cache.invalidate(user_id))
     return user
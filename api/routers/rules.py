@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..dependencies import ensure_team_access, get_db, get_read_db, require_page_permission
+from ..models import RosterRule, RosterViolation
+from ..principals import Principal
+from ..rules import store_range, valid_rule
+from ..schedule_writes import active_shift_codes
+from ..schemas import RosterRuleCreate, RosterRuleOut, RosterRuleUpdate
+from ..write_queue import run_write
+
+router = APIRouter(prefix="/teams/{team_id}/rules", tags=["rules"])
+
+
+def _check_rule(session: Session, team_id: int, rule: RosterRule) -> None:
+    if not valid_rule(rule.kind, rule.shift_code, rule.next_code, rule.threshold):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_rule"})
+    codes = {code for code in (rule.shift_code, rule.next_code) if code}
+    if codes - active_shift_codes(session, team_id, codes):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_shift"})
+
+
+def _refresh(session: Session, team_id: int, rule: RosterRule) -> None:
+    # re-evaluate the rule over the team's whole schedule
+    session.execute(RosterViolation.__table__.delete().where(RosterViolation.rule_id == rule.id))
+    if rule.is_active:
+        store_range(session, team_id, rule_ids=[rule.id])
+
+
+@router.get("", response_model=List[RosterRuleOut])
+def list_rules(
+    team_id: int,
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("settings")),
+):
+    ensure_team_access(user, team_id, "read")
+    rules = db.execute(select(RosterRule).where(RosterRule.team_id == team_id).order_by(RosterRule.id)).scalars()
+    return [RosterRuleOut.from_orm(rule) for rule in rules]
+
+
+@router.post("", response_model=RosterRuleOut, status_code=status.HTTP_201_CREATED)
+def create_rule(
+    team_id: int,
+    payload: RosterRuleCreate,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("settings", require_edit=True)),
+):
+    ensure_team_access(user, team_id, "write")
+
+    def mutate(session: Session) -> RosterRuleOut:
+        rule = RosterRule(team_id=team_id, **payload.dict())
+        _check_rule(session, team_id, rule)
+        session.add(rule)
+        session.flush()
+        _refresh(session, team_id, rule)
+        return RosterRuleOut.from_orm(rule)
+
+    return run_write(db, mutate)
+
+
+@router.put("/{rule_id}", response_model=RosterRuleOut)
+def update_rule(
+    team_id: int,
+    rule_id: int,
+    payload: RosterRuleUpdate,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("settings", require_edit=True)),
+):
+    ensure_team_access(user, team_id, "write")
+
+    def mutate(session: Session) -> RosterRuleOut:
+        rule = session.get(RosterRule, rule_id)
+        if not rule or rule.team_id != team_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        for field, value in payload.dict(exclude_unset=True).items():
+            setattr(rule, field, value)
+        _check_rule(session, team_id, rule)
+        session.flush()
+        _refresh(session, team_id, rule)
+        return RosterRuleOut.from_orm(rule)
+
+    return run_write(db, mutate)
+
+
+@router.delete("/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_rule(
+    team_id: int,
+    rule_id: int,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("settings", require_edit=True)),
+):
+    ensure_team_access(user, team_id, "write")
+
+    def mutate(session: Session) -> None:
+        rule = session.get(RosterRule, rule_id)
+        if not rule or rule.team_id != team_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        # its violations go with it (ON DELETE CASCADE)
+        session.delete(rule)
+
+    run_write(db, mutate)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
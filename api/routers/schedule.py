@@ -1,229 +1,482 @@
 from __future__ import annotations
 
-import csv
-import io
+from collections import Counter
 from datetime import date, datetime, timedelta
-from typing import List
+from typing import Dict, Iterator, List, Literal, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..dependencies import ensure_team_access, get_db, require_page_permission
-from ..models import Person, ScheduleEntry, ShiftDefinition, User
+from ..archive import month_cells
+from ..database import ReadSessionLocal
+from ..dependencies import ensure_team_access, get_db, get_read_db, require_page_permission
+from ..exports import iter_schedule_csv
+from ..grid_cache import MonthBlock, TeamAxes, grid_cache, team_axes
+from ..history import cell_history, history_floor
+from ..principals import Principal
+from ..revisions import changes_since, current_revision, etag_matches, make_etag
+from ..rules import RuleDelta, check_cells, store_range, stored_violations, validate_range
+from ..schedule_writes import active_shift_codes, team_person_ids, write_cell, write_cells
 from ..schemas import (
+    RosterViolationOut,
+    ScheduleBulkUpdateRequest,
+    ScheduleBulkUpdateResponse,
+    ScheduleCellResult,
+    ScheduleDayStats,
+    ScheduleChangeOut,
+    ScheduleChangesResponse,
+    ScheduleGridResponse,
+    ScheduleHistoryEntry,
+    ScheduleHistoryResponse,
+    SchedulePersonStats,
     ScheduleResponse,
+    ScheduleStatsResponse,
     ScheduleUpdateRequest,
     ScheduleUpdateResponse,
+    ScheduleValidateRequest,
+    ScheduleViolationsResponse,
     ScheduleDay,
     ScheduleCell,
     ShiftDefinitionOut,
     PersonOut,
     TeamOut,
 )
-from ..utils import weekday_name
+from ..stats import day_counts
+from ..utils import iter_months, weekday_name
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/schedule", tags=["schedule"])
 
+CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+# beyond this many pending changes a full reload is cheaper for the client
+MAX_CHANGES = 2000
+MAX_VALIDATE_DAYS = 366
 
-def _collect_people(db: Session, team_id: int) -> List[Person]:
-    stmt = (
-        select(Person)
-        .where(
-            Person.team_id == team_id,
-            Person.active.is_(True),
-            Person.show_in_schedule.is_(True),
-        )
-        .order_by(Person.sort_index, Person.name)
-    )
-    return db.execute(stmt).scalars().all()
 
+def _load_block(db: Session, team_id: int, month: date) -> MonthBlock:
+    return MonthBlock(month=month, cells=month_cells(db, team_id, month))
 
-def _collect_shifts(db: Session, team_id: int) -> List[ShiftDefinition]:
-    stmt = (
-        select(ShiftDefinition)
-        .where(ShiftDefinition.team_id == team_id)
-        .order_by(ShiftDefinition.sort_order, ShiftDefinition.id)
-    )
-    return db.execute(stmt).scalars().all()
+
+def _collect_cells(db: Session, team_id: int, revision: int, start: date, end: date) -> dict:
+    cells: dict = {}
+    for month in iter_months(start, end):
+        block = grid_cache.get_block(team_id, month, revision)
+        if block is None:
+            block = _load_block(db, team_id, month)
+            grid_cache.put_block(team_id, revision, block)
+        cells.update(block.cells)
+    return cells
+
+
+def _build_days(
+    start: date, end: date, people: List[PersonOut], cells: dict
+) -> List[ScheduleDay]:
+    days: List[ScheduleDay] = []
+    total_days = (end - start).days + 1
+    for offset in range(total_days):
+        current = start + timedelta(days=offset)
+        assignments = []
+        for person in people:
+            assignments.append(ScheduleCell(person_id=person.id, shift_code=cells.get((person.id, current))))
+        days.append(ScheduleDay(date=current, weekday=weekday_name(current), assignments=assignments))
+    return days
+
+
+def _build_grid(
+    start: date,
+    end: date,
+    people: List[PersonOut],
+    shifts: List[ShiftDefinitionOut],
+    cells: dict,
+) -> tuple[List[date], List[str], List[List[int]]]:
+    codes = [shift.code for shift in shifts]
+    code_index = {code: idx for idx, code in enumerate(codes)}
+    day_list: List[date] = []
+    grid: List[List[int]] = []
+    total_days = (end - start).days + 1
+    for offset in range(total_days):
+        current = start + timedelta(days=offset)
+        row = []
+        for person in people:
+            code = cells.get((person.id, current))
+            if code is None:
+                row.append(-1)
+                continue
+            idx = code_index.get(code)
+            if idx is None:
+                # entries may still reference a shift that has since been deleted
+                idx = len(codes)
+                codes.append(code)
+                code_index[code] = idx
+            row.append(idx)
+        day_list.append(current)
+        grid.append(row)
+    return day_list, codes, grid
 
 
 @router.get("", response_model=ScheduleResponse)
-async def read_schedule(
+def read_schedule(
+    response: Response,
     team_id: int = Query(..., ge=1),
     start: date = Query(...),
     end: date = Query(...),
-    db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("schedule")),
+    format: Literal["days", "grid"] = Query("days"),
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
 ):
     level = ensure_team_access(user, team_id, "read")
     if start > end:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
-    people = _collect_people(db, team_id)
-    shifts = _collect_shifts(db, team_id)
-    if people:
-        entries_stmt = (
-            select(ScheduleEntry)
-            .where(
-                ScheduleEntry.team_id == team_id,
-                ScheduleEntry.day >= start,
-                ScheduleEntry.day <= end,
-                ScheduleEntry.person_id.in_([p.id for p in people]),
-            )
-        )
-        entries = db.execute(entries_stmt).scalars().all()
-    else:
-        entries = []
-    entries_lookup = {(entry.person_id, entry.day): entry for entry in entries}
+    can_edit = user.pages["schedule"].can_edit
+    read_only = level != "write" or not can_edit
 
-    days: List[ScheduleDay] = []
-    total_days = (end - start).days + 1
-    person_out = [PersonOut.from_orm(p) for p in people]
-    shift_out = [ShiftDefinitionOut.from_orm(s) for s in shifts]
+    revision = current_revision(db, team_id)
+    etag = make_etag(team_id, revision, "schedule", start, end, format, level, read_only)
+    headers = {"ETag": etag, **CACHE_HEADERS}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    perm = next((perm for perm in user.page_permissions if perm.page == "schedule"), None)
-    can_edit = bool(perm and perm.can_edit)
-    read_only = level != "write" or not can_edit
+    axes = team_axes(db, team_id, revision)
+    cells = _collect_cells(db, team_id, revision, start, end) if axes.people else {}
 
-    for offset in range(total_days):
-        current = start + timedelta(days=offset)
-        assignments = []
-        for person in people:
-            entry = entries_lookup.get((person.id, current))
-            assignments.append(
-                ScheduleCell(person_id=person.id, shift_code=entry.shift_code if entry else None)
-            )
-        days.append(ScheduleDay(date=current, weekday=weekday_name(current), assignments=assignments))
+    grant = user.teams[team_id]
+    team_out = TeamOut(
+        id=grant.team_id,
+        name=grant.team_name,
+        code=grant.team_code,
+        description=grant.team_description,
+        access_level=level,
+    )
 
-    team_info = next((perm.team for perm in user.team_permissions if perm.team_id == team_id), None)
-    if not team_info:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+    if format == "grid":
+        day_list, codes, grid = _build_grid(start, end, axes.people, axes.shifts, cells)
+        # the grid is built from trusted values; skip per-item validation and the
+        # response_model round trip, which is what makes the default format expensive
+        payload = ScheduleGridResponse.construct(
+            team=team_out,
+            start=start,
+            end=end,
+            people=axes.people,
+            shifts=axes.shifts,
+            read_only=read_only,
+            days=day_list,
+            weekdays=[weekday_name(day) for day in day_list],
+            codes=codes,
+            grid=grid,
+            revision=revision,
+        )
+        return Response(
+            content=payload.json(ensure_ascii=False, separators=(",", ":")),
+            media_type="application/json",
+            headers=headers,
+        )
 
+    response.headers.update(headers)
     return ScheduleResponse(
-        team=TeamOut(
-            id=team_info.id,
-            name=team_info.name,
-            code=team_info.code,
-            description=team_info.description,
-            access_level=level,
-        ),
+        team=team_out,
         start=start,
         end=end,
-        days=days,
-        people=person_out,
-        shifts=shift_out,
+        days=_build_days(start, end, axes.people, cells),
+        people=axes.people,
+        shifts=axes.shifts,
         read_only=read_only,
+        revision=revision,
+    )
+
+
+@router.get("/stats", response_model=ScheduleStatsResponse)
+def read_stats(
+    team_id: int = Query(..., ge=1),
+    start: date = Query(...),
+    end: date = Query(...),
+    by_person: bool = False,
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    ensure_team_access(user, team_id, "read")
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
+
+    revision = current_revision(db, team_id)
+    etag = make_etag(team_id, revision, "stats", start, end, by_person)
+    headers = {"ETag": etag, **CACHE_HEADERS}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    counts = day_counts(db, team_id, start, end)
+    codes = {code for by_code in counts.values() for code in by_code}
+    days = []
+    current = start
+    while current <= end:
+        day_stats = counts.get(current, {})
+        days.append(ScheduleDayStats.construct(day=current, counts=day_stats, total=sum(day_stats.values())))
+        current += timedelta(days=1)
+
+    people = None
+    if by_person:
+        # per person totals come from the (cached) month grids, not from the counters; like the
+        # counters they include people hidden from the grid, who are listed after the visible ones
+        axes = team_axes(db, team_id, revision)
+        cells = {
+            (person_id, day): code
+            for (person_id, day), code in _collect_cells(db, team_id, revision, start, end).items()
+            if code and start <= day <= end
+        }
+        totals: Dict[int, Counter] = {person.id: Counter() for person in axes.people}
+        # team_person_ids drops deleted people whose cells an archived month still holds
+        others = team_person_ids(db, team_id, {person_id for person_id, _ in cells} - totals.keys())
+        totals.update((person_id, Counter()) for person_id in sorted(others))
+        for (person_id, _), code in cells.items():
+            if person_id in totals:
+                totals[person_id][code] += 1
+                codes.add(code)
+        people = [
+            SchedulePersonStats.construct(person_id=person_id, counts=dict(total), total=sum(total.values()))
+            for person_id, total in totals.items()
+        ]
+
+    # built from trusted values like the grid format: skip validation and the response_model round trip
+    payload = ScheduleStatsResponse.construct(
+        team_id=team_id,
+        start=start,
+        end=end,
+        revision=revision,
+        codes=sorted(codes),
+        days=days,
+        people=people,
+    )
+    return Response(
+        content=payload.json(ensure_ascii=False, separators=(",", ":")),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@router.get("/changes", response_model=ScheduleChangesResponse)
+def read_changes(
+    team_id: int = Query(..., ge=1),
+    since: int = Query(..., ge=0),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    ensure_team_access(user, team_id, "read")
+    revision, reset, rows = changes_since(db, team_id, since, MAX_CHANGES)
+    return ScheduleChangesResponse(
+        team_id=team_id,
+        revision=revision,
+        reset=reset,
+        changes=[
+            ScheduleChangeOut(
+                revision=row.revision,
+                person_id=row.person_id,
+                day=row.day,
+                shift_code=row.shift_code,
+                updated_at=row.updated_at,
+                updated_by=row.updated_by,
+            )
+            for row in rows
+        ],
+    )
+
+
+@router.get("/history", response_model=ScheduleHistoryResponse)
+def read_history(
+    team_id: int = Query(..., ge=1),
+    person_id: Optional[int] = Query(None, ge=1),
+    day: Optional[date] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    ensure_team_access(user, team_id, "read")
+    if day is not None:
+        start = end = day
+    if start and end and start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
+    rows = cell_history(db, team_id, person_id, start, end, before, limit)
+    return ScheduleHistoryResponse(
+        team_id=team_id,
+        compacted_revision=history_floor(db, team_id),
+        entries=[ScheduleHistoryEntry.from_orm(row) for row in rows],
+        next_before=rows[-1].id if len(rows) == limit else None,
     )
 
 
 @router.put("/cell", response_model=ScheduleUpdateResponse)
-async def update_cell(
+def update_cell(
     payload: ScheduleUpdateRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("schedule", require_edit=True)),
+    user: Principal = Depends(require_page_permission("schedule", require_edit=True)),
 ):
     ensure_team_access(user, payload.team_id, "write")
-    person = db.get(Person, payload.person_id)
-    if not person or person.team_id != payload.team_id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
     shift_code = payload.shift_code or None
-    if shift_code:
-        shift_exists = db.execute(
-            select(ShiftDefinition).where(
-                ShiftDefinition.team_id == payload.team_id,
-                ShiftDefinition.code == shift_code,
-                ShiftDefinition.is_active.is_(True),
-            )
-        ).scalar_one_or_none()
-        if not shift_exists:
+
+    def mutate(session: Session) -> Tuple[Tuple[Optional[str], datetime, int], RuleDelta]:
+        if not team_person_ids(session, payload.team_id, [payload.person_id]):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        if shift_code and not active_shift_codes(session, payload.team_id, [shift_code]):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_shift"})
-    entry = db.execute(
-        select(ScheduleEntry).where(
-            ScheduleEntry.team_id == payload.team_id,
-            ScheduleEntry.person_id == payload.person_id,
-            ScheduleEntry.day == payload.day,
-        )
-    ).scalar_one_or_none()
-    if not shift_code and entry:
-        db.delete(entry)
-        db.commit()
-        updated_at = datetime.utcnow()
-        return ScheduleUpdateResponse(
-            person_id=payload.person_id,
-            day=payload.day,
-            shift_code=None,
-            updated_at=updated_at,
-            updated_by=user.id,
+        written = write_cell(session, payload.team_id, user.id, payload.person_id, payload.day, shift_code)
+        return written, check_cells(session, payload.team_id, [(payload.person_id, payload.day)])
+
+    (stored_code, updated_at, updated_by), delta = run_write(db, mutate)
+    return ScheduleUpdateResponse(
+        person_id=payload.person_id,
+        day=payload.day,
+        shift_code=stored_code,
+        updated_at=updated_at,
+        updated_by=updated_by,
+        new_violations=[RosterViolationOut.from_orm(item) for item in delta.new],
+        resolved_violations=[RosterViolationOut.from_orm(item) for item in delta.resolved],
+    )
+
+
+@router.put("/cells", response_model=ScheduleBulkUpdateResponse)
+def update_cells(
+    payload: ScheduleBulkUpdateRequest,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("schedule", require_edit=True)),
+):
+    ensure_team_access(user, payload.team_id, "write")
+    now = datetime.utcnow()
+
+    def mutate(session: Session) -> Tuple[int, List[ScheduleCellResult], RuleDelta]:
+        valid_people = team_person_ids(session, payload.team_id, (cell.person_id for cell in payload.cells))
+        valid_codes = active_shift_codes(
+            session, payload.team_id, (cell.shift_code for cell in payload.cells if cell.shift_code)
         )
-    if not entry:
-        entry = ScheduleEntry(
+        results: List[ScheduleCellResult] = []
+        # later cells for the same (person, day) win, as if sent one by one
+        accepted: dict = {}
+        for cell in payload.cells:
+            shift_code = cell.shift_code or None
+            error = None
+            if cell.person_id not in valid_people:
+                error = "not_found"
+            elif shift_code and shift_code not in valid_codes:
+                error = "invalid_shift"
+            else:
+                accepted[(cell.person_id, cell.day)] = shift_code
+            results.append(
+                ScheduleCellResult(
+                    person_id=cell.person_id, day=cell.day, shift_code=shift_code, ok=error is None, error=error
+                )
+            )
+        if not accepted:
+            return current_revision(session, payload.team_id), results, RuleDelta()
+        cells = [(person_id, day, shift_code) for (person_id, day), shift_code in accepted.items()]
+        revision = write_cells(session, payload.team_id, user.id, cells, now)
+        return revision, results, check_cells(session, payload.team_id, accepted)
+
+    revision, results, delta = run_write(db, mutate)
+    return ScheduleBulkUpdateResponse(
+        revision=revision,
+        updated_at=now,
+        updated_by=user.id,
+        results=results,
+        new_violations=[RosterViolationOut.from_orm(item) for item in delta.new],
+        resolved_violations=[RosterViolationOut.from_orm(item) for item in delta.resolved],
+    )
+
+
+@router.get("/violations", response_model=ScheduleViolationsResponse)
+def read_violations(
+    team_id: int = Query(..., ge=1),
+    start: date = Query(...),
+    end: date = Query(...),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    ensure_team_access(user, team_id, "read")
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
+    return ScheduleViolationsResponse(
+        team_id=team_id,
+        start=start,
+        end=end,
+        violations=[RosterViolationOut.from_orm(item) for item in stored_violations(db, team_id, start, end)],
+    )
+
+
+@router.post("/validate", response_model=ScheduleViolationsResponse)
+def validate_schedule(
+    payload: ScheduleValidateRequest,
+    read_db: Session = Depends(get_read_db),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    ensure_team_access(user, payload.team_id, "read")
+    if payload.start > payload.end or (payload.end - payload.start).days >= MAX_VALIDATE_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
+    if not payload.store:
+        violations = validate_range(read_db, payload.team_id, payload.start, payload.end)
+        return ScheduleViolationsResponse(
             team_id=payload.team_id,
-            person_id=payload.person_id,
-            day=payload.day,
-            updated_by=user.id,
+            start=payload.start,
+            end=payload.end,
+            violations=[RosterViolationOut.from_orm(item) for item in violations],
         )
-    entry.shift_code = shift_code
-    entry.updated_by = user.id
-    db.add(entry)
-    db.commit()
-    db.refresh(entry)
-    return ScheduleUpdateResponse(
-        person_id=entry.person_id,
-        day=entry.day,
-        shift_code=entry.shift_code,
-        updated_at=entry.updated_at,
-        updated_by=entry.updated_by,
+
+    # storing rewrites materialized state, so it needs the same rights as a cell write
+    if not user.pages["schedule"].can_edit:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail={"error": "forbidden"})
+    ensure_team_access(user, payload.team_id, "write")
+
+    def mutate(session: Session) -> RuleDelta:
+        return store_range(session, payload.team_id, payload.start, payload.end)
+
+    delta = run_write(db, mutate)
+    violations = stored_violations(read_db, payload.team_id, payload.start, payload.end)
+    return ScheduleViolationsResponse(
+        team_id=payload.team_id,
+        start=payload.start,
+        end=payload.end,
+        violations=[RosterViolationOut.from_orm(item) for item in violations],
+        new_violations=[RosterViolationOut.from_orm(item) for item in delta.new],
+        resolved_violations=[RosterViolationOut.from_orm(item) for item in delta.resolved],
     )
 
 
+def _stream_export(team_id: int, revision: int, start: date, end: date, axes: TeamAxes) -> Iterator[str]:
+    # the request's session is closed before the body is sent, so streaming uses its own
+    session = ReadSessionLocal()
+    try:
+        yield from iter_schedule_csv(session, team_id, revision, start, end, axes)
+    finally:
+        session.close()
+
+
 @router.get("/export")
-async def export_schedule(
+def export_schedule(
     team_id: int = Query(..., ge=1),
     start: date = Query(...),
     end: date = Query(...),
-    db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("schedule")),
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
 ):
     ensure_team_access(user, team_id, "read")
     if start > end:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
-    people = _collect_people(db, team_id)
-    shifts = {shift.code: shift for shift in _collect_shifts(db, team_id)}
-    if people:
-        entries_stmt = (
-            select(ScheduleEntry)
-            .where(
-                ScheduleEntry.team_id == team_id,
-                ScheduleEntry.day >= start,
-                ScheduleEntry.day <= end,
-                ScheduleEntry.person_id.in_([p.id for p in people]),
-            )
-        )
-        entries = db.execute(entries_stmt).scalars().all()
-        lookup = {(entry.person_id, entry.day): entry for entry in entries}
-    else:
-        lookup = {}
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    header = ["日期", "星期"] + [person.name for person in people]
-    writer.writerow(header)
-    total_days = (end - start).days + 1
-    for offset in range(total_days):
-        current = start + timedelta(days=offset)
-        row = [current.isoformat(), weekday_name(current)]
-        for person in people:
-            entry = lookup.get((person.id, current))
-            if entry and entry.shift_code:
-                shift = shifts.get(entry.shift_code)
-                row.append(shift.display_name if shift else entry.shift_code)
-            else:
-                row.append("")
-        writer.writerow(row)
-    csv_content = output.getvalue()
+    revision = current_revision(db, team_id)
+    etag = make_etag(team_id, revision, "export", start, end)
     filename = f"schedule_{team_id}_{start}_{end}.csv"
-    return Response(
-        content=csv_content,
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "ETag": etag,
+        **CACHE_HEADERS,
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    axes = team_axes(db, team_id, revision)
+    return StreamingResponse(
+        _stream_export(team_id, revision, start, end, axes),
         media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        headers=headers,
     )
@@ -6,18 +6,22 @@ from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from ..dependencies import ensure_team_access, get_db, require_page_permission
-from ..models import ShiftDefinition, User
+from ..dependencies import ensure_team_access, get_db, get_read_db, require_page_permission
+from ..models import ShiftDefinition
+from ..principals import Principal
+from ..revisions import record_team_change
+from ..rules import retire_shift, store_range
 from ..schemas import ShiftDefinitionCreate, ShiftDefinitionOut, ShiftDefinitionUpdate
+from ..write_queue import run_write
 
 router = APIRouter(prefix="/teams/{team_id}/shifts", tags=["shifts"])
 
 
 @router.get("", response_model=List[ShiftDefinitionOut])
-async def list_shifts(
+def list_shifts(
     team_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("settings")),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("settings")),
 ):
     ensure_team_access(user, team_id, "read")
     stmt = (
@@ -35,72 +39,95 @@ async def list_shifts(
             text_color=shift.text_color,
             sort_order=shift.sort_order,
             is_active=shift.is_active,
+            is_rest=shift.is_rest,
         )
         for shift in shifts
     ]
 
 
 @router.post("", response_model=ShiftDefinitionOut, status_code=status.HTTP_201_CREATED)
-async def create_shift(
+def create_shift(
     team_id: int,
     payload: ShiftDefinitionCreate,
     db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("settings", require_edit=True)),
+    user: Principal = Depends(require_page_permission("settings", require_edit=True)),
 ):
     ensure_team_access(user, team_id, "write")
-    exists = db.execute(
-        select(ShiftDefinition).where(
-            ShiftDefinition.team_id == team_id, ShiftDefinition.code == payload.code
+
+    def mutate(session: Session) -> ShiftDefinitionOut:
+        exists = session.execute(
+            select(ShiftDefinition).where(
+                ShiftDefinition.team_id == team_id, ShiftDefinition.code == payload.code
+            )
+        ).scalar_one_or_none()
+        if exists:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "duplicate_shift_code"})
+        shift = ShiftDefinition(
+            team_id=team_id,
+            code=payload.code,
+            display_name=payload.display_name,
+            bg_color=payload.bg_color,
+            text_color=payload.text_color,
+            sort_order=payload.sort_order,
+            is_active=payload.is_active,
+            is_rest=payload.is_rest,
         )
-    ).scalar_one_or_none()
-    if exists:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "duplicate_shift_code"})
-    shift = ShiftDefinition(
-        team_id=team_id,
-        code=payload.code,
-        display_name=payload.display_name,
-        bg_color=payload.bg_color,
-        text_color=payload.text_color,
-        sort_order=payload.sort_order,
-        is_active=payload.is_active,
-    )
-    db.add(shift)
-    db.commit()
-    db.refresh(shift)
-    return ShiftDefinitionOut.from_orm(shift)
+        session.add(shift)
+        record_team_change(session, team_id, user.id)
+        session.flush()
+        return ShiftDefinitionOut.from_orm(shift)
+
+    return run_write(db, mutate)
 
 
 @router.put("/{shift_id}", response_model=ShiftDefinitionOut)
-async def update_shift(
+def update_shift(
     team_id: int,
     shift_id: int,
     payload: ShiftDefinitionUpdate,
     db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("settings", require_edit=True)),
+    user: Principal = Depends(require_page_permission("settings", require_edit=True)),
 ):
     ensure_team_access(user, team_id, "write")
-    shift = db.get(ShiftDefinition, shift_id)
-    if not shift or shift.team_id != team_id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
-    for field, value in payload.dict(exclude_unset=True).items():
-        setattr(shift, field, value)
-    db.add(shift)
-    db.commit()
-    db.refresh(shift)
-    return ShiftDefinitionOut.from_orm(shift)
+
+    def mutate(session: Session) -> ShiftDefinitionOut:
+        shift = session.get(ShiftDefinition, shift_id)
+        if not shift or shift.team_id != team_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        was_rest = shift.is_rest
+        for field, value in payload.dict(exclude_unset=True).items():
+            setattr(shift, field, value)
+        session.add(shift)
+        record_team_change(session, team_id, user.id)
+        session.flush()
+        if shift.is_rest != was_rest:
+            # working days changed for every cell of this code
+            store_range(session, team_id)
+        return ShiftDefinitionOut.from_orm(shift)
+
+    return run_write(db, mutate)
 
 
 @router.delete("/{shift_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_shift(
+def delete_shift(
     team_id: int,
     shift_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(require_page_permission("settings", require_edit=True)),
+    user: Principal = Depends(require_page_permission("settings", require_edit=True)),
 ):
     ensure_team_access(user, team_id, "write")
-    shift = db.get(ShiftDefinition, shift_id)
-    if not shift or shift.team_id != team_id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
-    db.delete(shift)
-    db.commit()
+
+    def mutate(session: Session) -> None:
+        shift = session.get(ShiftDefinition, shift_id)
+        if not shift or shift.team_id != team_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        session.delete(shift)
+        record_team_change(session, team_id, user.id)
+        retire_shift(session, team_id, shift.code)
+        if shift.is_rest:
+            # its cells count as working days from now on
+            session.flush()
+            store_range(session, team_id)
+
+    run_write(db, mutate)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
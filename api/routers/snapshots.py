@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..dependencies import ensure_team_access, get_db, get_read_db, require_page_permission
+from ..models import ScheduleSnapshot
+from ..principals import Principal
+from ..schemas import ScheduleSnapshotOut, ScheduleSnapshotRequest, ScheduleSnapshotRestoreResponse
+from ..snapshots import create_snapshot, restore_snapshot
+from ..write_queue import run_write
+
+router = APIRouter(prefix="/schedule/snapshots", tags=["schedule"])
+
+
+@router.get("", response_model=List[ScheduleSnapshotOut])
+def list_snapshots(
+    team_id: int = Query(..., ge=1),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    ensure_team_access(user, team_id, "read")
+    snapshots = db.execute(
+        select(ScheduleSnapshot)
+        .where(ScheduleSnapshot.team_id == team_id)
+        .order_by(ScheduleSnapshot.id.desc())
+        .limit(limit)
+    ).scalars()
+    return [ScheduleSnapshotOut.from_orm(snapshot) for snapshot in snapshots]
+
+
+@router.post("", response_model=ScheduleSnapshotOut, status_code=status.HTTP_201_CREATED)
+def take_snapshot(
+    payload: ScheduleSnapshotRequest,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("schedule", require_edit=True)),
+):
+    ensure_team_access(user, payload.team_id, "write")
+    if payload.start and payload.end and payload.start > payload.end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_range"})
+
+    def mutate(session: Session) -> ScheduleSnapshotOut:
+        result = create_snapshot(session, payload.team_id, user.id, payload.note, payload.start, payload.end)
+        return ScheduleSnapshotOut.from_orm(result.snapshot)
+
+    return run_write(db, mutate)
+
+
+@router.post("/{snapshot_id}/restore", response_model=ScheduleSnapshotRestoreResponse)
+def restore(
+    snapshot_id: int,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_page_permission("schedule", require_edit=True)),
+):
+    def mutate(session: Session) -> ScheduleSnapshotRestoreResponse:
+        snapshot = session.get(ScheduleSnapshot, snapshot_id)
+        if snapshot is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+        ensure_team_access(user, snapshot.team_id, "write")
+        revision, cells = restore_snapshot(session, snapshot, user.id)
+        return ScheduleSnapshotRestoreResponse(
+            snapshot_id=snapshot.id, team_id=snapshot.team_id, revision=revision, cells=cells
+        )
+
+    return run_write(db, mutate)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from ..config import load_config
+from ..dependencies import ensure_team_access, get_read_db, require_page_permission
+from ..events import ScheduleEvent, Subscription, broker
+from ..principals import Principal
+from ..revisions import changes_since, current_revision
+
+router = APIRouter(prefix="/sse", tags=["sse"])
+_config = load_config()
+
+# the same ceiling as GET /schedule/changes; beyond it the client reloads
+MAX_CATCH_UP = 2000
+
+
+def _format_event(event: str, revision: int, data: dict) -> str:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {revision}\nevent: {event}\ndata: {payload}\n\n"
+
+
+async def _stream(subscription: Subscription, backlog: list[str], last_revision: int) -> AsyncIterator[str]:
+    try:
+        yield "retry: 3000\n\n"
+        for chunk in backlog:
+            yield chunk
+        while True:
+            try:
+                event: ScheduleEvent | None = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=_config.sse_heartbeat
+                )
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                # dropped as a slow consumer; EventSource reconnects with Last-Event-ID
+                return
+            if event.revision <= last_revision:
+                continue
+            last_revision = event.revision
+            yield _format_event(event.event, event.revision, event.data)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def _load_backlog(db: Session, team_id: int, resume_from: int | None) -> tuple[int, list[str]]:
+    if resume_from is None:
+        return current_revision(db, team_id), []
+    revision, reset, rows = changes_since(db, team_id, resume_from, MAX_CATCH_UP)
+    if reset:
+        return revision, [_format_event("reset", revision, {"revision": revision})]
+    if not rows:
+        return revision, []
+    changes = [
+        {
+            "person_id": row.person_id,
+            "day": row.day.isoformat(),
+            "shift_code": row.shift_code,
+            "updated_at": row.updated_at.isoformat(),
+            "updated_by": row.updated_by,
+        }
+        for row in rows
+    ]
+    return revision, [_format_event("cells", revision, {"revision": revision, "changes": changes})]
+
+
+@router.get("")
+async def schedule_events(
+    team_id: int = Query(..., ge=1),
+    last_event_id: str | None = Header(None),
+    since: int | None = Query(None, ge=0),
+    db: Session = Depends(get_read_db),
+    user: Principal = Depends(require_page_permission("schedule")),
+):
+    ensure_team_access(user, team_id, "read")
+    resume_from = since
+    if last_event_id and last_event_id.isdigit():
+        resume_from = int(last_event_id)
+
+    # subscribe before reading the backlog so nothing committed in between is lost
+    subscription = broker.subscribe(team_id)
+    try:
+        last_revision, backlog = await run_in_threadpool(_load_backlog, db, team_id, resume_from)
+    except Exception:
+        broker.unsubscribe(subscription)
+        raise
+    return StreamingResponse(
+        _stream(subscription, backlog, last_revision),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
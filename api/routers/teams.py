@@ -5,23 +5,21 @@ from typing import List
 from fastapi import APIRouter, Depends
 
 from ..dependencies import get_current_user
-from ..models import User
+from ..principals import Principal
 from ..schemas import TeamOut
 
 router = APIRouter(prefix="/teams", tags=["teams"])
 
 
 @router.get("", response_model=List[TeamOut])
-async def list_accessible_teams(user: User = Depends(get_current_user)):
-    teams = []
-    for perm in sorted(user.team_permissions, key=lambda p: p.team.name):
-        teams.append(
-            TeamOut(
-                id=perm.team.id,
-                name=perm.team.name,
-                code=perm.team.code,
-                description=perm.team.description,
-                access_level=perm.access_level,
-            )
+def list_accessible_teams(user: Principal = Depends(get_current_user)):
+    return [
+        TeamOut(
+            id=grant.team_id,
+            name=grant.team_name,
+            code=grant.team_code,
+            description=grant.team_description,
+            access_level=grant.access_level,
         )
-    return teams
+        for grant in user.team_list
+    ]
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from .archive import MonthCells, archived_cells, archived_months, month_cells
+from .models import Person, RosterRule, RosterViolation, ScheduleDayCount, ScheduleEntry, ShiftDefinition
+from .stats import day_counts
+from .utils import month_start, next_month
+
+# rest_after:      shift_code on one day followed by next_code on the next (e.g. NIGHT then DAY)
+# max_consecutive: more than threshold working days in a row; a working day is a
+#                  cell whose code is not marked is_rest (unknown codes count as work)
+# min_headcount:   fewer than threshold people on shift_code on a day
+RULE_KINDS = ("rest_after", "max_consecutive", "min_headcount")
+
+ONE_DAY = timedelta(days=1)
+
+Cell = Tuple[int, date]  # (person_id, day)
+Key = Tuple[int, Optional[int], date]  # (rule_id, person_id or None for headcount, day)
+
+_violations = RosterViolation.__table__
+
+
+@dataclass
+class Violation:
+    rule_id: int
+    kind: str
+    person_id: Optional[int]
+    day: date
+    value: Optional[int]  # the headcount of a min_headcount violation
+
+
+@dataclass
+class RuleDelta:
+    new: List[Violation] = field(default_factory=list)
+    resolved: List[Violation] = field(default_factory=list)
+
+
+@dataclass
+class RuleSet:
+    rules: List[RosterRule]
+    rest_codes: Set[str]
+
+    @property
+    def reach(self) -> int:
+        """Days around a cell that a rule looks at."""
+        return max([rule.threshold for rule in self.rules if rule.kind == "max_consecutive"] + [1])
+
+    def working(self, code: Optional[str]) -> bool:
+        return code is not None and code not in self.rest_codes
+
+
+def valid_rule(kind: str, shift_code: Optional[str], next_code: Optional[str], threshold: Optional[int]) -> bool:
+    """Whether the parameters make a rule of ``kind``."""
+    if kind == "rest_after":
+        return bool(shift_code and next_code)
+    if kind == "max_consecutive":
+        return bool(threshold and threshold >= 1)
+    if kind == "min_headcount":
+        return bool(shift_code and threshold and threshold >= 1)
+    return False
+
+
+def load_rules(db: Session, team_id: int, rule_ids: Optional[Iterable[int]] = None) -> Optional[RuleSet]:
+    """The team's active rules (or the given ones of them), None when there are none."""
+    stmt = select(RosterRule).where(RosterRule.team_id == team_id, RosterRule.is_active.is_(True))
+    if rule_ids is not None:
+        stmt = stmt.where(RosterRule.id.in_(list(rule_ids)))
+    rules = db.execute(stmt.order_by(RosterRule.id)).scalars().all()
+    if not rules:
+        return None
+    rest = db.execute(
+        select(ShiftDefinition.code).where(ShiftDefinition.team_id == team_id, ShiftDefinition.is_rest.is_(True))
+    ).scalars()
+    return RuleSet(list(rules), set(rest))
+
+
+def _check(
+    rule: RosterRule, ruleset: RuleSet, cells: MonthCells, counts: Dict[date, Dict[str, int]], anchors
+) -> Dict[Key, Optional[int]]:
+    """Violations of ``rule`` at the anchors: days for headcount rules, cells otherwise."""
+    found: Dict[Key, Optional[int]] = {}
+    if rule.kind == "min_headcount":
+        for day in anchors:
+            count = counts.get(day, {}).get(rule.shift_code, 0)
+            if count < rule.threshold:
+                found[(rule.id, None, day)] = count
+    elif rule.kind == "rest_after":
+        for person_id, day in anchors:
+            previous = cells.get((person_id, day - ONE_DAY))
+            if previous == rule.shift_code and cells.get((person_id, day)) == rule.next_code:
+                found[(rule.id, person_id, day)] = None
+    elif rule.kind == "max_consecutive":
+        # a violation on every day that ends a run longer than the threshold
+        for person_id, day in anchors:
+            if all(ruleset.working(cells.get((person_id, day - back * ONE_DAY))) for back in range(rule.threshold + 1)):
+                found[(rule.id, person_id, day)] = None
+    return found
+
+
+def _anchors(rule: RosterRule, changed: Set[Cell]):
+    """Where a change of the given cells can make or break a violation of ``rule``."""
+    if rule.kind == "min_headcount":
+        return {day for _, day in changed}
+    span = rule.threshold if rule.kind == "max_consecutive" else 1
+    return {(person_id, day + ahead * ONE_DAY) for person_id, day in changed for ahead in range(span + 1)}
+
+
+def _person_cells(db: Session, team_id: int, people: Set[int], start: date, end: date) -> MonthCells:
+    # runs in the writing transaction, so no month gets archived between the reads
+    months = []
+    month = month_start(start)
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    cells: MonthCells = {}
+    for month in archived_months(db, team_id, months):
+        for (person_id, day), code in (archived_cells(db, team_id, month) or {}).items():
+            if person_id in people and start <= day <= end:
+                cells[(person_id, day)] = code
+    rows = db.execute(
+        select(ScheduleEntry.person_id, ScheduleEntry.day, ScheduleEntry.shift_code).where(
+            ScheduleEntry.team_id == team_id,
+            ScheduleEntry.person_id.in_(people),
+            ScheduleEntry.day >= start,
+            ScheduleEntry.day <= end,
+        )
+    )
+    for person_id, day, code in rows:
+        if code is None:
+            cells.pop((person_id, day), None)
+        else:
+            cells[(person_id, day)] = code
+    return cells
+
+
+def _violation(ruleset: RuleSet, key: Key, value: Optional[int]) -> Violation:
+    kinds = {rule.id: rule.kind for rule in ruleset.rules}
+    rule_id, person_id, day = key
+    return Violation(rule_id, kinds[rule_id], person_id, day, value)
+
+
+def _sorted(violations: Iterable[Violation]) -> List[Violation]:
+    return sorted(violations, key=lambda item: (item.day, item.rule_id, item.person_id or 0))
+
+
+def _sync(
+    db: Session,
+    team_id: int,
+    ruleset: RuleSet,
+    found: Dict[Key, Optional[int]],
+    start: date,
+    end: date,
+    scope: Optional[Dict[int, set]] = None,
+) -> RuleDelta:
+    """Make the stored violations of the rules between start and end (and within
+    ``scope``, the anchors per rule, when given) equal to ``found``."""
+    rows = db.execute(
+        select(
+            RosterViolation.id, RosterViolation.rule_id, RosterViolation.person_id, RosterViolation.day, RosterViolation.value
+        ).where(
+            RosterViolation.team_id == team_id,
+            RosterViolation.rule_id.in_([rule.id for rule in ruleset.rules]),
+            RosterViolation.day >= start,
+            RosterViolation.day <= end,
+        )
+    ).all()
+    stored: Dict[Key, Tuple[int, Optional[int]]] = {}
+    for violation_id, rule_id, person_id, day, value in rows:
+        if scope is not None and (day if person_id is None else (person_id, day)) not in scope[rule_id]:
+            continue
+        stored[(rule_id, person_id, day)] = (violation_id, value)
+
+    delta = RuleDelta()
+    gone = [key for key in stored if key not in found]
+    if gone:
+        db.execute(_violations.delete().where(_violations.c.id.in_([stored[key][0] for key in gone])))
+        delta.resolved = _sorted(_violation(ruleset, key, stored[key][1]) for key in gone)
+    added = [key for key in found if key not in stored]
+    if added:
+        db.execute(
+            insert(RosterViolation),
+            [
+                {"team_id": team_id, "rule_id": key[0], "person_id": key[1], "day": key[2], "value": found[key]}
+                for key in added
+            ],
+        )
+        delta.new = _sorted(_violation(ruleset, key, found[key]) for key in added)
+    # still violated, with another headcount
+    for key, value in found.items():
+        if key in stored and stored[key][1] != value:
+            db.execute(_violations.update().where(_violations.c.id == stored[key][0]).values(value=value))
+    return delta
+
+
+def check_cells(db: Session, team_id: int, changed: Iterable[Cell]) -> RuleDelta:
+    """Re-evaluate the rules around just written cells, in the writing transaction.
+
+    Only the neighbourhood of the changed cells is read: the people's cells
+    ``reach`` days around them and the day counters of the changed days.
+    """
+    changed = set(changed)
+    ruleset = load_rules(db, team_id) if changed else None
+    if ruleset is None:
+        return RuleDelta()
+    first = min(day for _, day in changed)
+    last = max(day for _, day in changed)
+    reach = ruleset.reach * ONE_DAY
+    cells = _person_cells(db, team_id, {person_id for person_id, _ in changed}, first - reach, last + reach)
+    counts = {}
+    if any(rule.kind == "min_headcount" for rule in ruleset.rules):
+        counts = day_counts(db, team_id, first, last)
+    scope = {rule.id: _anchors(rule, changed) for rule in ruleset.rules}
+    found: Dict[Key, Optional[int]] = {}
+    for rule in ruleset.rules:
+        found.update(_check(rule, ruleset, cells, counts, scope[rule.id]))
+    return _sync(db, team_id, ruleset, found, first, last + reach, scope)
+
+
+def _evaluate_range(db: Session, team_id: int, ruleset: RuleSet, start: date, end: date) -> Dict[Key, Optional[int]]:
+    cells: MonthCells = {}
+    month = month_start(start - ruleset.reach * ONE_DAY)
+    while month <= end:
+        cells.update(month_cells(db, team_id, month))
+        month = next_month(month)
+    people = db.execute(select(Person.id).where(Person.team_id == team_id)).scalars().all()
+    days = [start + offset * ONE_DAY for offset in range((end - start).days + 1)]
+    person_days = [(person_id, day) for person_id in people for day in days]
+    counts = day_counts(db, team_id, start, end)
+    found: Dict[Key, Optional[int]] = {}
+    for rule in ruleset.rules:
+        found.update(_check(rule, ruleset, cells, counts, days if rule.kind == "min_headcount" else person_days))
+    return found
+
+
+def validate_range(db: Session, team_id: int, start: date, end: date) -> List[Violation]:
+    """All violations of the team's active rules from start to end, without storing them."""
+    ruleset = load_rules(db, team_id)
+    if ruleset is None:
+        return []
+    found = _evaluate_range(db, team_id, ruleset, start, end)
+    return _sorted(_violation(ruleset, key, value) for key, value in found.items())
+
+
+def store_range(
+    db: Session,
+    team_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    rule_ids: Optional[Iterable[int]] = None,
+) -> RuleDelta:
+    """Re-evaluate the rules (all active ones or the given ones) from start to end
+    and store the result, in the caller's transaction.
+
+    Without start and end the days holding shifts of the team are evaluated.
+    """
+    ruleset = load_rules(db, team_id, rule_ids)
+    if ruleset is None:
+        return RuleDelta()
+    if start is None or end is None:
+        first, last = db.execute(
+            select(func.min(ScheduleDayCount.day), func.max(ScheduleDayCount.day)).where(
+                ScheduleDayCount.team_id == team_id, ScheduleDayCount.count > 0
+            )
+        ).one()
+        if first is None:
+            return _sync(db, team_id, ruleset, {}, date.min, date.max)
+        start = start or first
+        end = end or last
+    found = _evaluate_range(db, team_id, ruleset, start, end)
+    return _sync(db, team_id, ruleset, found, start, end)
+
+
+def retire_shift(db: Session, team_id: int, code: str) -> None:
+    """Call when a shift is deleted: the rules naming its code are switched off and their violations dropped."""
+    rule_ids = (
+        db.execute(
+            select(RosterRule.id).where(
+                RosterRule.team_id == team_id, or_(RosterRule.shift_code == code, RosterRule.next_code == code)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    if rule_ids:
+        db.execute(_violations.delete().where(_violations.c.rule_id.in_(rule_ids)))
+        db.execute(RosterRule.__table__.update().where(RosterRule.id.in_(rule_ids)).values(is_active=False))
+
+
+def stored_violations(db: Session, team_id: int, start: date, end: date) -> List[Violation]:
+    rows = db.execute(
+        select(
+            RosterViolation.rule_id, RosterRule.kind, RosterViolation.person_id, RosterViolation.day, RosterViolation.value
+        )
+        .join(RosterRule, RosterRule.id == RosterViolation.rule_id)
+        .where(RosterViolation.team_id == team_id, RosterViolation.day >= start, RosterViolation.day <= end)
+    ).all()
+    return _sorted(Violation(*row) for row in rows)
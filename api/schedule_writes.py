@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, bindparam, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .archive import archived_months
+from .models import Person, ScheduleEntry, ShiftDefinition
+from .revisions import record_cell_changes
+from .stats import hide_archived
+from .utils import month_start
+
+CellWrite = Tuple[int, date, Optional[str]]  # (person_id, day, shift_code)
+
+_entries = ScheduleEntry.__table__
+
+# Core statements so a list of parameter sets runs as one executemany
+_upsert_stmt = sqlite_insert(_entries)
+_upsert_stmt = _upsert_stmt.on_conflict_do_update(
+    index_elements=[_entries.c.team_id, _entries.c.person_id, _entries.c.day],
+    set_={
+        "shift_code": _upsert_stmt.excluded.shift_code,
+        "updated_at": _upsert_stmt.excluded.updated_at,
+        "updated_by": _upsert_stmt.excluded.updated_by,
+    },
+)
+_delete_stmt = _entries.delete().where(
+    and_(
+        _entries.c.team_id == bindparam("b_team_id"),
+        _entries.c.person_id == bindparam("b_person_id"),
+        _entries.c.day == bindparam("b_day"),
+    )
+)
+_upsert_returning = _upsert_stmt.returning(
+    _entries.c.shift_code, _entries.c.updated_at, _entries.c.updated_by
+)
+
+
+def team_person_ids(db: Session, team_id: int, person_ids: Iterable[int]) -> Set[int]:
+    ids = set(person_ids)
+    if not ids:
+        return set()
+    return set(
+        db.execute(select(Person.id).where(Person.team_id == team_id, Person.id.in_(ids))).scalars()
+    )
+
+
+def active_shift_codes(db: Session, team_id: int, codes: Iterable[str]) -> Set[str]:
+    wanted = set(codes)
+    if not wanted:
+        return set()
+    return set(
+        db.execute(
+            select(ShiftDefinition.code).where(
+                ShiftDefinition.team_id == team_id,
+                ShiftDefinition.code.in_(wanted),
+                ShiftDefinition.is_active.is_(True),
+            )
+        ).scalars()
+    )
+
+
+def write_cells(
+    db: Session, team_id: int, user_id: int, cells: List[CellWrite], now: datetime | None = None
+) -> int:
+    """Apply already validated cell writes in the caller's transaction.
+
+    Cells with a shift code are upserted in one executemany, empty cells are
+    deleted in another. Returns the new team revision.
+    """
+    now = now or datetime.utcnow()
+    archived = archived_months(db, team_id, {month_start(day) for _, day, _ in cells})
+    if archived:
+        hide_archived(db, team_id, ((person_id, day) for person_id, day, _ in cells), archived)
+    # clearing a cell of an archived month needs a NULL row to mask the archived one
+    upserts = [
+        {
+            "team_id": team_id,
+            "person_id": person_id,
+            "day": day,
+            "shift_code": shift_code,
+            "updated_at": now,
+            "updated_by": user_id,
+        }
+        for person_id, day, shift_code in cells
+        if shift_code or month_start(day) in archived
+    ]
+    deletes = [
+        {"b_team_id": team_id, "b_person_id": person_id, "b_day": day}
+        for person_id, day, shift_code in cells
+        if not shift_code and month_start(day) not in archived
+    ]
+    if upserts:
+        db.execute(_upsert_stmt, upserts)
+    if deletes:
+        db.execute(_delete_stmt, deletes)
+    return record_cell_changes(db, team_id, cells, now, user_id)
+
+
+def write_cell(
+    db: Session, team_id: int, user_id: int, person_id: int, day: date, shift_code: Optional[str]
+) -> Tuple[Optional[str], datetime, int]:
+    """Write one validated cell with a single upsert/delete statement.
+
+    Returns the stored (shift_code, updated_at, updated_by).
+    """
+    now = datetime.utcnow()
+    archived = archived_months(db, team_id, [month_start(day)])
+    if archived:
+        hide_archived(db, team_id, [(person_id, day)], archived)
+    if shift_code or archived:
+        stored = db.execute(
+            _upsert_returning,
+            {
+                "team_id": team_id,
+                "person_id": person_id,
+                "day": day,
+                "shift_code": shift_code,
+                "updated_at": now,
+                "updated_by": user_id,
+            },
+        ).one()
+        result = (stored.shift_code, stored.updated_at, stored.updated_by)
+    else:
+        db.execute(_delete_stmt, {"b_team_id": team_id, "b_person_id": person_id, "b_day": day})
+        result = (None, now, user_id)
+    record_cell_changes(db, team_id, [(person_id, day, shift_code)], now, user_id)
+    return result
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, conint
 
 
 class PagePermission(BaseModel):
@@ -69,6 +69,7 @@ class ShiftDefinitionOut(BaseModel):
     text_color: str
     sort_order: int
     is_active: bool
+    is_rest: bool = False
 
     class Config:
         orm_mode = True
@@ -81,6 +82,7 @@ class ShiftDefinitionCreate(BaseModel):
     text_color: str
     sort_order: int = 0
     is_active: bool = True
+    is_rest: bool = False
 
 
 class ShiftDefinitionUpdate(BaseModel):
@@ -89,6 +91,7 @@ class ShiftDefinitionUpdate(BaseModel):
     text_color: Optional[str]
     sort_order: Optional[int]
     is_active: Optional[bool]
+    is_rest: Optional[bool]
 
 
 class PersonOut(BaseModel):
@@ -135,6 +138,22 @@ class ScheduleResponse(BaseModel):
     people: List[PersonOut]
     shifts: List[ShiftDefinitionOut]
     read_only: bool
+    revision: int = 0
+
+
+class ScheduleGridResponse(BaseModel):
+    team: TeamOut
+    start: date
+    end: date
+    people: List[PersonOut]
+    shifts: List[ShiftDefinitionOut]
+    read_only: bool
+    revision: int = 0
+    days: List[date]
+    weekdays: List[str]
+    # grid[day][person] indexes into codes, -1 marks an empty cell
+    codes: List[str]
+    grid: List[List[int]]
 
 
 class ScheduleUpdateRequest(BaseModel):
@@ -144,12 +163,247 @@ class ScheduleUpdateRequest(BaseModel):
     shift_code: Optional[str] = None
 
 
+class RosterViolationOut(BaseModel):
+    rule_id: int
+    kind: str
+    person_id: Optional[int]
+    day: date
+    value: Optional[int] = None
+
+    class Config:
+        orm_mode = True
+
+
 class ScheduleUpdateResponse(BaseModel):
     person_id: int
     day: date
     shift_code: Optional[str]
     updated_at: datetime
     updated_by: int
+    # rule violations this write caused or cleared
+    new_violations: List[RosterViolationOut] = []
+    resolved_violations: List[RosterViolationOut] = []
+
+
+class ScheduleCellInput(BaseModel):
+    person_id: int
+    day: date
+    shift_code: Optional[str] = None
+
+
+class ScheduleBulkUpdateRequest(BaseModel):
+    team_id: int
+    cells: List[ScheduleCellInput] = Field(min_items=1, max_items=10000)
+
+
+class ScheduleCellResult(BaseModel):
+    person_id: int
+    day: date
+    shift_code: Optional[str]
+    ok: bool
+    error: Optional[str] = None
+
+
+class ScheduleBulkUpdateResponse(BaseModel):
+    revision: int
+    updated_at: datetime
+    updated_by: int
+    results: List[ScheduleCellResult]
+    new_violations: List[RosterViolationOut] = []
+    resolved_violations: List[RosterViolationOut] = []
+
+
+class ScheduleChangeOut(BaseModel):
+    revision: int
+    person_id: int
+    day: date
+    shift_code: Optional[str]
+    updated_at: datetime
+    updated_by: Optional[int]
+
+
+class ScheduleChangesResponse(BaseModel):
+    team_id: int
+    revision: int
+    # the client must reload the full schedule instead of applying changes
+    reset: bool = False
+    changes: List[ScheduleChangeOut]
+
+
+class ScheduleHistoryEntry(BaseModel):
+    id: int
+    revision: int
+    person_id: int
+    day: date
+    shift_code: Optional[str]
+    updated_at: datetime
+    updated_by: Optional[int]
+
+    class Config:
+        orm_mode = True
+
+
+class ScheduleHistoryResponse(BaseModel):
+    team_id: int
+    # changes up to this revision were compacted to the last one per cell
+    compacted_revision: int
+    entries: List[ScheduleHistoryEntry]
+    # pass as ``before`` to get the next (older) page; null on the last page
+    next_before: Optional[int] = None
+
+
+class ScheduleDayStats(BaseModel):
+    day: date
+    counts: Dict[str, int]
+    total: int
+
+
+class SchedulePersonStats(BaseModel):
+    person_id: int
+    counts: Dict[str, int]
+    total: int
+
+
+class ScheduleStatsResponse(BaseModel):
+    team_id: int
+    start: date
+    end: date
+    revision: int
+    codes: List[str]
+    days: List[ScheduleDayStats]
+    # only with by_person=true; like days it counts people hidden from the grid too
+    people: Optional[List[SchedulePersonStats]] = None
+
+
+class RosterRuleOut(BaseModel):
+    id: int
+    kind: str
+    shift_code: Optional[str]
+    next_code: Optional[str]
+    threshold: Optional[int]
+    is_active: bool
+
+    class Config:
+        orm_mode = True
+
+
+class RosterRuleCreate(BaseModel):
+    kind: str
+    shift_code: Optional[str] = None
+    next_code: Optional[str] = None
+    threshold: Optional[int] = Field(None, ge=1, le=366)
+    is_active: bool = True
+
+
+class RosterRuleUpdate(BaseModel):
+    shift_code: Optional[str]
+    next_code: Optional[str]
+    threshold: Optional[int] = Field(None, ge=1, le=366)
+    is_active: Optional[bool]
+
+
+class ScheduleValidateRequest(BaseModel):
+    team_id: int
+    start: date
+    end: date
+    # replace the stored violations of the range with the result
+    store: bool = False
+
+
+class ScheduleViolationsResponse(BaseModel):
+    team_id: int
+    start: date
+    end: date
+    violations: List[RosterViolationOut]
+    # only with store=true
+    new_violations: List[RosterViolationOut] = []
+    resolved_violations: List[RosterViolationOut] = []
+
+
+class ShiftPair(BaseModel):
+    shift_code: str
+    next_code: str
+
+
+class GeneratePersonConstraint(BaseModel):
+    person_id: int
+    unavailable: List[date] = []
+    max_shifts: Optional[int] = Field(None, ge=0)
+    max_consecutive: Optional[int] = Field(None, ge=1, le=366)
+    # codes the person may be given; all codes of the coverage when omitted
+    shift_codes: Optional[List[str]] = None
+
+
+class ScheduleGenerateRequest(BaseModel):
+    team_id: int
+    start: date
+    end: date
+    # people wanted per shift code on every day; day_coverage replaces it for single days
+    coverage: Dict[str, conint(ge=0, le=10000)] = {}
+    day_coverage: Dict[date, Dict[str, conint(ge=0, le=10000)]] = {}
+    people: List[GeneratePersonConstraint] = []
+    max_shifts: Optional[int] = Field(None, ge=0)
+    max_consecutive: Optional[int] = Field(None, ge=1, le=366)
+    rest_after: List[ShiftPair] = []
+    use_team_rules: bool = True
+    keep_existing: bool = True
+    time_budget_ms: Optional[int] = Field(None, ge=100)
+    seed: Optional[int] = None
+
+
+class ScheduleCoverageGap(BaseModel):
+    day: date
+    shift_code: str
+    missing: int
+
+
+class ScheduleProposalOut(BaseModel):
+    id: str
+    team_id: int
+    start: date
+    end: date
+    revision: int
+    created_at: datetime
+    expires_at: datetime
+    cost: int
+    shortage: int
+    excess: int
+    rule_violations: int
+    searches: int
+    iterations: int
+    # changes to the current schedule; shift_code null clears a cell
+    cells: List[ScheduleCellInput]
+    uncovered: List[ScheduleCoverageGap]
+
+
+class ScheduleProposalCommitResponse(BaseModel):
+    proposal_id: str
+    revision: int
+    updated_at: datetime
+    updated_by: int
+    cells: int
+    new_violations: List[RosterViolationOut] = []
+    resolved_violations: List[RosterViolationOut] = []
+
+
+class ScheduleExportJobRequest(BaseModel):
+    team_ids: List[int] = Field(min_items=1)
+    start: date
+    end: date
+
+
+class ScheduleExportJobOut(BaseModel):
+    id: str
+    status: str
+    team_ids: List[int]
+    start: date
+    end: date
+    teams_done: int
+    teams_total: int
+    cached: bool
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 
 class PermissionPageInput(BaseModel):
@@ -183,11 +437,76 @@ class UserWithPermissions(UserInfo):
     is_active: bool
 
 
+class UserSummary(BaseModel):
+    id: int
+    username: str
+    display_name: str
+    must_change_password: bool = False
+    is_active: bool
+
+    class Config:
+        orm_mode = True
+
+
 class PermissionOverview(BaseModel):
-    users: List[UserWithPermissions]
+    # UserSummary rows when requested with fields=summary
+    users: List[Union[UserWithPermissions, UserSummary]]
     teams: List[TeamOut]
+    # pass as ``after`` to fetch the next page; null on the last one
+    next_after: Optional[str] = None
 
 
 class ApiError(BaseModel):
     error: str
     message: Optional[str] = None
+
+
+class ScheduleSnapshotRequest(BaseModel):
+    team_id: int
+    # months to cover; the whole schedule when omitted
+    start: Optional[date] = None
+    end: Optional[date] = None
+    note: Optional[str] = Field(None, max_length=255)
+
+
+class ScheduleSnapshotOut(BaseModel):
+    id: int
+    team_id: int
+    start_month: Optional[date]
+    end_month: Optional[date]
+    revision: int
+    cell_count: int
+    note: Optional[str]
+    created_at: datetime
+    created_by: Optional[int]
+
+    class Config:
+        orm_mode = True
+
+
+class ScheduleSnapshotRestoreResponse(BaseModel):
+    snapshot_id: int
+    team_id: int
+    revision: int
+    cells: int
+
+
+class SlowQueryOut(BaseModel):
+    at: datetime
+    elapsed_ms: float
+    engine: str
+    route: Optional[str]
+    statement: str
+    # parameter types only, e.g. "(int, date, date)"
+    parameters: str
+    plan: List[str]
+    full_scan: bool
+
+    class Config:
+        orm_mode = True
+
+
+class SlowQueryLogResponse(BaseModel):
+    threshold_ms: int
+    total: int
+    entries: List[SlowQueryOut]
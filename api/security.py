@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Tuple, TypeVar
+
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 from passlib.context import CryptContext
 
 from .config import load_config
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+T = TypeVar("T")
+
 _config = load_config()
+# hashes made with a different cost are reported by needs_update and rehashed on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=_config.bcrypt_rounds)
 _serializer = URLSafeTimedSerializer(_config.secret_key, salt="schedule-session")
 
 
@@ -18,6 +27,71 @@ def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
 
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool so request threads never spin on it.
+
+    Calls beyond ``workers`` wait in the pool's FIFO queue; the time spent
+    queueing and hashing is accumulated for the health endpoint.
+    """
+
+    def __init__(self, context: CryptContext, workers: int):
+        self.context = context
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.pending = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    def _timed(self, submitted: float, func: Callable[..., T], *args) -> T:
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            wait, run = started - submitted, finished - started
+            with self._lock:
+                self.pending -= 1
+                self.calls += 1
+                self.wait_seconds += wait
+                self.run_seconds += run
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+                self.max_run_seconds = max(self.max_run_seconds, run)
+
+    async def _submit(self, func: Callable[..., T], *args) -> T:
+        with self._lock:
+            self.pending += 1
+        future = self._executor.submit(self._timed, time.perf_counter(), func, *args)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, str | None]:
+        """Verify ``password``; the second item is a fresh hash when the stored cost is outdated."""
+        return await self._submit(self.context.verify_and_update, password, password_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.calls or 1
+            return {
+                "workers": self.workers,
+                "rounds": _config.bcrypt_rounds,
+                "calls": self.calls,
+                "pending": self.pending,
+                "avg_wait_ms": round(self.wait_seconds / calls * 1000, 2),
+                "avg_run_ms": round(self.run_seconds / calls * 1000, 2),
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "max_run_ms": round(self.max_run_seconds * 1000, 2),
+            }
+
+
+password_hasher = PasswordHasher(pwd_context, _config.password_workers)
+
+
 def create_session_token(user_id: int, token_version: int) -> str:
     payload = {"user_id": user_id, "token_version": token_version}
     return _serializer.dumps(payload)
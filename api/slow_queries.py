@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from . import metrics
+from .config import load_config
+
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+PLAN_CACHE_SIZE = 256
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+@dataclass
+class SlowQuery:
+    at: datetime
+    elapsed_ms: float
+    engine: str
+    route: Optional[str]
+    statement: str
+    parameters: str
+    plan: List[str] = field(default_factory=list)
+    full_scan: bool = False
+
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """Types of the bound parameters, never their values (they may hold password hashes)."""
+    if executemany:
+        rows = list(parameters or [])
+        first = parameter_shape(rows[0], False) if rows else "()"
+        return f"{len(rows)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters or ()) + ")"
+
+
+def _is_full_scan(plan: List[str]) -> bool:
+    # "SCAN people" reads the whole table; "SCAN people USING INDEX ..." walks an index
+    return any(line.startswith("SCAN ") and " USING " not in line for line in plan)
+
+
+class SlowQueryLog:
+    """Statements slower than ``threshold`` seconds, with their query plans.
+
+    The newest ``buffer_size`` entries are kept in memory for the admin
+    endpoint; with ``log_path`` set every entry is also appended as a JSON
+    line to a size-rotated file.
+    """
+
+    def __init__(self, threshold: float, buffer_size: int, log_path: Optional[Path]):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: Deque[SlowQuery] = deque(maxlen=buffer_size)
+        self._plans: Dict[str, List[str]] = {}
+        self.total = 0
+        self._logger: Optional[logging.Logger] = None
+        if log_path is not None:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+            )
+            self._logger = logging.getLogger("api.slow_queries")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.addHandler(handler)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def _plan(self, dbapi_connection, statement: str, parameters, executemany: bool) -> List[str]:
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return []
+        with self._lock:
+            cached = self._plans.get(statement)
+        if cached is not None:
+            return cached
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        try:
+            rows = dbapi_connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+        except sqlite3.Error:
+            return []
+        plan = [row[-1] for row in rows]
+        with self._lock:
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.clear()
+            self._plans[statement] = plan
+        return plan
+
+    def observe(
+        self, engine: str, dbapi_connection, statement: str, parameters, executemany: bool, elapsed: float
+    ) -> None:
+        if not self.enabled or elapsed < self.threshold:
+            return
+        request = metrics.current_request.get()
+        scope = request.scope if request is not None else None
+        plan = self._plan(dbapi_connection, statement, parameters, executemany)
+        entry = SlowQuery(
+            at=datetime.utcnow(),
+            elapsed_ms=round(elapsed * 1000, 2),
+            engine=engine,
+            route=f"{scope['method']} {metrics.route_label(scope)}" if scope else None,
+            statement=statement,
+            parameters=parameter_shape(parameters, executemany),
+            plan=plan,
+            full_scan=_is_full_scan(plan),
+        )
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+        if self._logger is not None:
+            record = asdict(entry)
+            record["at"] = entry.at.isoformat(timespec="milliseconds")
+            self._logger.info(json.dumps(record, ensure_ascii=False))
+
+    def entries(self, limit: int) -> List[SlowQuery]:
+        """Most recent first."""
+        with self._lock:
+            return list(self._entries)[::-1][:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+
+_config = load_config()
+slow_query_log = SlowQueryLog(
+    _config.slow_query_ms / 1000, _config.slow_query_buffer, _config.slow_query_log
+)
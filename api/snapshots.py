@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .archive import month_cells, pack_month, unpack_month
+from .history import history_floor
+from .models import ScheduleArchive, ScheduleChange, ScheduleEntry, ScheduleSnapshot, SnapshotBlob, SnapshotMonth
+from .revisions import current_revision, record_team_change
+from .rules import store_range
+from .schedule_writes import team_person_ids
+from .stats import rebuild_counts
+from .utils import month_start, next_month
+
+_entries = ScheduleEntry.__table__
+_archives = ScheduleArchive.__table__
+_blobs = SnapshotBlob.__table__
+_snapshot_months = SnapshotMonth.__table__
+_snapshots = ScheduleSnapshot.__table__
+
+_insert_blob = sqlite_insert(_blobs).on_conflict_do_nothing(index_elements=[_blobs.c.hash])
+
+
+@dataclass
+class SnapshotResult:
+    snapshot: ScheduleSnapshot
+    months: int
+    reused_months: int  # taken from the previous snapshot without reading the schedule
+    new_blobs: int
+    new_bytes: int
+
+
+def _covers(snapshot: ScheduleSnapshot, month: date) -> bool:
+    return (snapshot.start_month is None or snapshot.start_month <= month) and (
+        snapshot.end_month is None or month <= snapshot.end_month
+    )
+
+
+def team_months(db: Session, team_id: int, start: Optional[date], end: Optional[date]) -> Set[date]:
+    """Months of the team holding live or archived rows, limited to [start, end] when given."""
+    month_key = func.strftime("%Y-%m-01", ScheduleEntry.day)
+    live = select(month_key).where(ScheduleEntry.team_id == team_id).distinct()
+    archived = select(ScheduleArchive.month).where(ScheduleArchive.team_id == team_id)
+    if start is not None:
+        live = live.where(ScheduleEntry.day >= start)
+        archived = archived.where(ScheduleArchive.month >= start)
+    if end is not None:
+        live = live.where(ScheduleEntry.day < next_month(end))
+        archived = archived.where(ScheduleArchive.month <= end)
+    months = {date.fromisoformat(key) for key in db.execute(live).scalars()}
+    months.update(db.execute(archived).scalars())
+    return months
+
+
+def changed_months(db: Session, team_id: int, since: int) -> Optional[Set[date]]:
+    """Months touched by cell changes after revision ``since``.
+
+    None when a reset marker was logged in between (people, shifts, a
+    restore): such changes alter cells without naming them. Also None when
+    the log was compacted past ``since``.
+    """
+    if since < history_floor(db, team_id):
+        return None
+    after = (ScheduleChange.team_id == team_id, ScheduleChange.revision > since)
+    if db.execute(select(ScheduleChange.id).where(*after, ScheduleChange.person_id.is_(None)).limit(1)).first():
+        return None
+    keys = db.execute(select(func.strftime("%Y-%m-01", ScheduleChange.day)).where(*after).distinct()).scalars()
+    return {date.fromisoformat(key) for key in keys}
+
+
+def _content_hash(people: str, codes: str, packed: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (people.encode("utf-8"), codes.encode("utf-8"), packed):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def create_snapshot(
+    db: Session,
+    team_id: int,
+    user_id: int | None = None,
+    note: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> SnapshotResult:
+    """Snapshot the team's schedule (or the months from start to end) in the caller's transaction.
+
+    Months are stored as content-addressed blobs, so an unchanged month costs
+    one snapshot_months row. Months that the change log shows as untouched
+    since the previous snapshot reuse its blob without being read at all.
+    """
+    start = month_start(start) if start else None
+    end = month_start(end) if end else None
+    revision = current_revision(db, team_id)
+    months = team_months(db, team_id, start, end)
+
+    hashes: Dict[date, str] = {}
+    unchanged: Set[date] = set()
+    previous = db.execute(
+        select(ScheduleSnapshot).where(ScheduleSnapshot.team_id == team_id).order_by(ScheduleSnapshot.id.desc()).limit(1)
+    ).scalar_one_or_none()
+    if previous is not None:
+        changed = changed_months(db, team_id, previous.revision)
+        if changed is not None:
+            previous_hashes = dict(
+                db.execute(
+                    select(SnapshotMonth.month, SnapshotMonth.blob_hash).where(
+                        SnapshotMonth.snapshot_id == previous.id
+                    )
+                ).all()
+            )
+            for month in months - changed:
+                if _covers(previous, month):
+                    unchanged.add(month)
+                    if month in previous_hashes:
+                        hashes[month] = previous_hashes[month]
+
+    new_blobs: List[dict] = []
+    for month in sorted(months - unchanged):
+        cells = month_cells(db, team_id, month)
+        if not cells:
+            continue
+        people, codes, packed = pack_month(month, cells)
+        digest = _content_hash(people, codes, packed)
+        hashes[month] = digest
+        new_blobs.append(
+            {"hash": digest, "people": people, "codes": codes, "cells": packed, "cell_count": len(cells)}
+        )
+    inserted = [blob for blob in new_blobs if db.execute(_insert_blob, blob).rowcount]
+
+    counts = dict(
+        db.execute(
+            select(SnapshotBlob.hash, SnapshotBlob.cell_count).where(SnapshotBlob.hash.in_(set(hashes.values())))
+        ).all()
+    )
+    snapshot = ScheduleSnapshot(
+        team_id=team_id,
+        start_month=start,
+        end_month=end,
+        revision=revision,
+        cell_count=sum(counts[digest] for digest in hashes.values()),
+        note=note,
+        created_at=datetime.utcnow(),
+        created_by=user_id,
+    )
+    db.add(snapshot)
+    db.flush()
+    if hashes:
+        db.execute(
+            insert(SnapshotMonth),
+            [{"snapshot_id": snapshot.id, "month": month, "blob_hash": digest} for month, digest in hashes.items()],
+        )
+    return SnapshotResult(
+        snapshot=snapshot,
+        months=len(hashes),
+        reused_months=len(unchanged & hashes.keys()),
+        new_blobs=len(inserted),
+        new_bytes=sum(len(blob["cells"]) for blob in inserted),
+    )
+
+
+def restore_snapshot(db: Session, snapshot: ScheduleSnapshot, user_id: int) -> Tuple[int, int]:
+    """Replace the snapshot's months with its content in one transaction.
+
+    Cells of people deleted since are skipped. Returns (revision, restored cells).
+    """
+    team_id = snapshot.team_id
+    rows = db.execute(
+        select(SnapshotMonth.month, SnapshotBlob.people, SnapshotBlob.codes, SnapshotBlob.cells)
+        .join(SnapshotBlob, SnapshotBlob.hash == SnapshotMonth.blob_hash)
+        .where(SnapshotMonth.snapshot_id == snapshot.id)
+    ).all()
+    cells: Dict[Tuple[int, date], str] = {}
+    for month, people, codes, packed in rows:
+        cells.update(unpack_month(month, people, codes, packed))
+    people_ids = team_person_ids(db, team_id, (person_id for person_id, _ in cells))
+
+    live = [_entries.c.team_id == team_id]
+    archived = [_archives.c.team_id == team_id]
+    if snapshot.start_month is not None:
+        live.append(_entries.c.day >= snapshot.start_month)
+        archived.append(_archives.c.month >= snapshot.start_month)
+    if snapshot.end_month is not None:
+        live.append(_entries.c.day < next_month(snapshot.end_month))
+        archived.append(_archives.c.month <= snapshot.end_month)
+    db.execute(_entries.delete().where(*live))
+    db.execute(_archives.delete().where(*archived))
+
+    now = datetime.utcnow()
+    restored = [
+        {
+            "team_id": team_id,
+            "person_id": person_id,
+            "day": day,
+            "shift_code": shift_code,
+            "updated_at": now,
+            "updated_by": user_id,
+        }
+        for (person_id, day), shift_code in cells.items()
+        if person_id in people_ids
+    ]
+    if restored:
+        db.execute(_entries.insert(), restored)
+    # the triggers saw the live rows only, not the archived months dropped above
+    last_day = next_month(snapshot.end_month) - timedelta(days=1) if snapshot.end_month else None
+    rebuild_counts(db, team_id, snapshot.start_month, last_day)
+    store_range(db, team_id, snapshot.start_month, last_day)
+    # too many cells for the change feed; clients reload the schedule
+    revision = record_team_change(db, team_id, user_id)
+    return revision, len(restored)
+
+
+def prune_snapshots(db: Session, before: datetime) -> Tuple[int, int]:
+    """Delete snapshots created before ``before``, except each team's newest one,
+    then the blobs no remaining snapshot refers to. Returns (snapshots, blobs) deleted.
+    """
+    newest = select(func.max(ScheduleSnapshot.id)).group_by(ScheduleSnapshot.team_id)
+    stale = select(ScheduleSnapshot.id).where(ScheduleSnapshot.created_at < before, ScheduleSnapshot.id.not_in(newest))
+    db.execute(_snapshot_months.delete().where(_snapshot_months.c.snapshot_id.in_(stale)))
+    snapshots = db.execute(_snapshots.delete().where(_snapshots.c.id.in_(stale))).rowcount
+    blobs = db.execute(
+        _blobs.delete().where(~exists().where(_snapshot_months.c.blob_hash == _blobs.c.hash))
+    ).rowcount
+    return snapshots, blobs
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .archive import MonthCells, archived_cells, month_cells
+from .models import Person, ScheduleArchive, ScheduleDayCount, ScheduleEntry
+from .utils import month_start, next_month
+
+_counts = ScheduleDayCount.__table__
+_add_counts = sqlite_insert(_counts)
+_add_counts = _add_counts.on_conflict_do_update(
+    index_elements=[_counts.c.team_id, _counts.c.day, _counts.c.shift_code],
+    set_={"count": _counts.c.count + _add_counts.excluded.count},
+)
+
+# Keep schedule_day_counts in step with the live rows inside the writing
+# transaction, whatever the write path (upserts, bulk restores, cascades).
+TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_schedule_counts_insert AFTER INSERT ON schedule_entries
+    WHEN NEW.shift_code IS NOT NULL
+    BEGIN
+        INSERT INTO schedule_day_counts (team_id, day, shift_code, count)
+        VALUES (NEW.team_id, NEW.day, NEW.shift_code, 1)
+        ON CONFLICT (team_id, day, shift_code) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_schedule_counts_delete AFTER DELETE ON schedule_entries
+    WHEN OLD.shift_code IS NOT NULL
+    BEGIN
+        UPDATE schedule_day_counts SET count = count - 1
+        WHERE team_id = OLD.team_id AND day = OLD.day AND shift_code = OLD.shift_code;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_schedule_counts_update AFTER UPDATE OF shift_code ON schedule_entries
+    WHEN OLD.shift_code IS NOT NEW.shift_code
+    BEGIN
+        UPDATE schedule_day_counts SET count = count - 1
+        WHERE team_id = OLD.team_id AND day = OLD.day AND shift_code = OLD.shift_code;
+        INSERT INTO schedule_day_counts (team_id, day, shift_code, count)
+        SELECT NEW.team_id, NEW.day, NEW.shift_code, 1 WHERE NEW.shift_code IS NOT NULL
+        ON CONFLICT (team_id, day, shift_code) DO UPDATE SET count = count + 1;
+    END
+    """,
+)
+
+
+def _apply(db: Session, team_id: int, deltas: Counter) -> None:
+    rows = [
+        {"team_id": team_id, "day": day, "shift_code": code, "count": delta}
+        for (day, code), delta in deltas.items()
+        if delta
+    ]
+    if rows:
+        db.execute(_add_counts, rows)
+
+
+def _unmasked(db: Session, team_id: int, month: date, keys: Iterable[Tuple[int, date]]) -> Dict[Tuple[int, date], str]:
+    """Archived cells among ``keys`` that no live row of the month overrides yet."""
+    archived = archived_cells(db, team_id, month) or {}
+    keys = [key for key in keys if key in archived]
+    if not keys:
+        return {}
+    live = set(
+        db.execute(
+            select(ScheduleEntry.person_id, ScheduleEntry.day).where(
+                ScheduleEntry.team_id == team_id,
+                tuple_(ScheduleEntry.person_id, ScheduleEntry.day).in_(keys),
+            )
+        ).all()
+    )
+    return {key: archived[key] for key in keys if key not in live}
+
+
+def hide_archived(db: Session, team_id: int, keys: Iterable[Tuple[int, date]], months: Iterable[date]) -> None:
+    """Call before writing live rows over cells of archived ``months``.
+
+    The triggers count live rows only: the first live row (or NULL
+    tombstone) over an archived cell hides the archived shift, which has to
+    be subtracted here.
+    """
+    by_month: Dict[date, List[Tuple[int, date]]] = {month: [] for month in months}
+    for person_id, day in keys:
+        if month_start(day) in by_month:
+            by_month[month_start(day)].append((person_id, day))
+    deltas: Counter = Counter()
+    for month, month_keys in by_month.items():
+        for (_, day), code in _unmasked(db, team_id, month, month_keys).items():
+            deltas[(day, code)] -= 1
+    _apply(db, team_id, deltas)
+
+
+def forget_person(db: Session, team_id: int, person_id: int) -> Set[date]:
+    """Call before deleting a person: the cascade removes their live rows, not their archived cells.
+
+    Returns the archived days whose counts went down.
+    """
+    months = db.execute(select(ScheduleArchive.month).where(ScheduleArchive.team_id == team_id)).scalars().all()
+    deltas: Counter = Counter()
+    for month in months:
+        keys = [(person_id, month + timedelta(days=offset)) for offset in range((next_month(month) - month).days)]
+        for (_, day), code in _unmasked(db, team_id, month, keys).items():
+            deltas[(day, code)] -= 1
+    _apply(db, team_id, deltas)
+    return {day for day, _ in deltas}
+
+
+def set_month_counts(db: Session, team_id: int, month: date, cells: MonthCells) -> None:
+    """Replace the month's counters with the given effective cells (used for archived months)."""
+    people = set(db.execute(select(Person.id).where(Person.team_id == team_id)).scalars())
+    db.execute(
+        _counts.delete().where(
+            _counts.c.team_id == team_id, _counts.c.day >= month, _counts.c.day < next_month(month)
+        )
+    )
+    deltas = Counter((day, code) for (person_id, day), code in cells.items() if person_id in people)
+    _apply(db, team_id, deltas)
+
+
+def rebuild_counts(db: Session, team_id: int, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Recompute the team's counters (days ``start`` to ``end`` when given) from scratch.
+
+    Live rows are counted with one GROUP BY; archived months are unpacked.
+    Returns the number of counter rows written.
+    """
+    where = [_counts.c.team_id == team_id]
+    live = [ScheduleEntry.team_id == team_id, ScheduleEntry.shift_code.is_not(None)]
+    if start is not None:
+        where.append(_counts.c.day >= start)
+        live.append(ScheduleEntry.day >= start)
+    if end is not None:
+        where.append(_counts.c.day <= end)
+        live.append(ScheduleEntry.day <= end)
+    db.execute(_counts.delete().where(*where))
+    db.execute(
+        _counts.insert().from_select(
+            ["team_id", "day", "shift_code", "count"],
+            select(ScheduleEntry.team_id, ScheduleEntry.day, ScheduleEntry.shift_code, func.count())
+            .where(*live)
+            .group_by(ScheduleEntry.team_id, ScheduleEntry.day, ScheduleEntry.shift_code),
+        )
+    )
+    archived = select(ScheduleArchive.month).where(ScheduleArchive.team_id == team_id)
+    if start is not None:
+        archived = archived.where(ScheduleArchive.month >= month_start(start))
+    if end is not None:
+        archived = archived.where(ScheduleArchive.month <= end)
+    for month in db.execute(archived).scalars().all():
+        # an archived month is always recomputed whole, also when the range cuts into it
+        set_month_counts(db, team_id, month, month_cells(db, team_id, month))
+    return db.execute(select(func.count()).select_from(_counts).where(*where)).scalar()
+
+
+def day_counts(db: Session, team_id: int, start: date, end: date) -> Dict[date, Dict[str, int]]:
+    """Counts per day and shift code; one index range read of at most days x codes rows."""
+    result: Dict[date, Dict[str, int]] = {}
+    rows = db.execute(
+        select(ScheduleDayCount.day, ScheduleDayCount.shift_code, ScheduleDayCount.count).where(
+            ScheduleDayCount.team_id == team_id,
+            ScheduleDayCount.day >= start,
+            ScheduleDayCount.day <= end,
+            ScheduleDayCount.count > 0,
+        )
+    )
+    for day, code, count in rows:
+        result.setdefault(day, {})[code] = count
+    return result
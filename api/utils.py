@@ -1,9 +1,26 @@
 from __future__ import annotations
 
-from datetime import date
+from datetime import date, timedelta
+from typing import Iterator
 
 WEEKDAY_NAMES = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
 
 
 def weekday_name(day: date) -> str:
     return WEEKDAY_NAMES[day.weekday()]
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    first = month_start(day)
+    return (first + timedelta(days=32)).replace(day=1)
+
+
+def iter_months(start: date, end: date) -> Iterator[date]:
+    current = month_start(start)
+    while current <= end:
+        yield current
+        current = next_month(current)
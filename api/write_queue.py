@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.orm import Session
+
+from .config import load_config
+from .database import SessionLocal
+
+T = TypeVar("T")
+Mutation = Callable[[Session], T]
+
+
+@dataclass
+class _Pending:
+    mutation: Mutation
+    future: Future = field(default_factory=Future)
+
+
+class WriteQueue:
+    """Single writer thread that applies queued mutations in shared transactions.
+
+    Mutations that arrive within ``window`` seconds of the first one (up to
+    ``max_batch``) run in one transaction, each inside its own savepoint, so a
+    failing mutation only fails its own caller. Every caller's future is
+    resolved once the shared commit has succeeded.
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: queue.SimpleQueue[_Pending] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.mutations = 0
+        self.failures = 0
+        self.largest_batch = 0
+
+    def submit(self, mutation: Mutation) -> T:
+        """Queue ``mutation`` and block until its batch has committed."""
+        self._ensure_started()
+        pending = _Pending(mutation)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[_Pending]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            self._apply(self._collect())
+
+    def _apply(self, batch: List[_Pending]) -> None:
+        session = SessionLocal()
+        applied: List[Tuple[_Pending, Any]] = []
+        try:
+            for pending in batch:
+                savepoint = session.begin_nested()
+                try:
+                    result = pending.mutation(session)
+                    savepoint.commit()
+                except Exception as exc:  # handed to the caller, e.g. an HTTPException
+                    if savepoint.is_active:
+                        savepoint.rollback()
+                    pending.future.set_exception(exc)
+                    continue
+                applied.append((pending, result))
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            for pending, _ in applied:
+                pending.future.set_exception(exc)
+            applied = []
+        finally:
+            session.close()
+        with self._lock:
+            self.batches += 1
+            self.mutations += len(batch)
+            self.failures += len(batch) - len(applied)
+            self.largest_batch = max(self.largest_batch, len(batch))
+        for pending, result in applied:
+            pending.future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "mutations": self.mutations,
+                "failures": self.failures,
+                "largest_batch": self.largest_batch,
+                "pending": self._queue.qsize(),
+            }
+
+
+_config = load_config()
+write_queue = (
+    WriteQueue(_config.write_queue_window_ms / 1000, _config.write_queue_max_batch)
+    if _config.write_queue
+    else None
+)
+
+
+def run_write(db: Session, mutation: Mutation) -> T:
+    """Apply ``mutation`` and commit it, through the group-commit queue when enabled.
+
+    ``mutation`` receives the session to work in and must not commit; its
+    return value has to stay usable after that session is closed.
+    """
+    if write_queue is None:
+        result = mutation(db)
+        db.commit()
+        return result
+    return write_queue.submit(mutation)
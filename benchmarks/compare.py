@@ -0,0 +1,43 @@
+"""Compare two result files written by benchmarks.run.
+
+    python -m benchmarks.compare before.json after.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+
+def _load(path: Path) -> dict:
+    report = json.loads(path.read_text(encoding="utf-8"))
+    return {(row["scenario"], row["concurrency"]): row for row in report["results"]}
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    args = parser.parse_args()
+    before, after = _load(args.before), _load(args.after)
+    print(f"{'scenario':<22} {'conc':>5} {'req/s':>18} {'p50 ms':>20} {'p99 ms':>20}")
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        print(
+            f"{key[0]:<22} {key[1]:>5} "
+            f"{new['rps']:>9.1f} {_change(old['rps'], new['rps']):>8} "
+            f"{new['p50_ms']:>10.2f} {_change(old['p50_ms'], new['p50_ms']):>9} "
+            f"{new['p99_ms']:>10.2f} {_change(old['p99_ms'], new['p99_ms']):>9}"
+        )
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"{key[0]:<22} {key[1]:>5}  only in {'before' if key in before else 'after'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Request throughput of the ASGI app at increasing client concurrency.
+
+Runs the app in-process (no network) against the database configured in
+config/app.toml, e.g. after ``python -m api.cli init-db``::
+
+    python -m benchmarks.concurrency --username planner --password planner123 \
+        --team-id 1 --concurrency 1,2,4,8,16 --requests 400 --background-exports 2
+
+With ``--background-exports`` a number of year-long CSV exports run for the
+whole measurement, which shows whether slow requests stall everyone else.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import date
+
+import httpx
+
+from .harness import app_client, login, measure
+
+
+def _month_range(today: date) -> tuple[str, str]:
+    start = today.replace(day=1)
+    end = (start.replace(day=28) + (date.resolution * 4)).replace(day=1) - date.resolution
+    return start.isoformat(), end.isoformat()
+
+
+async def _exporter(client: httpx.AsyncClient, team_id: int, year: int, stop: asyncio.Event) -> int:
+    count = 0
+    params = {"team_id": team_id, "start": f"{year}-01-01", "end": f"{year}-12-31"}
+    while not stop.is_set():
+        response = await client.get("/api/schedule/export", params=params)
+        response.raise_for_status()
+        count += 1
+    return count
+
+
+async def _run_level(
+    client: httpx.AsyncClient, team_id: int, concurrency: int, total: int, background_exports: int
+) -> dict:
+    start, end = _month_range(date.today())
+    params = {"team_id": team_id, "start": start, "end": end, "format": "grid"}
+
+    async def read_schedule(client: httpx.AsyncClient, _: int) -> httpx.Response:
+        return await client.get("/api/schedule", params=params)
+
+    stop = asyncio.Event()
+    exporters = [
+        asyncio.create_task(_exporter(client, team_id, date.today().year, stop)) for _ in range(background_exports)
+    ]
+    result = await measure(client, read_schedule, concurrency, total)
+    stop.set()
+    result["exports"] = sum(await asyncio.gather(*exporters))
+    return result
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    async with app_client() as client:
+        await login(client, args.username, args.password)
+        print(f"{'conc':>5} {'req':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'exports':>8}")
+        for level in args.concurrency:
+            result = await _run_level(client, args.team_id, level, args.requests, args.background_exports)
+            print(
+                f"{result['concurrency']:>5} {result['requests']:>6} {result['rps']:>9.1f} "
+                f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['exports']:>8}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--username", default="planner")
+    parser.add_argument("--password", default="planner123")
+    parser.add_argument("--team-id", type=int, default=1)
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--background-exports", type=int, default=0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
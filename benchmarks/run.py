@@ -0,0 +1,240 @@
+"""Latency and throughput of the main endpoints at configurable concurrency.
+
+Runs the app in-process against the database configured in config/app.toml.
+Seed it first, then run the suite and keep the JSON it writes::
+
+    python -m api.cli seed-synthetic --teams 20 --people-per-team 50 --years 3
+    python -m benchmarks.run --concurrency 1,8,32 --requests 400
+    python -m benchmarks.compare benchmarks/results/<before>.json benchmarks/results/<after>.json
+
+The cell_write scenario modifies schedule cells of the synthetic teams.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import httpx
+from sqlalchemy import func, select
+
+from api.config import load_config
+from api.database import ReadSessionLocal
+from api.models import ScheduleEntry
+
+from .harness import RequestFactory, app_client, login, measure
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SHIFT_CODES = ["DAY", "SWING", "NIGHT", "OFF", None]
+
+
+@dataclass
+class Context:
+    username: str
+    password: str
+    teams: List[int]
+    people: Dict[int, List[int]]
+    first_day: date
+    last_day: date
+
+    def pick(self, index: int) -> tuple[random.Random, int]:
+        rng = random.Random(index)
+        return rng, self.teams[rng.randrange(len(self.teams))]
+
+    def month(self, rng: random.Random) -> tuple[date, date]:
+        span = (self.last_day - self.first_day).days
+        start = (self.first_day + timedelta(days=rng.randrange(max(span, 1)))).replace(day=1)
+        end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return start, end
+
+
+def _schedule(ctx: Context) -> RequestFactory:
+    async def request(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        rng, team_id = ctx.pick(index)
+        start, end = ctx.month(rng)
+        params = {"team_id": team_id, "start": start.isoformat(), "end": end.isoformat(), "format": "grid"}
+        return await client.get("/api/schedule", params=params)
+
+    return request
+
+
+def _export(ctx: Context) -> RequestFactory:
+    async def request(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        rng, team_id = ctx.pick(index)
+        start, _ = ctx.month(rng)
+        end = start + timedelta(days=90)
+        params = {"team_id": team_id, "start": start.isoformat(), "end": end.isoformat()}
+        return await client.get("/api/schedule/export", params=params)
+
+    return request
+
+
+def _stats(ctx: Context) -> RequestFactory:
+    async def request(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        _, team_id = ctx.pick(index)
+        params = {"team_id": team_id, "start": ctx.first_day.isoformat(), "end": ctx.last_day.isoformat()}
+        return await client.get("/api/schedule/stats", params=params)
+
+    return request
+
+
+def _cell_write(ctx: Context) -> RequestFactory:
+    async def request(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        rng, team_id = ctx.pick(index)
+        day = ctx.first_day + timedelta(days=rng.randrange((ctx.last_day - ctx.first_day).days + 1))
+        payload = {
+            "team_id": team_id,
+            "person_id": rng.choice(ctx.people[team_id]),
+            "day": day.isoformat(),
+            "shift_code": rng.choice(SHIFT_CODES),
+        }
+        return await client.put("/api/schedule/cell", json=payload)
+
+    return request
+
+
+def _login(ctx: Context) -> RequestFactory:
+    async def request(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        return await client.post("/api/auth/login", json={"username": ctx.username, "password": ctx.password})
+
+    return request
+
+
+def _permissions_overview(ctx: Context) -> RequestFactory:
+    async def request(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        return await client.get("/api/permissions/overview")
+
+    return request
+
+
+def _permissions_page(ctx: Context) -> RequestFactory:
+    async def request(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        return await client.get("/api/permissions/overview", params={"limit": 100})
+
+    return request
+
+
+# name -> (factory, uses --slow-requests)
+SCENARIOS: Dict[str, tuple[Callable[[Context], RequestFactory], bool]] = {
+    "schedule": (_schedule, False),
+    "export": (_export, True),
+    "stats": (_stats, False),
+    "permissions_overview": (_permissions_overview, False),
+    "permissions_page": (_permissions_page, False),
+    "login": (_login, True),
+    "cell_write": (_cell_write, False),
+}
+
+
+async def _build_context(client: httpx.AsyncClient, username: str, password: str) -> Context:
+    user = await login(client, username, password)
+    teams = [team["team_id"] for team in user["teams"] if team["access_level"] == "write"]
+    if not teams:
+        raise SystemExit(f"{username} has no writable team; run python -m api.cli seed-synthetic first")
+    people: Dict[int, List[int]] = {}
+    for team_id in teams:
+        response = await client.get(f"/api/teams/{team_id}/people")
+        response.raise_for_status()
+        people[team_id] = [person["id"] for person in response.json()]
+    session = ReadSessionLocal()
+    try:
+        first_day, last_day = session.execute(
+            select(func.min(ScheduleEntry.day), func.max(ScheduleEntry.day)).where(ScheduleEntry.team_id.in_(teams))
+        ).one()
+    finally:
+        session.close()
+    today = date.today()
+    return Context(username, password, teams, people, first_day or today, last_day or today)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata(ctx: Context) -> dict:
+    config = load_config()
+    session = ReadSessionLocal()
+    try:
+        cells = session.execute(select(func.count()).select_from(ScheduleEntry)).scalar()
+    finally:
+        session.close()
+    return {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "database": str(config.database_path),
+        "schedule_cells": cells,
+        "teams": len(ctx.teams),
+        "people_per_team": max(len(ids) for ids in ctx.people.values()),
+        "data_range": [ctx.first_day.isoformat(), ctx.last_day.isoformat()],
+        "config": {
+            key: value
+            for key, value in asdict(config).items()
+            if key not in {"secret_key", "database_path", "export_dir"}
+        },
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    async with app_client() as client:
+        ctx = await _build_context(client, args.username, args.password)
+        report = {"meta": _metadata(ctx), "results": []}
+        print(f"{'scenario':<22} {'conc':>5} {'req':>6} {'err':>4} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for name in args.scenarios:
+            factory, slow = SCENARIOS[name]
+            request = factory(ctx)
+            total = args.slow_requests if slow else args.requests
+            for level in args.concurrency:
+                result = {"scenario": name, **await measure(client, request, level, total)}
+                report["results"].append(result)
+                print(
+                    f"{name:<22} {level:>5} {result['requests']:>6} {result['errors']:>4} "
+                    f"{result['rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+                )
+    output = args.output or RESULTS_DIR / f"{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nResults written to {output}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench123")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=400, help="Requests per run of the fast scenarios")
+    parser.add_argument("--slow-requests", type=int, default=40, help="Requests per run of login and export")
+    parser.add_argument(
+        "--scenarios",
+        type=lambda v: v.split(","),
+        default=list(SCENARIOS),
+        help=f"Comma separated subset of: {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,11 +13,15 @@ const state = {
     permissions: null,
   },
   pinnedSidebar: false,
+  permissionSearch: '',
 };
 
+const PERMISSION_PAGE_SIZE = 100;
+
 const root = document.getElementById('app');
 const toastEl = document.getElementById('toast');
 let dropdownInstance = null;
+let scheduleStream = null;
 
 function showToast(message, timeout = 3000) {
   if (!toastEl) return;
@@ -254,6 +258,7 @@ function renderApp() {
 
   document.getElementById('logoutBtn').addEventListener('click', async () => {
     await apiFetch('/auth/logout', { method: 'POST' });
+    closeScheduleStream();
     state.user = null;
     state.dataCache = { schedule: null, shifts: null, people: null, permissions: null };
     state.currentTeamId = null;
@@ -301,8 +306,81 @@ async function loadSchedule() {
   const end = endOfMonth(state.currentMonth);
   const startStr = start.toISOString().slice(0, 10);
   const endStr = end.toISOString().slice(0, 10);
-  const data = await apiFetch(`/schedule?team_id=${state.currentTeamId}&start=${startStr}&end=${endStr}`);
+  const data = await apiFetch(`/schedule?team_id=${state.currentTeamId}&start=${startStr}&end=${endStr}&format=grid`);
   state.dataCache.schedule = data;
+  connectScheduleStream();
+}
+
+function closeScheduleStream() {
+  if (scheduleStream) {
+    scheduleStream.close();
+    scheduleStream = null;
+  }
+}
+
+function connectScheduleStream() {
+  closeScheduleStream();
+  const data = state.dataCache.schedule;
+  if (!data || typeof EventSource === 'undefined') return;
+  const teamId = state.currentTeamId;
+  const source = new EventSource(`${API_BASE}/sse?team_id=${teamId}&since=${data.revision}`, { withCredentials: true });
+  const rerender = () => {
+    if (state.currentPage === 'schedule' && !dropdownInstance) {
+      renderSchedulePage(document.getElementById('pageContent'));
+    }
+  };
+  source.addEventListener('cells', (event) => {
+    const payload = JSON.parse(event.data);
+    const current = state.dataCache.schedule;
+    if (!current || state.currentTeamId !== teamId || payload.revision <= current.revision) return;
+    applyScheduleChanges(current, payload.changes);
+    current.revision = payload.revision;
+    rerender();
+  });
+  source.addEventListener('reset', async () => {
+    if (state.currentTeamId !== teamId) return;
+    try {
+      await loadSchedule();
+      rerender();
+    } catch (error) {
+      closeScheduleStream();
+    }
+  });
+  scheduleStream = source;
+}
+
+function applyScheduleChanges(data, changes) {
+  const dayIndex = new Map(data.days.map((day, idx) => [day, idx]));
+  const personIndex = new Map(data.people.map((person, idx) => [person.id, idx]));
+  changes.forEach((change) => {
+    const dayIdx = dayIndex.get(change.day);
+    const personIdx = personIndex.get(change.person_id);
+    if (dayIdx === undefined || personIdx === undefined) return;
+    let codeIdx = -1;
+    if (change.shift_code) {
+      codeIdx = data.codes.indexOf(change.shift_code);
+      if (codeIdx < 0) {
+        data.codes.push(change.shift_code);
+        codeIdx = data.codes.length - 1;
+      }
+    }
+    data.grid[dayIdx][personIdx] = codeIdx;
+  });
+}
+
+async function syncScheduleChanges() {
+  const data = state.dataCache.schedule;
+  if (!data) {
+    await loadSchedule();
+    return;
+  }
+  const feed = await apiFetch(`/schedule/changes?team_id=${state.currentTeamId}&since=${data.revision}`);
+  if (feed.reset) {
+    await loadSchedule();
+    return;
+  }
+  applyScheduleChanges(data, feed.changes);
+  data.revision = feed.revision;
 }
 
 async function loadShiftSettings() {
@@ -315,11 +393,27 @@ async function loadPeople() {
   state.dataCache.people = people;
 }
 
-async function loadPermissionOverview() {
-  const overview = await apiFetch('/permissions/overview');
+async function loadPermissionOverview({ append = false } = {}) {
+  const params = new URLSearchParams({ limit: PERMISSION_PAGE_SIZE });
+  if (state.permissionSearch) params.set('q', state.permissionSearch);
+  const previous = state.dataCache.permissions;
+  if (append && previous?.next_after) params.set('after', previous.next_after);
+  const overview = await apiFetch(`/permissions/overview?${params}`);
+  if (append && previous) {
+    overview.users = previous.users.concat(overview.users);
+  }
   state.dataCache.permissions = overview;
 }
 
+async function reloadPermissionUser(userId) {
+  const overview = await apiFetch(`/permissions/overview?ids=${userId}`);
+  const users = state.dataCache.permissions.users;
+  const index = users.findIndex((user) => user.id === Number(userId));
+  if (index >= 0 && overview.users.length) {
+    users[index] = overview.users[0];
+  }
+}
+
 function renderPageContent() {
   const container = document.getElementById('pageContent');
   if (!container) return;
@@ -394,13 +488,14 @@ function renderScheduleTable(data, readOnly) {
   });
 
   let bodyRows = '';
-  days.forEach((day) => {
-    let row = `<tr><td>${day.date}</td><td>${day.weekday}</td>`;
-    day.assignments.forEach((assignment) => {
-      const shift = assignment.shift_code ? shiftLookup.get(assignment.shift_code) : null;
+  days.forEach((day, dayIdx) => {
+    let row = `<tr><td>${day}</td><td>${data.weekdays[dayIdx]}</td>`;
+    data.grid[dayIdx].forEach((codeIdx, personIdx) => {
+      const code = codeIdx >= 0 ? data.codes[codeIdx] : null;
+      const shift = code ? shiftLookup.get(code) : null;
       const display = shift ? shift.display_name : '';
       const styles = shift ? `style="background:${shift.bg_color};color:${shift.text_color};"` : '';
-      row += `<td><div class="schedule-cell${editable ? '' : ' readonly'}" data-person="${assignment.person_id}" data-day="${day.date}" ${styles}>${display || ''}</div></td>`;
+      row += `<td><div class="schedule-cell${editable ? '' : ' readonly'}" data-person="${people[personIdx].id}" data-day="${day}" ${styles}>${display || ''}</div></td>`;
     });
     row += '</tr>';
     bodyRows += row;
@@ -482,8 +577,8 @@ function openShiftDropdown({ anchorRect, personId, day, current, shiftLookup })
     const code = event.target.dataset.code || null;
     try {
       const payload = { team_id: state.currentTeamId, person_id: personId, day, shift_code: code };
-      const result = await apiFetch('/schedule/cell', { method: 'PUT', body: payload });
-      await loadSchedule();
+      await apiFetch('/schedule/cell', { method: 'PUT', body: payload });
+      await syncScheduleChanges();
       renderSchedulePage(document.getElementById('pageContent'));
       showToast('已更新排班');
     } catch (error) {
@@ -811,7 +906,10 @@ function renderPermissionsPage(container) {
     <div class="card" style="display:flex;flex-direction:column;gap:1.5rem;">
       <div style="display:flex;align-items:center;justify-content:space-between;">
         <h2 style="margin:0;font-size:1.1rem;">账号权限矩阵</h2>
-        ${editable ? '<button type="button" id="addUser" class="secondary">新增账号</button>' : ''}
+        <div style="display:flex;gap:0.75rem;align-items:center;">
+          <input type="search" id="permissionSearch" placeholder="搜索用户名或显示名" />
+          ${editable ? '<button type="button" id="addUser" class="secondary">新增账号</button>' : ''}
+        </div>
       </div>
       <div class="schedule-grid">
         <table>
@@ -826,9 +924,26 @@ function renderPermissionsPage(container) {
           <tbody>${rows}</tbody>
         </table>
       </div>
+      ${overview.next_after ? '<button type="button" id="moreUsers" class="secondary">加载更多</button>' : ''}
     </div>
   `;
 
+  const searchInput = container.querySelector('#permissionSearch');
+  // assigned, not interpolated: the term is user input
+  searchInput.value = state.permissionSearch;
+  searchInput.addEventListener('change', async (event) => {
+    state.permissionSearch = event.target.value.trim();
+    await loadPermissionOverview();
+    renderPermissionsPage(container);
+  });
+  const moreBtn = container.querySelector('#moreUsers');
+  if (moreBtn) {
+    moreBtn.addEventListener('click', async () => {
+      await loadPermissionOverview({ append: true });
+      renderPermissionsPage(container);
+    });
+  }
+
   if (editable) {
     container.querySelectorAll('tbody tr').forEach((row) => {
       const userId = row.dataset.user;
@@ -850,7 +965,7 @@ function renderPermissionsPage(container) {
             method: 'PUT',
             body: { pages, teams },
           });
-          await loadPermissionOverview();
+          await reloadPermissionUser(userId);
           renderPermissionsPage(container);
           showToast('权限已保存');
         } catch (error) {
@@ -51,6 +51,7 @@ CREATE TABLE IF NOT EXISTS shift_definitions (
     text_color TEXT NOT NULL,
     sort_order INTEGER NOT NULL DEFAULT 0,
     is_active INTEGER NOT NULL DEFAULT 1,
+    is_rest INTEGER NOT NULL DEFAULT 0,
     created_at TEXT NOT NULL DEFAULT (datetime('now')),
     updated_at TEXT NOT NULL DEFAULT (datetime('now')),
     UNIQUE(team_id, code),
@@ -84,6 +85,148 @@ CREATE TABLE IF NOT EXISTS schedule_entries (
     FOREIGN KEY(updated_by) REFERENCES users(id)
 );
 
+-- finished team-months packed by `python -m api.cli archive`; live rows of the month override it
+CREATE TABLE IF NOT EXISTS schedule_archives (
+    team_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    people TEXT NOT NULL,
+    codes TEXT NOT NULL,
+    cells BLOB NOT NULL,
+    cell_count INTEGER NOT NULL,
+    archived_at TEXT NOT NULL DEFAULT (datetime('now')),
+    PRIMARY KEY(team_id, month),
+    FOREIGN KEY(team_id) REFERENCES teams(id) ON DELETE CASCADE
+);
+
+-- snapshot content: one packed team-month per distinct content hash
+CREATE TABLE IF NOT EXISTS snapshot_blobs (
+    hash TEXT PRIMARY KEY,
+    people TEXT NOT NULL,
+    codes TEXT NOT NULL,
+    cells BLOB NOT NULL,
+    cell_count INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS schedule_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    team_id INTEGER NOT NULL,
+    start_month TEXT,
+    end_month TEXT,
+    revision INTEGER NOT NULL,
+    cell_count INTEGER NOT NULL,
+    note TEXT,
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    created_by INTEGER,
+    FOREIGN KEY(team_id) REFERENCES teams(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS snapshot_months (
+    snapshot_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    blob_hash TEXT NOT NULL,
+    PRIMARY KEY(snapshot_id, month),
+    FOREIGN KEY(snapshot_id) REFERENCES schedule_snapshots(id) ON DELETE CASCADE,
+    FOREIGN KEY(blob_hash) REFERENCES snapshot_blobs(hash)
+);
+
+CREATE TABLE IF NOT EXISTS team_revisions (
+    team_id INTEGER PRIMARY KEY,
+    revision INTEGER NOT NULL DEFAULT 0,
+    history_floor INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY(team_id) REFERENCES teams(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS schedule_day_counts (
+    team_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    shift_code TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(team_id, day, shift_code),
+    FOREIGN KEY(team_id) REFERENCES teams(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS roster_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    team_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    shift_code TEXT,
+    next_code TEXT,
+    threshold INTEGER,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY(team_id) REFERENCES teams(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS roster_violations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    team_id INTEGER NOT NULL,
+    rule_id INTEGER NOT NULL,
+    person_id INTEGER,
+    day TEXT NOT NULL,
+    value INTEGER,
+    detected_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY(team_id) REFERENCES teams(id) ON DELETE CASCADE,
+    FOREIGN KEY(rule_id) REFERENCES roster_rules(id) ON DELETE CASCADE,
+    FOREIGN KEY(person_id) REFERENCES people(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS change_codes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS schedule_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    team_id INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
+    person_id INTEGER,
+    day TEXT,
+    code_id INTEGER,
+    updated_at INTEGER NOT NULL,
+    updated_by INTEGER,
+    FOREIGN KEY(team_id) REFERENCES teams(id) ON DELETE CASCADE,
+    FOREIGN KEY(code_id) REFERENCES change_codes(id)
+);
+
 CREATE INDEX IF NOT EXISTS idx_people_team_sort ON people(team_id, sort_index);
 CREATE INDEX IF NOT EXISTS idx_shift_team_sort ON shift_definitions(team_id, sort_order);
-CREATE INDEX IF NOT EXISTS idx_schedule_team_day ON schedule_entries(team_id, day);
+CREATE INDEX IF NOT EXISTS idx_schedule_team_day_cover ON schedule_entries(team_id, day, person_id, shift_code);
+CREATE INDEX IF NOT EXISTS idx_schedule_changes_team_rev ON schedule_changes(team_id, revision);
+CREATE INDEX IF NOT EXISTS idx_schedule_changes_team_day ON schedule_changes(team_id, day);
+CREATE INDEX IF NOT EXISTS idx_schedule_changes_person_day ON schedule_changes(person_id, day);
+CREATE INDEX IF NOT EXISTS idx_schedule_snapshots_team ON schedule_snapshots(team_id, id);
+CREATE INDEX IF NOT EXISTS idx_snapshot_months_blob ON snapshot_months(blob_hash);
+CREATE INDEX IF NOT EXISTS idx_roster_rules_team ON roster_rules(team_id);
+CREATE INDEX IF NOT EXISTS idx_roster_violations_team_day ON roster_violations(team_id, day);
+
+CREATE TRIGGER IF NOT EXISTS trg_schedule_counts_insert AFTER INSERT ON schedule_entries
+WHEN NEW.shift_code IS NOT NULL
+BEGIN
+    INSERT INTO schedule_day_counts (team_id, day, shift_code, count)
+    VALUES (NEW.team_id, NEW.day, NEW.shift_code, 1)
+    ON CONFLICT (team_id, day, shift_code) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_schedule_counts_delete AFTER DELETE ON schedule_entries
+WHEN OLD.shift_code IS NOT NULL
+BEGIN
+    UPDATE schedule_day_counts SET count = count - 1
+    WHERE team_id = OLD.team_id AND day = OLD.day AND shift_code = OLD.shift_code;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_schedule_counts_update AFTER UPDATE OF shift_code ON schedule_entries
+WHEN OLD.shift_code IS NOT NEW.shift_code
+BEGIN
+    UPDATE schedule_day_counts SET count = count - 1
+    WHERE team_id = OLD.team_id AND day = OLD.day AND shift_code = OLD.shift_code;
+    INSERT INTO schedule_day_counts (team_id, day, shift_code, count)
+    SELECT NEW.team_id, NEW.day, NEW.shift_code, 1 WHERE NEW.shift_code IS NOT NULL
+    ON CONFLICT (team_id, day, shift_code) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL DEFAULT (datetime('now'))
+);